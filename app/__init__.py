@@ -1,6 +1,6 @@
 import os
 from flask import Flask
-from .extensions import cors, api
+from .extensions import cors, api, upstream, health, cotacao_cache, response_cache, balance_projection, cep_store, idempotency, tracing, metrics, admission, compression, user_import, write_behind, swagger_spec
 from .routes import main, ns_users, ns_transactions
 from .config import config
 
@@ -13,6 +13,23 @@ def create_app(config_name=None):
     
     # Inicializa extensões
     cors.init_app(app)
+    upstream.init_app(app)
+    health.init_app(app)
+    cotacao_cache.init_app(app)
+    response_cache.init_app(app)
+    balance_projection.init_app(app)
+    cep_store.init_app(app)
+    user_import.init_app(app)
+    idempotency.init_app(app)
+    write_behind.init_app(app)
+    # Antes das métricas: o span da requisição é o primeiro a abrir e o último a fechar
+    tracing.init_app(app)
+    metrics.init_app(app)
+    # Depois das métricas, para que as requisições recusadas também sejam medidas
+    admission.init_app(app)
+    # Registrada depois das métricas para rodar antes delas (after_request roda
+    # na ordem inversa), de forma que os bytes medidos sejam os enviados
+    compression.init_app(app)
     
     # Registra blueprints
     app.register_blueprint(main)
@@ -23,5 +40,8 @@ def create_app(config_name=None):
     # Adiciona namespaces à API
     api.add_namespace(ns_users)
     api.add_namespace(ns_transactions)
+
+    # Serve /swagger.json pré-serializado (depois do registro da rota pelo flask-restx)
+    swagger_spec.init_app(app)
     
     return app
\ No newline at end of file
@@ -0,0 +1,293 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from flask import current_app, request
+
+from .metrics import _processo_vivo
+from .upstream import modulo_sob_demanda
+
+# Carregado só quando o backend sqlite é usado
+sqlite3 = modulo_sob_demanda('sqlite3')
+
+# Chave do ambiente WSGI com a rota cuja vaga de concorrência a requisição ocupa
+VAGA = 'api_principal.admissao.rota'
+
+
+def ler_limites(texto):
+    """
+    Converte "rota=limite,rota=limite" em um dicionário {rota: limite}
+    """
+    limites = {}
+    for item in texto.split(','):
+        if '=' in item:
+            rota, limite = item.rsplit('=', 1)
+            limites[rota.strip()] = int(limite)
+    return limites
+
+
+class MemoryAdmissionBackend:
+    """
+    Baldes de fichas e contadores de concorrência na memória do worker; os
+    limites valem para cada worker separadamente
+    """
+
+    def __init__(self, max_clientes):
+        self.max_clientes = max_clientes
+        self.baldes = OrderedDict()
+        self.em_andamento = {}
+        self.lock = threading.Lock()
+
+    def consumir(self, cliente, taxa, capacidade):
+        """
+        Retira uma ficha do balde do cliente. Retorna 0 se a requisição foi
+        admitida ou os segundos até a próxima ficha.
+        """
+        agora = time.monotonic()
+        with self.lock:
+            balde = self.baldes.get(cliente)
+            if balde is None:
+                fichas = capacidade
+                if len(self.baldes) >= self.max_clientes:
+                    self.baldes.popitem(last=False)
+            else:
+                self.baldes.move_to_end(cliente)
+                fichas = min(capacidade, balde[0] + (agora - balde[1]) * taxa)
+            if fichas >= 1:
+                self.baldes[cliente] = (fichas - 1, agora)
+                return 0
+            self.baldes[cliente] = (fichas, agora)
+            return (1 - fichas) / taxa
+
+    def entrar(self, rota, limite):
+        with self.lock:
+            atual = self.em_andamento.get(rota, 0)
+            if atual >= limite:
+                return False
+            self.em_andamento[rota] = atual + 1
+            return True
+
+    def sair(self, rota):
+        with self.lock:
+            self.em_andamento[rota] -= 1
+
+    def info(self):
+        with self.lock:
+            return {'backend': 'memory', 'clientes': len(self.baldes), 'em_andamento': dict(self.em_andamento)}
+
+
+class SQLiteAdmissionBackend:
+    """
+    Baldes de fichas e contadores de concorrência em um arquivo SQLite (modo
+    WAL), compartilhados pelos workers do gunicorn da mesma máquina. A
+    concorrência é registrada por pid, e as vagas de workers encerrados são
+    descartadas quando um novo processo abre o arquivo.
+    """
+
+    def __init__(self, path, max_clientes):
+        self.path = path
+        self.max_clientes = max_clientes
+        self._local = threading.local()
+        self._pid_limpo = os.getpid()
+        with self._conexao() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS baldes ('
+                'cliente TEXT PRIMARY KEY, fichas REAL NOT NULL, atualizado REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS baldes_atualizado ON baldes (atualizado)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS concorrencia ('
+                'rota TEXT NOT NULL, pid INTEGER NOT NULL, em_andamento INTEGER NOT NULL, PRIMARY KEY (rota, pid))'
+            )
+            self._descartar_processos_encerrados(conn)
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem ao fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if self._pid_limpo != os.getpid():
+                self._pid_limpo = os.getpid()
+                self._descartar_processos_encerrados(conn)
+        return conn
+
+    @staticmethod
+    def _descartar_processos_encerrados(conn):
+        pids = [pid for (pid,) in conn.execute('SELECT DISTINCT pid FROM concorrencia')]
+        encerrados = [(pid,) for pid in pids if pid == os.getpid() or not _processo_vivo(pid)]
+        conn.executemany('DELETE FROM concorrencia WHERE pid = ?', encerrados)
+
+    def consumir(self, cliente, taxa, capacidade):
+        # Relógio de parede, comum a todos os processos
+        agora = time.time()
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT fichas, atualizado FROM baldes WHERE cliente = ?', (cliente,)).fetchone()
+            if row is None:
+                fichas = capacidade
+                self._despejar(conn)
+            else:
+                fichas = min(capacidade, row[0] + max(agora - row[1], 0) * taxa)
+            espera = 0 if fichas >= 1 else (1 - fichas) / taxa
+            if not espera:
+                fichas -= 1
+            conn.execute(
+                'INSERT OR REPLACE INTO baldes (cliente, fichas, atualizado) VALUES (?, ?, ?)', (cliente, fichas, agora)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return espera
+
+    def _despejar(self, conn):
+        excesso = conn.execute('SELECT COUNT(*) FROM baldes').fetchone()[0] - self.max_clientes + 1
+        if excesso > 0:
+            conn.execute(
+                'DELETE FROM baldes WHERE cliente IN (SELECT cliente FROM baldes ORDER BY atualizado LIMIT ?)',
+                (excesso,)
+            )
+
+    def entrar(self, rota, limite):
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            atual = conn.execute(
+                'SELECT COALESCE(SUM(em_andamento), 0) FROM concorrencia WHERE rota = ?', (rota,)
+            ).fetchone()[0]
+            if atual >= limite:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute(
+                'INSERT INTO concorrencia (rota, pid, em_andamento) VALUES (?, ?, 1) '
+                'ON CONFLICT (rota, pid) DO UPDATE SET em_andamento = em_andamento + 1',
+                (rota, os.getpid())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+    def sair(self, rota):
+        self._conexao().execute(
+            'UPDATE concorrencia SET em_andamento = em_andamento - 1 WHERE rota = ? AND pid = ?', (rota, os.getpid())
+        )
+
+    def info(self):
+        conn = self._conexao()
+        clientes = conn.execute('SELECT COUNT(*) FROM baldes').fetchone()[0]
+        em_andamento = dict(conn.execute('SELECT rota, SUM(em_andamento) FROM concorrencia GROUP BY rota'))
+        return {'backend': 'sqlite', 'clientes': clientes, 'em_andamento': em_andamento}
+
+
+BACKENDS = {
+    'memory': lambda config: MemoryAdmissionBackend(config['ADMISSION_MAX_CLIENTS']),
+    'sqlite': lambda config: SQLiteAdmissionBackend(config['ADMISSION_SQLITE_PATH'], config['ADMISSION_MAX_CLIENTS']),
+}
+
+
+class _AdmissionState:
+    def __init__(self, backend, config):
+        self.backend = backend
+        self.taxa = config['ADMISSION_RATE']
+        self.capacidade = config['ADMISSION_BURST'] or max(self.taxa, 1)
+        self.cabecalho_cliente = config['ADMISSION_CLIENT_HEADER']
+        # Só chaves conhecidas identificam o cliente; outro valor no cabeçalho não ganha um balde novo
+        self.chaves = frozenset(c.strip() for c in config['ADMISSION_API_KEYS'].split(',') if c.strip())
+        self.limites = ler_limites(config['ADMISSION_CONCURRENCY'])
+        self.isentas = tuple(p.strip() for p in config['ADMISSION_EXEMPT'].split(',') if p.strip())
+        self.lock = threading.Lock()
+        self.stats = {'admitted': 0, 'rate_limited': 0, 'shed': 0}
+
+    def contar(self, chave):
+        with self.lock:
+            self.stats[chave] += 1
+
+
+class AdmissionControl:
+    """
+    Controle de admissão das requisições antes de chegarem às rotas.
+
+    Cada cliente tem um balde de fichas com ADMISSION_RATE requisições por
+    segundo e rajada de ADMISSION_BURST; sem fichas a requisição recebe 429.
+    O cliente é a chave do cabeçalho ADMISSION_CLIENT_HEADER quando ela está
+    em ADMISSION_API_KEYS, senão o IP. Rotas listadas em ADMISSION_CONCURRENCY
+    têm um limite de requisições simultâneas; acima dele a requisição recebe
+    503 sem gastar ficha. Ambas as respostas trazem Retry-After.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        nome = app.config['ADMISSION_BACKEND']
+        backend = BACKENDS[nome](app.config) if nome != 'none' else None
+        state = _AdmissionState(backend, app.config)
+        app.extensions['admission'] = state
+        if backend is None or (not state.taxa and not state.limites):
+            return
+
+        app.before_request(partial(self._admitir, state))
+        app.teardown_request(partial(self._liberar, state))
+
+    @property
+    def state(self):
+        return current_app.extensions['admission']
+
+    @staticmethod
+    def _admitir(state):
+        req = request._get_current_object()
+        if req.path.startswith(state.isentas):
+            return None
+
+        # A concorrência é verificada antes: uma requisição recusada por ela não gasta ficha
+        regra = req.url_rule
+        if regra is not None and regra.rule in state.limites:
+            if not state.backend.entrar(regra.rule, state.limites[regra.rule]):
+                state.contar('shed')
+                return {'message': 'Servidor sobrecarregado, tente novamente'}, 503, {'Retry-After': '1'}
+            # Liberada em _liberar também quando a requisição é limitada por taxa
+            req.environ[VAGA] = regra.rule
+
+        if state.taxa:
+            espera = state.backend.consumir(AdmissionControl._cliente(state, req), state.taxa, state.capacidade)
+            if espera:
+                state.contar('rate_limited')
+                return (
+                    {'message': 'Limite de requisições excedido'}, 429,
+                    {'Retry-After': str(max(math.ceil(espera), 1))}
+                )
+
+        state.contar('admitted')
+        return None
+
+    @staticmethod
+    def _cliente(state, req):
+        chave = req.headers.get(state.cabecalho_cliente)
+        if chave and chave in state.chaves:
+            return f'chave:{chave}'
+        return req.remote_addr
+
+    @staticmethod
+    def _liberar(state, exc):
+        rota = request.environ.pop(VAGA, None)
+        if rota is not None:
+            state.backend.sair(rota)
+
+    def stats(self):
+        state = self.state
+        with state.lock:
+            stats = dict(state.stats)
+        if state.backend is not None:
+            stats.update(state.backend.info())
+        return stats
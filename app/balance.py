@@ -0,0 +1,299 @@
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+
+# Diferença a partir da qual o saldo projetado e o da API secundária divergem
+TOLERANCIA_DIVERGENCIA = Decimal('0.005')
+
+
+class _Saldo:
+    """
+    Saldo projetado e o último corpo da API secundária, servido com o valor de
+    saldo_usd atualizado para que a resposta não dependa da projeção
+    """
+    __slots__ = ('valor', 'corpo', 'verificado_em')
+
+    def __init__(self, valor, corpo, verificado_em):
+        self.valor = valor
+        self.corpo = corpo
+        self.verificado_em = verificado_em
+
+    def resposta(self):
+        original = self.corpo.get('saldo_usd')
+        if isinstance(original, int) and not isinstance(original, bool) and self.valor == self.valor.to_integral_value():
+            saldo_usd = int(self.valor)
+        else:
+            saldo_usd = float(self.valor)
+        return {**self.corpo, 'saldo_usd': saldo_usd}
+
+
+class _Andamento:
+    """
+    Leituras e escritas em andamento de um usuário. `versao` muda a cada
+    escrita iniciada ou concluída: uma leitura só é gravada na projeção se
+    nenhuma escrita estava pendente no início e a versão não mudou até o fim.
+    """
+    __slots__ = ('leituras', 'escritas', 'versao')
+
+    def __init__(self):
+        self.leituras = 0
+        self.escritas = 0
+        self.versao = 0
+
+
+class _BalanceState:
+    """
+    Saldos projetados pelo worker, operações em andamento e contadores
+    """
+
+    def __init__(self, max_staleness, max_users, reconcile_interval, reconcile_batch):
+        self.max_staleness = max_staleness
+        self.max_users = max_users
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_batch = reconcile_batch
+        self.saldos = OrderedDict()
+        self.andamento = {}
+        self.lock = threading.Lock()
+        # Função de consulta do saldo usada pela reconciliação (a última passada a get)
+        self.buscar = None
+        self.reconciliador_pid = None
+        self.stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0, 'invalidations': 0, 'drifts': 0}
+
+    def iniciar(self, user_id, escrita):
+        with self.lock:
+            andamento = self.andamento.get(user_id)
+            if andamento is None:
+                andamento = self.andamento[user_id] = _Andamento()
+            if escrita:
+                andamento.escritas += 1
+                andamento.versao += 1
+            else:
+                andamento.leituras += 1
+            return andamento.versao if not andamento.escritas else None
+
+    def concluir(self, user_id, escrita):
+        """
+        Chamado com o lock adquirido; retorna a versão atual do usuário
+        """
+        andamento = self.andamento[user_id]
+        if escrita:
+            andamento.escritas -= 1
+            andamento.versao += 1
+        else:
+            andamento.leituras -= 1
+        versao = andamento.versao
+        if not andamento.leituras and not andamento.escritas:
+            del self.andamento[user_id]
+        return versao
+
+    def armazenar(self, user_id, valor, corpo):
+        """
+        Chamado com o lock adquirido
+        """
+        self.saldos[user_id] = _Saldo(valor, dict(corpo), time.monotonic())
+        self.saldos.move_to_end(user_id)
+        while len(self.saldos) > self.max_users:
+            self.saldos.popitem(last=False)
+
+
+def _decimal(valor):
+    try:
+        return Decimal(str(valor))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _user_id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+class BalanceProjection:
+    """
+    Projeção em memória do saldo em USD de cada usuário (opcional).
+
+    O saldo é lido da API secundária na primeira consulta e atualizado com o
+    resultado de cada compra ou venda registrada por este worker, de forma que
+    as consultas seguintes não chamem a API secundária. Um saldo verificado há
+    mais de BALANCE_MAX_STALENESS segundos não é servido: compras e vendas
+    feitas por outros workers só aparecem depois de uma nova verificação. Uma
+    thread em segundo plano reconcilia os saldos mais antigos com a API
+    secundária e conta as divergências. No máximo BALANCE_MAX_USERS usuários
+    são mantidos (LRU).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = None
+        if app.config['BALANCE_PROJECTION_ENABLED']:
+            state = _BalanceState(
+                app.config['BALANCE_MAX_STALENESS'],
+                app.config['BALANCE_MAX_USERS'],
+                app.config['BALANCE_RECONCILE_INTERVAL'],
+                app.config['BALANCE_RECONCILE_BATCH']
+            )
+        app.extensions['balance'] = state
+
+    @property
+    def state(self):
+        return current_app.extensions['balance']
+
+    def get(self, user_id, buscar):
+        """
+        Retorna a tupla (saldo, status), onde status é HIT, MISS ou None (projeção
+        desativada). `buscar(user_id)` é a função que consulta o saldo na API secundária.
+        """
+        state = self.state
+        if state is None:
+            return buscar(user_id), None
+        agora = time.monotonic()
+        with state.lock:
+            saldo = state.saldos.get(user_id)
+            if saldo is not None and agora - saldo.verificado_em < state.max_staleness:
+                state.saldos.move_to_end(user_id)
+                state.stats['hits'] += 1
+                return saldo.resposta(), 'HIT'
+            state.stats['misses'] += 1
+            state.buscar = buscar
+
+        self._iniciar_reconciliacao(state)
+        resultado, _ = self._ler(state, user_id, buscar)
+        return resultado, 'MISS'
+
+    def _ler(self, state, user_id, buscar):
+        """
+        Lê o saldo na API secundária e o grava na projeção. Retorna (resultado,
+        valor anterior da projeção ou None). Se uma escrita do usuário estava
+        pendente ou aconteceu durante a leitura, o saldo lido pode ou não
+        incluí-la e não é gravado.
+        """
+        versao = state.iniciar(user_id, escrita=False)
+        try:
+            resultado = buscar(user_id)
+        finally:
+            with state.lock:
+                versao_final = state.concluir(user_id, escrita=False)
+
+        if resultado is None or 'message' in resultado:
+            with state.lock:
+                state.stats['errors'] += 1
+            return resultado, None
+        valor = _decimal(resultado.get('saldo_usd'))
+        anterior = None
+        with state.lock:
+            if valor is not None and versao is not None and versao == versao_final:
+                saldo = state.saldos.get(user_id)
+                anterior = saldo.valor if saldo is not None else None
+                state.armazenar(user_id, valor, resultado)
+        return resultado, anterior
+
+    def registrar(self, user_id, tipo, executar):
+        """
+        Executa `executar()` (registro de uma compra ou venda na API secundária)
+        e aplica o resultado ao saldo projetado do usuário. Retorna o resultado.
+        """
+        state = self.state
+        user_id = _user_id(user_id)
+        if state is None or user_id is None:
+            return executar()
+
+        state.iniciar(user_id, escrita=True)
+        resultado = None
+        try:
+            resultado = executar()
+        finally:
+            with state.lock:
+                state.concluir(user_id, escrita=True)
+                saldo = state.saldos.get(user_id)
+                if saldo is not None:
+                    self._aplicar(state, user_id, saldo, tipo, resultado)
+        return resultado
+
+    @staticmethod
+    def _aplicar(state, user_id, saldo, tipo, resultado):
+        """
+        Chamado com o lock adquirido
+        """
+        if resultado is not None and 'message' in resultado:
+            # Recusada pela API secundária: o saldo não mudou
+            return
+        quantidade = _decimal(resultado.get('quantidade_usd')) if resultado is not None else None
+        if quantidade is None:
+            # Sem resposta (a escrita pode ter acontecido) ou sem a quantidade: descarta
+            del state.saldos[user_id]
+            state.stats['invalidations'] += 1
+            return
+        if resultado.get('tipo', tipo) == 'venda':
+            quantidade = -quantidade
+        saldo.valor += quantidade
+
+    def _iniciar_reconciliacao(self, state):
+        # Uma thread por processo, iniciada no primeiro uso (depois do fork dos workers)
+        if state.reconciliador_pid == os.getpid() or not state.reconcile_interval:
+            return
+        with state.lock:
+            if state.reconciliador_pid == os.getpid():
+                return
+            state.reconciliador_pid = os.getpid()
+
+        app = current_app._get_current_object()
+
+        def reconciliar():
+            while True:
+                time.sleep(state.reconcile_interval)
+                try:
+                    with app.app_context():
+                        self.reconciliar(state)
+                except Exception as e:
+                    app.logger.error(f"Erro na reconciliação dos saldos: {str(e)}")
+
+        threading.Thread(target=reconciliar, name='saldos', daemon=True).start()
+
+    def reconciliar(self, state=None):
+        """
+        Relê na API secundária os saldos verificados há mais tempo (até
+        BALANCE_RECONCILE_BATCH) e conta os que divergiam da projeção
+        """
+        state = state or self.state
+        limite = time.monotonic() - state.reconcile_interval
+        with state.lock:
+            buscar = state.buscar
+            antigos = heapq.nsmallest(
+                state.reconcile_batch,
+                ((saldo.verificado_em, user_id) for user_id, saldo in state.saldos.items()
+                 if saldo.verificado_em < limite)
+            )
+        if buscar is None:
+            return
+        for _, user_id in antigos:
+            resultado, anterior = self._ler(state, user_id, buscar)
+            with state.lock:
+                state.stats['refreshes'] += 1
+            if anterior is None:
+                continue
+            atual = _decimal(resultado.get('saldo_usd'))
+            if abs(atual - anterior) > TOLERANCIA_DIVERGENCIA:
+                with state.lock:
+                    state.stats['drifts'] += 1
+                current_app.logger.warning(
+                    f"Saldo projetado do usuário {user_id} divergia da API secundária: {anterior} != {atual}"
+                )
+
+    def stats(self):
+        state = self.state
+        if state is None:
+            return {}
+        with state.lock:
+            stats = dict(state.stats)
+            stats['usuarios'] = len(state.saldos)
+        return stats
@@ -0,0 +1,54 @@
+import contextvars
+import queue
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from .upstream import CircuitOpenError
+
+
+def executar_em_lote(itens, processar, max_concorrencia):
+    """
+    Processa `itens` (lista de (indice, chave, item)) com no máximo `max_concorrencia`
+    chamadas simultâneas, preservando a ordem dos itens de uma mesma chave
+    (ex.: user_id, para que as vendas vejam o saldo das compras anteriores).
+
+    `processar(item)` retorna (corpo, status). Gera (indice, corpo, status) à
+    medida que os itens terminam, não necessariamente na ordem de entrada.
+    """
+    app = current_app._get_current_object()
+    grupos = OrderedDict()
+    for indice, chave, item in itens:
+        grupos.setdefault(chave, []).append((indice, item))
+
+    resultados = queue.Queue()
+    cancelado = threading.Event()
+
+    def processar_grupo(grupo):
+        with app.app_context():
+            for indice, item in grupo:
+                if cancelado.is_set():
+                    return
+                try:
+                    corpo, status = processar(item)
+                except CircuitOpenError as e:
+                    corpo, status = {'message': f'API secundária indisponível: {e.nome}'}, 503
+                except Exception as e:
+                    current_app.logger.error(f"Erro ao processar item {indice} do lote: {str(e)}")
+                    corpo, status = {'message': 'Erro ao processar item do lote'}, 500
+                resultados.put((indice, corpo, status))
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=max_concorrencia, thread_name_prefix='lote')
+    try:
+        for grupo in grupos.values():
+            # Cópia do contexto da requisição (ex.: span do rastreamento) para cada grupo
+            executor.submit(contextvars.copy_context().run, processar_grupo, grupo)
+        for _ in range(len(itens)):
+            yield resultados.get()
+    finally:
+        # Se o cliente desconectar, os itens ainda não iniciados são descartados
+        cancelado.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,468 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app
+
+from .upstream import modulo_sob_demanda
+
+# Carregado só quando o backend sqlite é usado
+sqlite3 = modulo_sob_demanda('sqlite3')
+
+# Valor gravado por ResponseCache.invalidate no lugar da entrada: cada
+# invalidação grava um marcador diferente (a geração da chave), e uma busca
+# só armazena o resultado se a chave ainda tem o valor lido antes dela
+INVALIDADA = b'\x00invalidada:'
+# Tempo (s) que o marcador é mantido; maior que a duração de qualquer busca
+TTL_INVALIDACAO = 300
+
+
+def contem_mensagem(corpo):
+    """
+    Indica, sem decodificar o JSON, se o corpo pode conter o campo 'message'
+    usado pelas APIs secundárias para reportar erros
+    """
+    return b'"message"' in corpo
+
+
+class _QuoteCacheState:
+    """
+    Última cotação obtida da API Frankfurter e contadores do cache
+    """
+
+    def __init__(self, ttl, grace):
+        self.ttl = ttl
+        self.grace = grace
+        self.valor = None
+        self.obtido_em = 0.0
+        self.atualizando = False
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0}
+
+    def contar(self, chave):
+        with self.lock:
+            self.stats[chave] += 1
+
+    def armazenar(self, valor):
+        self.valor = valor
+        self.obtido_em = time.monotonic()
+
+    def idade(self):
+        return time.monotonic() - self.obtido_em
+
+
+class QuoteCache:
+    """
+    Cache em memória da cotação do dólar com TTL e stale-while-revalidate.
+
+    Dentro do TTL a cotação é servida do cache. Depois do TTL e até o fim do
+    período de tolerância (grace) a cotação antiga continua sendo servida
+    enquanto uma única atualização roda em segundo plano. Sem cotação válida, a
+    busca é síncrona e compartilhada por todas as requisições concorrentes.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['cotacao_cache'] = _QuoteCacheState(
+            app.config['COTACAO_CACHE_TTL'],
+            app.config['COTACAO_CACHE_GRACE']
+        )
+
+    @property
+    def state(self):
+        return current_app.extensions['cotacao_cache']
+
+    def get(self, buscar):
+        """
+        Retorna a tupla (cotação, status), onde status é HIT, STALE ou MISS.
+        `buscar` é a função que consulta a cotação na API secundária.
+        """
+        state = self.state
+        valor = state.valor
+        if valor is not None:
+            idade = state.idade()
+            if idade < state.ttl:
+                state.contar('hits')
+                return valor, 'HIT'
+            if idade < state.ttl + state.grace:
+                state.contar('stale_hits')
+                self._atualizar_em_segundo_plano(state, buscar)
+                return valor, 'STALE'
+
+        with state.fetch_lock:
+            # Outra requisição pode ter atualizado a cotação enquanto esperávamos
+            if state.valor is not None and state.idade() < state.ttl:
+                state.contar('hits')
+                return state.valor, 'HIT'
+            state.contar('misses')
+            return self._buscar(state, buscar), 'MISS'
+
+    def _buscar(self, state, buscar):
+        valor = buscar()
+        if valor is None or 'message' in valor:
+            state.contar('errors')
+            return None
+        state.armazenar(valor)
+        return valor
+
+    def _atualizar_em_segundo_plano(self, state, buscar):
+        with state.lock:
+            if state.atualizando:
+                return
+            state.atualizando = True
+
+        app = current_app._get_current_object()
+
+        def atualizar():
+            try:
+                with app.app_context(), state.fetch_lock:
+                    state.contar('refreshes')
+                    self._buscar(state, buscar)
+            finally:
+                state.atualizando = False
+
+        threading.Thread(target=atualizar, daemon=True).start()
+
+    def stats(self):
+        state = self.state
+        with state.lock:
+            stats = dict(state.stats)
+        stats['idade_segundos'] = round(state.idade(), 3) if state.valor is not None else None
+        return stats
+
+
+class MemoryBackend:
+    """
+    Backend em memória do processo, com despejo LRU limitado por número de
+    entradas e por bytes
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entradas = OrderedDict()
+        self.tamanho = 0
+        self.lock = threading.Lock()
+
+    def get(self, chave):
+        with self.lock:
+            entrada = self.entradas.get(chave)
+            if entrada is None:
+                return None
+            valor, expira_em = entrada
+            if expira_em is not None and expira_em <= time.time():
+                self._remover(chave)
+                return None
+            self.entradas.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        if len(valor) > self.max_bytes:
+            return
+        with self.lock:
+            self._inserir(chave, valor, ttl)
+
+    def add(self, chave, valor, ttl=None):
+        """
+        Grava o valor somente se a chave não existir (ou estiver expirada).
+        Retorna True se gravou.
+        """
+        return self.trocar(chave, None, valor, ttl)
+
+    def trocar(self, chave, esperado, valor, ttl=None):
+        """
+        Grava o valor somente se o valor atual da chave for `esperado` (None:
+        chave inexistente ou expirada). Retorna True se gravou.
+        """
+        if len(valor) > self.max_bytes:
+            return False
+        with self.lock:
+            entrada = self.entradas.get(chave)
+            atual = None
+            if entrada is not None and (entrada[1] is None or entrada[1] > time.time()):
+                atual = entrada[0]
+            if atual != esperado:
+                return False
+            self._inserir(chave, valor, ttl)
+            return True
+
+    def _inserir(self, chave, valor, ttl):
+        expira_em = time.time() + ttl if ttl else None
+        self._remover(chave)
+        self.entradas[chave] = (valor, expira_em)
+        self.tamanho += len(valor)
+        while len(self.entradas) > self.max_entries or self.tamanho > self.max_bytes:
+            valor_antigo, _ = self.entradas.popitem(last=False)[1]
+            self.tamanho -= len(valor_antigo)
+
+    def delete(self, chave):
+        with self.lock:
+            self._remover(chave)
+
+    def _remover(self, chave):
+        entrada = self.entradas.pop(chave, None)
+        if entrada is not None:
+            self.tamanho -= len(entrada[0])
+
+    def clear(self):
+        with self.lock:
+            self.entradas.clear()
+            self.tamanho = 0
+
+    def info(self):
+        with self.lock:
+            return {'backend': 'memory', 'entradas': len(self.entradas), 'bytes': self.tamanho}
+
+
+class SQLiteBackend:
+    """
+    Backend compartilhado entre os workers do gunicorn de uma mesma máquina,
+    armazenado em um arquivo SQLite (modo WAL), com despejo LRU limitado por
+    número de entradas e por bytes
+    """
+
+    def __init__(self, path, max_entries, max_bytes):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'chave TEXT PRIMARY KEY, valor BLOB NOT NULL, tamanho INTEGER NOT NULL, '
+                'expira_em REAL, acesso REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_acesso ON cache (acesso)')
+            # Totais mantidos por triggers, para que o despejo não percorra a tabela a cada gravação
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_totais ('
+                'id INTEGER PRIMARY KEY CHECK (id = 1), entradas INTEGER NOT NULL, bytes INTEGER NOT NULL)'
+            )
+            conn.execute(
+                'INSERT OR IGNORE INTO cache_totais SELECT 1, COUNT(*), COALESCE(SUM(tamanho), 0) FROM cache'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS cache_inserir AFTER INSERT ON cache BEGIN '
+                'UPDATE cache_totais SET entradas = entradas + 1, bytes = bytes + NEW.tamanho; END'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS cache_remover AFTER DELETE ON cache BEGIN '
+                'UPDATE cache_totais SET entradas = entradas - 1, bytes = bytes - OLD.tamanho; END'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS cache_substituir AFTER UPDATE OF tamanho ON cache BEGIN '
+                'UPDATE cache_totais SET bytes = bytes - OLD.tamanho + NEW.tamanho; END'
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem ao fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, chave):
+        conn = self._conexao()
+        agora = time.time()
+        row = conn.execute(
+            'SELECT valor, expira_em, acesso FROM cache WHERE chave = ?', (chave,)
+        ).fetchone()
+        if row is None:
+            return None
+        valor, expira_em, acesso = row
+        if expira_em is not None and expira_em <= agora:
+            conn.execute('DELETE FROM cache WHERE chave = ?', (chave,))
+            return None
+        # Atualiza o instante de acesso no máximo uma vez por segundo para evitar escritas a cada leitura
+        if agora - acesso > 1:
+            conn.execute('UPDATE cache SET acesso = ? WHERE chave = ?', (agora, chave))
+        return bytes(valor)
+
+    def set(self, chave, valor, ttl=None):
+        self._gravar(chave, valor, ttl, substituir=True)
+
+    def add(self, chave, valor, ttl=None):
+        """
+        Grava o valor somente se a chave não existir (ou estiver expirada),
+        de forma atômica entre os workers. Retorna True se gravou.
+        """
+        return self._gravar(chave, valor, ttl, substituir=False)
+
+    def trocar(self, chave, esperado, valor, ttl=None):
+        """
+        Grava o valor somente se o valor atual da chave for `esperado` (None:
+        chave inexistente ou expirada), de forma atômica entre os workers.
+        Retorna True se gravou.
+        """
+        return self._gravar(chave, valor, ttl, substituir=False, esperado=esperado)
+
+    def _gravar(self, chave, valor, ttl, substituir, esperado=None):
+        if len(valor) > self.max_bytes:
+            return False
+        agora = time.time()
+        expira_em = agora + ttl if ttl else None
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if not substituir:
+                row = conn.execute('SELECT valor, expira_em FROM cache WHERE chave = ?', (chave,)).fetchone()
+                atual = bytes(row[0]) if row is not None and (row[1] is None or row[1] > agora) else None
+                if atual != esperado:
+                    conn.execute('ROLLBACK')
+                    return False
+            # Upsert em vez de INSERT OR REPLACE: a remoção feita pelo REPLACE não dispara os triggers
+            conn.execute(
+                'INSERT INTO cache (chave, valor, tamanho, expira_em, acesso) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, tamanho = excluded.tamanho, '
+                'expira_em = excluded.expira_em, acesso = excluded.acesso',
+                (chave, sqlite3.Binary(valor), len(valor), expira_em, agora)
+            )
+            self._despejar(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+    def _despejar(self, conn):
+        entradas, tamanho = conn.execute('SELECT entradas, bytes FROM cache_totais').fetchone()
+        if entradas <= self.max_entries and tamanho <= self.max_bytes:
+            return
+        excesso_entradas = max(entradas - self.max_entries, 0)
+        excesso_bytes = max(tamanho - self.max_bytes, 0)
+        removidas = []
+        for chave, tamanho_entrada in conn.execute('SELECT chave, tamanho FROM cache ORDER BY acesso'):
+            if excesso_entradas <= 0 and excesso_bytes <= 0:
+                break
+            removidas.append((chave,))
+            excesso_entradas -= 1
+            excesso_bytes -= tamanho_entrada
+        conn.executemany('DELETE FROM cache WHERE chave = ?', removidas)
+
+    def delete(self, chave):
+        self._conexao().execute('DELETE FROM cache WHERE chave = ?', (chave,))
+
+    def clear(self):
+        self._conexao().execute('DELETE FROM cache')
+
+    def info(self):
+        entradas, tamanho = self._conexao().execute('SELECT entradas, bytes FROM cache_totais').fetchone()
+        return {'backend': 'sqlite', 'entradas': entradas, 'bytes': tamanho}
+
+
+BACKENDS = {
+    'memory': lambda config: MemoryBackend(
+        config['RESPONSE_CACHE_MAX_ENTRIES'], config['RESPONSE_CACHE_MAX_BYTES']
+    ),
+    'sqlite': lambda config: SQLiteBackend(
+        config['RESPONSE_CACHE_SQLITE_PATH'], config['RESPONSE_CACHE_MAX_ENTRIES'], config['RESPONSE_CACHE_MAX_BYTES']
+    ),
+}
+
+
+class _ResponseCacheState:
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def contar(self, chave):
+        with self.lock:
+            self.stats[chave] += 1
+
+
+class ResponseCache:
+    """
+    Cache read-through das respostas das APIs secundárias, com backend plugável
+    (RESPONSE_CACHE_BACKEND: memory, sqlite ou none)
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        nome = app.config['RESPONSE_CACHE_BACKEND']
+        backend = BACKENDS[nome](app.config) if nome != 'none' else None
+        app.extensions['response_cache'] = _ResponseCacheState(backend)
+
+    @property
+    def state(self):
+        return current_app.extensions['response_cache']
+
+    def get_or_fetch(self, chave, buscar, ttl=None):
+        """
+        Retorna o valor em cache ou chama `buscar` e armazena o resultado.
+        Respostas de erro (None ou com 'message') não são armazenadas, nem as
+        de uma chave invalidada durante a busca.
+        """
+        state = self.state
+        if state.backend is None:
+            return buscar()
+
+        valor = state.backend.get(chave)
+        if valor is not None and not valor.startswith(INVALIDADA):
+            state.contar('hits')
+            return json.loads(valor)
+
+        state.contar('misses')
+        resultado = buscar()
+        if resultado is not None and 'message' not in resultado:
+            state.backend.trocar(chave, valor, json.dumps(resultado).encode('utf-8'), ttl)
+        return resultado
+
+    def get_or_fetch_bruto(self, chave, buscar, ttl=None):
+        """
+        Como get_or_fetch, mas com o corpo JSON em bytes, sem decodificar:
+        `buscar` retorna os bytes da API secundária (ou None) e os acertos são
+        devolvidos como estão no backend. Corpos com 'message' não são armazenados.
+        """
+        state = self.state
+        if state.backend is None:
+            return buscar()
+
+        valor = state.backend.get(chave)
+        if valor is not None and not valor.startswith(INVALIDADA):
+            state.contar('hits')
+            return valor
+
+        state.contar('misses')
+        corpo = buscar()
+        if corpo is not None and not contem_mensagem(corpo):
+            state.backend.trocar(chave, valor, corpo, ttl)
+        return corpo
+
+    def invalidate(self, chave):
+        """
+        Substitui a entrada por um novo marcador de invalidação, para que as
+        buscas iniciadas antes dela não armazenem o valor antigo
+        """
+        state = self.state
+        if state.backend is not None:
+            state.backend.set(chave, INVALIDADA + uuid.uuid4().hex.encode('ascii'), TTL_INVALIDACAO)
+            state.contar('invalidations')
+
+    def stats(self):
+        state = self.state
+        with state.lock:
+            stats = dict(state.stats)
+        if state.backend is not None:
+            stats.update(state.backend.info())
+        return stats
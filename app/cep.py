@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import threading
+
+import click
+from flask import current_app
+
+from .upstream import modulo_sob_demanda
+
+# csv só é carregado na importação de arquivos e sqlite3 só com o índice local (CEP_STORE_PATH)
+csv = modulo_sob_demanda('csv')
+sqlite3 = modulo_sob_demanda('sqlite3')
+
+# Registros gravados por transação durante a importação em massa
+LOTE_IMPORTACAO = 10000
+
+
+def normalizar_cep(cep):
+    """
+    Retorna o CEP com 8 dígitos (sem hífen ou pontos) ou None se for inválido
+    """
+    if cep is None:
+        return None
+    digitos = re.sub(r'[\s.\-]', '', str(cep))
+    if len(digitos) != 8 or not digitos.isdigit():
+        return None
+    return digitos
+
+
+def _ler_registros(caminho):
+    """
+    Lê o arquivo de importação registro a registro: CSV com cabeçalho (coluna
+    `cep` obrigatória) ou NDJSON com um endereço por linha
+    """
+    with open(caminho, newline='', encoding='utf-8') as arquivo:
+        if caminho.endswith('.csv'):
+            for linha in csv.DictReader(arquivo):
+                yield linha
+        else:
+            for linha in arquivo:
+                if linha.strip():
+                    yield json.loads(linha)
+
+
+class _CepStoreState:
+    """
+    Índice local de CEPs em um arquivo SQLite mapeado em memória, compartilhado
+    pelos workers da mesma máquina
+    """
+
+    def __init__(self, path, mmap_size):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0}
+        with self.conexao() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS ceps (cep TEXT PRIMARY KEY, dados BLOB NOT NULL) WITHOUT ROWID')
+            conn.execute('CREATE TABLE IF NOT EXISTS importacoes (arquivo TEXT PRIMARY KEY, mtime REAL, tamanho INTEGER)')
+
+    def conexao(self):
+        # Uma conexão por thread e por processo (conexões não sobrevivem ao fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def contar(self, chave, valor=1):
+        with self.lock:
+            self.stats[chave] += valor
+
+
+class CepStore:
+    """
+    Armazenamento local e persistente dos endereços por CEP.
+
+    As consultas são servidas do índice local; um CEP ausente é buscado na API
+    ViaCEP e gravado no índice (write-through). O índice pode ser aquecido a
+    partir de um arquivo de importação (CEP_STORE_IMPORT_FILE ou
+    `flask importar-ceps <arquivo>`). CEP_STORE_PATH vazio desativa o índice.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        path = app.config['CEP_STORE_PATH']
+        state = _CepStoreState(path, app.config['CEP_STORE_MMAP_SIZE']) if path else None
+        app.extensions['cep_store'] = state
+
+        arquivo = app.config['CEP_STORE_IMPORT_FILE']
+        if state is not None and arquivo:
+            total = self._importar(state, arquivo)
+            if total:
+                app.logger.info(f'{total} CEPs importados de {arquivo}')
+
+        @app.cli.command('importar-ceps')
+        @click.argument('arquivo')
+        def importar_ceps(arquivo):
+            """Importa endereços (CSV ou NDJSON) para o índice local de CEPs."""
+            if state is None:
+                raise click.ClickException('CEP_STORE_PATH não configurado')
+            click.echo(f'{self._importar(state, arquivo, forcar=True)} CEPs importados')
+
+    @property
+    def state(self):
+        return current_app.extensions['cep_store']
+
+    def get(self, cep):
+        """
+        Retorna o endereço do CEP (já normalizado) ou None se não estiver no índice
+        """
+        state = self.state
+        if state is None:
+            return None
+        row = state.conexao().execute('SELECT dados FROM ceps WHERE cep = ?', (cep,)).fetchone()
+        if row is None:
+            state.contar('misses')
+            return None
+        state.contar('hits')
+        return json.loads(row[0])
+
+    def set(self, cep, dados):
+        state = self.state
+        if state is None:
+            return
+        state.conexao().execute(
+            'INSERT OR REPLACE INTO ceps (cep, dados) VALUES (?, ?)', (cep, json.dumps(dados).encode('utf-8'))
+        )
+        state.contar('writes')
+
+    def _importar(self, state, arquivo, forcar=False):
+        """
+        Importa o arquivo em lotes. Sem `forcar`, um arquivo já importado (mesmo
+        caminho, tamanho e data de modificação) é ignorado, para que os workers
+        não repitam a importação a cada inicialização.
+        """
+        info = os.stat(arquivo)
+        conn = state.conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            anterior = conn.execute(
+                'SELECT mtime, tamanho FROM importacoes WHERE arquivo = ?', (os.path.abspath(arquivo),)
+            ).fetchone()
+            if not forcar and anterior == (info.st_mtime, info.st_size):
+                conn.execute('COMMIT')
+                return 0
+
+            total = 0
+            lote = []
+            for registro in _ler_registros(arquivo):
+                cep = normalizar_cep(registro.get('cep'))
+                if cep is None:
+                    continue
+                registro['cep'] = cep
+                lote.append((cep, json.dumps(registro).encode('utf-8')))
+                if len(lote) >= LOTE_IMPORTACAO:
+                    conn.executemany('INSERT OR REPLACE INTO ceps (cep, dados) VALUES (?, ?)', lote)
+                    total += len(lote)
+                    lote = []
+            conn.executemany('INSERT OR REPLACE INTO ceps (cep, dados) VALUES (?, ?)', lote)
+            total += len(lote)
+            conn.execute(
+                'INSERT OR REPLACE INTO importacoes (arquivo, mtime, tamanho) VALUES (?, ?, ?)',
+                (os.path.abspath(arquivo), info.st_mtime, info.st_size)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return total
+
+    def stats(self):
+        state = self.state
+        if state is None:
+            return {'backend': 'none'}
+        with state.lock:
+            return dict(state.stats)
@@ -0,0 +1,97 @@
+import zlib
+from functools import partial
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só gzip é negociado
+    brotli = None
+
+# Tipos de conteúdo que compensam ser comprimidos
+TIPOS_COMPRIMIVEIS = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/css',
+                      'application/javascript')
+
+
+def escolher_codificacao(accept_encoding):
+    """
+    Retorna 'br' ou 'gzip' conforme o Accept-Encoding do cliente, ou None
+    """
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def _comprimir_partes(partes, codificacao, nivel):
+    """
+    Comprime uma resposta transmitida em partes, sem acumulá-la em memória
+    """
+    if codificacao == 'br':
+        compressor = brotli.Compressor(quality=nivel)
+        comprimir, finalizar = compressor.process, compressor.finish
+    else:
+        # wbits=31: formato gzip
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+        comprimir, finalizar = compressor.compress, compressor.flush
+    try:
+        for parte in partes:
+            if isinstance(parte, str):
+                parte = parte.encode('utf-8')
+            saida = comprimir(parte)
+            if saida:
+                yield saida
+        yield finalizar()
+    finally:
+        fechar = getattr(partes, 'close', None)
+        if fechar is not None:
+            fechar()
+
+
+class Compression:
+    """
+    Compressão negociada das respostas (brotli, se instalado, ou gzip).
+
+    Respostas completas menores que COMPRESSION_MIN_SIZE bytes são enviadas sem
+    compressão; respostas transmitidas em partes são comprimidas à medida que
+    são geradas.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['COMPRESSION_ENABLED']:
+            return
+        niveis = {'gzip': app.config['COMPRESSION_GZIP_LEVEL'], 'br': app.config['COMPRESSION_BROTLI_QUALITY']}
+        app.after_request(partial(self._comprimir, app.config['COMPRESSION_MIN_SIZE'], niveis))
+
+    @staticmethod
+    def _comprimir(tamanho_minimo, niveis, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in TIPOS_COMPRIMIVEIS
+                or request.method == 'HEAD'):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        codificacao = escolher_codificacao(request.accept_encodings)
+        if codificacao is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _comprimir_partes(response.response, codificacao, niveis[codificacao])
+            response.headers.pop('Content-Length', None)
+        else:
+            corpo = response.get_data()
+            if len(corpo) < tamanho_minimo:
+                return response
+            if codificacao == 'br':
+                response.set_data(brotli.compress(corpo, quality=niveis['br']))
+            else:
+                # wbits=31: formato gzip (cabeçalho com mtime zero), sem carregar o módulo gzip
+                response.set_data(zlib.compress(corpo, niveis['gzip'], 31))
+        response.headers['Content-Encoding'] = codificacao
+        return response
@@ -7,9 +7,152 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev_key')
     DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
     TESTING = False
+    # Uma ou mais réplicas por API secundária, separadas por vírgula
     VIACEP_API_URL = os.environ.get('VIACEP_API_URL', 'http://api-secundaria-viacep:5001')
     FRANKFURTER_API_URL = os.environ.get('FRANKFURTER_API_URL', 'http://api-secundaria-frankfurter:5002')
 
+    # Cliente upstream (pool de conexões keep-alive por API secundária)
+    UPSTREAM_POOL_CONNECTIONS = int(os.environ.get('UPSTREAM_POOL_CONNECTIONS', 2))
+    UPSTREAM_POOL_MAXSIZE = int(os.environ.get('UPSTREAM_POOL_MAXSIZE', 20))
+    UPSTREAM_POOL_BLOCK = os.environ.get('UPSTREAM_POOL_BLOCK', 'False').lower() == 'true'
+    UPSTREAM_KEEPALIVE = os.environ.get('UPSTREAM_KEEPALIVE', 'True').lower() == 'true'
+    UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+    UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10))
+
+    # Circuit breaker e retentativas por upstream
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+    CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', 30))
+    CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.environ.get('CIRCUIT_HALF_OPEN_MAX_CALLS', 1))
+    UPSTREAM_RETRY_MAX = int(os.environ.get('UPSTREAM_RETRY_MAX', 2))
+    UPSTREAM_RETRY_BACKOFF = float(os.environ.get('UPSTREAM_RETRY_BACKOFF', 0.05))
+    UPSTREAM_RETRY_BUDGET_RATIO = float(os.environ.get('UPSTREAM_RETRY_BUDGET_RATIO', 0.1))
+    UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND = float(os.environ.get('UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND', 1))
+    UPSTREAM_RETRY_BUDGET_MAX = float(os.environ.get('UPSTREAM_RETRY_BUDGET_MAX', 10))
+    # Falhas consecutivas que tiram uma réplica do balanceamento até a próxima sonda com sucesso
+    UPSTREAM_UNHEALTHY_THRESHOLD = int(os.environ.get('UPSTREAM_UNHEALTHY_THRESHOLD', 3))
+
+    # Sondas de saúde das réplicas e prontidão (GET /health/ready); intervalo 0 desativa as sondas
+    HEALTH_PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', 5))
+    HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', 1))
+    HEALTH_PROBE_PATHS = os.environ.get('HEALTH_PROBE_PATHS', 'viacep=/,frankfurter=/')
+    HEALTH_PROBE_MAX_AGE = float(os.environ.get('HEALTH_PROBE_MAX_AGE', 15))
+    HEALTH_READY_MAX_LATENCY = float(os.environ.get('HEALTH_READY_MAX_LATENCY', 0.5))
+
+    # Recarga da configuração das APIs secundárias sem reiniciar os workers ('' desativa)
+    CONFIG_RELOAD_SIGNAL = os.environ.get('CONFIG_RELOAD_SIGNAL', 'SIGUSR2')
+    CONFIG_RELOAD_FILE = os.environ.get('CONFIG_RELOAD_FILE', '.env')
+
+    # Requisições GET idênticas e concorrentes compartilham uma única chamada ao upstream
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'True').lower() == 'true'
+
+    # Cache da cotação do dólar (segundos)
+    COTACAO_CACHE_TTL = float(os.environ.get('COTACAO_CACHE_TTL', 60))
+    COTACAO_CACHE_GRACE = float(os.environ.get('COTACAO_CACHE_GRACE', 3600))
+
+    # Cache de respostas de GET /users/<id> e GET /transactions/<id>
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')  # memory, sqlite ou none
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 10000))
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    RESPONSE_CACHE_USER_TTL = float(os.environ.get('RESPONSE_CACHE_USER_TTL', 300))
+    RESPONSE_CACHE_SQLITE_PATH = os.environ.get('RESPONSE_CACHE_SQLITE_PATH', '/tmp/api-principal-cache.sqlite3')
+
+    # Projeção em memória dos saldos (GET /users/<id>/saldo), atualizada pelas compras e vendas
+    BALANCE_PROJECTION_ENABLED = os.environ.get('BALANCE_PROJECTION_ENABLED', 'false').lower() == 'true'
+    BALANCE_MAX_STALENESS = float(os.environ.get('BALANCE_MAX_STALENESS', 30))
+    BALANCE_MAX_USERS = int(os.environ.get('BALANCE_MAX_USERS', 100000))
+    BALANCE_RECONCILE_INTERVAL = float(os.environ.get('BALANCE_RECONCILE_INTERVAL', 10))
+    BALANCE_RECONCILE_BATCH = int(os.environ.get('BALANCE_RECONCILE_BATCH', 100))
+
+    # Índice local de CEPs (SQLite mapeado em memória); CEP_STORE_PATH vazio desativa
+    CEP_STORE_PATH = os.environ.get('CEP_STORE_PATH', '/tmp/api-principal-ceps.sqlite3')
+    CEP_STORE_IMPORT_FILE = os.environ.get('CEP_STORE_IMPORT_FILE', '')
+    CEP_STORE_MMAP_SIZE = int(os.environ.get('CEP_STORE_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # Métricas (GET /metrics). Com METRICS_DIR, os workers do gunicorn gravam seus
+    # acumulados nesse diretório e GET /metrics soma todos eles
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+    # Idempotency-Key em POST /transactions/compra e /venda
+    IDEMPOTENCY_BACKEND = os.environ.get('IDEMPOTENCY_BACKEND', 'memory')  # memory, sqlite ou none
+    IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+    IDEMPOTENCY_LOCK_TIMEOUT = float(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 30))
+    IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 100000))
+    IDEMPOTENCY_MAX_BYTES = int(os.environ.get('IDEMPOTENCY_MAX_BYTES', 64 * 1024 * 1024))
+    IDEMPOTENCY_SQLITE_PATH = os.environ.get('IDEMPOTENCY_SQLITE_PATH', '/tmp/api-principal-idempotency.sqlite3')
+
+    # Controle de admissão: balde de fichas por cliente (requisições por segundo;
+    # 0 desativa) e limites de concorrência por rota ("rota=limite,...")
+    ADMISSION_BACKEND = os.environ.get('ADMISSION_BACKEND', 'memory')  # memory, sqlite ou none
+    ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', 0))
+    ADMISSION_BURST = float(os.environ.get('ADMISSION_BURST', 0))
+    ADMISSION_CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER', 'X-API-Key')
+    ADMISSION_API_KEYS = os.environ.get('ADMISSION_API_KEYS', '')
+    ADMISSION_CONCURRENCY = os.environ.get(
+        'ADMISSION_CONCURRENCY', '/transactions/compra=64,/transactions/venda=64,/transactions/batch=4'
+    )
+    ADMISSION_EXEMPT = os.environ.get('ADMISSION_EXEMPT', '/metrics,/status,/health,/swagger,/swaggerui')
+    ADMISSION_MAX_CLIENTS = int(os.environ.get('ADMISSION_MAX_CLIENTS', 100000))
+    ADMISSION_SQLITE_PATH = os.environ.get('ADMISSION_SQLITE_PATH', '/tmp/api-principal-admission.sqlite3')
+
+    # Repasse dos corpos das APIs secundárias sem decodificar e compressão das respostas
+    PASSTHROUGH_ENABLED = os.environ.get('PASSTHROUGH_ENABLED', 'True').lower() == 'true'
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+
+    # Rastreamento distribuído (W3C traceparent); TRACING_EXPORTER: file ou otlp
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() == 'true'
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0.01))
+    TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'file')
+    TRACING_FILE = os.environ.get('TRACING_FILE', '/tmp/api-principal-traces.ndjson')
+    TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+    TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'api-principal')
+    TRACING_BATCH_SIZE = int(os.environ.get('TRACING_BATCH_SIZE', 512))
+    TRACING_FLUSH_INTERVAL = float(os.environ.get('TRACING_FLUSH_INTERVAL', 5))
+    TRACING_QUEUE_SIZE = int(os.environ.get('TRACING_QUEUE_SIZE', 10000))
+
+    # Chamadas paralelas às APIs secundárias (ex.: GET /users/<id>/resumo)
+    FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', 32))
+    RESUMO_MAX_TRANSACOES = int(os.environ.get('RESUMO_MAX_TRANSACOES', 50))
+
+    # Histórico de transações (GET /users/<id>/transactions)
+    HISTORICO_LIMIT = int(os.environ.get('HISTORICO_LIMIT', 100))
+    HISTORICO_MAX_LIMIT = int(os.environ.get('HISTORICO_MAX_LIMIT', 1000))
+
+    # Importação de usuários (POST /users/import)
+    IMPORT_DIR = os.environ.get('IMPORT_DIR', '/tmp/api-principal-imports')
+    IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_BYTES', 1024 * 1024 * 1024))
+    IMPORT_WINDOW = int(os.environ.get('IMPORT_WINDOW', 1000))
+    IMPORT_MAX_CONCURRENCY = int(os.environ.get('IMPORT_MAX_CONCURRENCY', 16))
+    IMPORT_STATUS_INTERVAL = float(os.environ.get('IMPORT_STATUS_INTERVAL', 1.0))
+
+    # Lote de transações (POST /transactions/batch)
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100000))
+    BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 16))
+
+    # Simulação de compras e vendas (POST /transactions/simular)
+    SIMULACAO_MAX_ITENS = int(os.environ.get('SIMULACAO_MAX_ITENS', 10000))
+
+    # Aceite assíncrono de compras e vendas com journal local (write-behind)
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'False').lower() == 'true'
+    WRITE_BEHIND_MODE = os.environ.get('WRITE_BEHIND_MODE', 'prefer')
+    WRITE_BEHIND_DIR = os.environ.get('WRITE_BEHIND_DIR', '/tmp/api-principal-journal')
+    WRITE_BEHIND_PARTITIONS = int(os.environ.get('WRITE_BEHIND_PARTITIONS', 1))
+    WRITE_BEHIND_SEGMENT_BYTES = int(os.environ.get('WRITE_BEHIND_SEGMENT_BYTES', 16 * 1024 * 1024))
+    WRITE_BEHIND_FSYNC_INTERVAL = float(os.environ.get('WRITE_BEHIND_FSYNC_INTERVAL', 0.001))
+    WRITE_BEHIND_JOURNAL_TIMEOUT = float(os.environ.get('WRITE_BEHIND_JOURNAL_TIMEOUT', 10))
+    WRITE_BEHIND_POLL_INTERVAL = float(os.environ.get('WRITE_BEHIND_POLL_INTERVAL', 0.01))
+    WRITE_BEHIND_MAX_CONCURRENCY = int(os.environ.get('WRITE_BEHIND_MAX_CONCURRENCY', 8))
+    WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 100000))
+    WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get('WRITE_BEHIND_MAX_ATTEMPTS', 20))
+    WRITE_BEHIND_RETRY_BASE = float(os.environ.get('WRITE_BEHIND_RETRY_BASE', 0.5))
+    WRITE_BEHIND_RETRY_MAX = float(os.environ.get('WRITE_BEHIND_RETRY_MAX', 60))
+    WRITE_BEHIND_RECOVERY_INTERVAL = float(os.environ.get('WRITE_BEHIND_RECOVERY_INTERVAL', 5))
+    WRITE_BEHIND_RETENTION = float(os.environ.get('WRITE_BEHIND_RETENTION', 86400))
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -1,10 +1,37 @@
 from flask_cors import CORS
 from flask_restx import Api
+from .admission import AdmissionControl
+from .balance import BalanceProjection
+from .cache import QuoteCache, ResponseCache
+from .cep import CepStore
+from .compression import Compression
+from .health import HealthCheck
+from .idempotency import IdempotencyStore
+from .metrics import Metrics
+from .spec import SwaggerSpec
+from .tracing import Tracing
+from .upstream import UpstreamClient
+from .user_import import UserImport
+from .write_behind import WriteBehind
 
 cors = CORS()
+upstream = UpstreamClient()
+health = HealthCheck()
+cotacao_cache = QuoteCache()
+response_cache = ResponseCache()
+balance_projection = BalanceProjection()
+cep_store = CepStore()
+idempotency = IdempotencyStore()
+tracing = Tracing()
+metrics = Metrics()
+admission = AdmissionControl()
+compression = Compression()
+user_import = UserImport()
+write_behind = WriteBehind()
 api = Api(
     title="API Principal do Sistema de Câmbio",
     version="1.0",
     description="API para gerenciamento de usuários e transações de câmbio",
     doc="/swagger"
-)
\ No newline at end of file
+)
+swagger_spec = SwaggerSpec(api)
\ No newline at end of file
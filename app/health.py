@@ -0,0 +1,266 @@
+import os
+import signal
+import threading
+import time
+
+from dotenv import dotenv_values
+from flask import current_app
+
+from .upstream import UPSTREAMS, urls_base
+
+# Configurações aplicadas por uma recarga; as demais exigem reiniciar os workers
+RECARREGAVEIS = (
+    'VIACEP_API_URL',
+    'FRANKFURTER_API_URL',
+    'UPSTREAM_CONNECT_TIMEOUT',
+    'UPSTREAM_READ_TIMEOUT',
+    'UPSTREAM_RETRY_MAX',
+    'UPSTREAM_RETRY_BACKOFF',
+    'UPSTREAM_UNHEALTHY_THRESHOLD',
+    'CIRCUIT_FAILURE_THRESHOLD',
+    'CIRCUIT_RESET_TIMEOUT',
+    'CIRCUIT_HALF_OPEN_MAX_CALLS',
+    'HEALTH_PROBE_INTERVAL',
+    'HEALTH_PROBE_TIMEOUT',
+    'HEALTH_PROBE_PATHS',
+    'HEALTH_PROBE_MAX_AGE',
+    'HEALTH_READY_MAX_LATENCY',
+)
+
+
+def _caminhos(valor):
+    """
+    Lê "upstream=caminho,..." (HEALTH_PROBE_PATHS); upstreams sem caminho usam "/"
+    """
+    caminhos = {nome: '/' for nome in UPSTREAMS}
+    for item in valor.split(','):
+        nome, _, caminho = item.partition('=')
+        if nome.strip() in caminhos and caminho.strip():
+            caminhos[nome.strip()] = caminho.strip()
+    return caminhos
+
+
+def _converter(texto, atual):
+    """
+    Converte o valor lido do arquivo para o tipo da configuração atual
+    """
+    if isinstance(atual, bool):
+        return texto.lower() == 'true'
+    if isinstance(atual, int):
+        return int(texto)
+    if isinstance(atual, float):
+        return float(texto)
+    return texto
+
+
+class _HealthState:
+    """
+    Monitor de saúde das réplicas e recargas da configuração de um worker
+    """
+
+    def __init__(self, config):
+        self.caminhos = _caminhos(config['HEALTH_PROBE_PATHS'])
+        # Reentrante: o tratador do sinal roda na thread principal, que pode estar com o lock
+        self.lock = threading.RLock()
+        self.monitor_pid = None
+        # Rodada de sondas concluída neste processo (o worker já pode receber tráfego)
+        self.sondado = threading.Event()
+        self.recarga = threading.Event()
+        self.stats = {'sondas': 0, 'sondas_falhas': 0, 'recargas': 0, 'recargas_falhas': 0}
+        self.recarregado_em = None
+
+
+class HealthCheck:
+    """
+    Verificações de saúde (GET /health/live e /health/ready) e recarga da
+    configuração sem reiniciar os workers.
+
+    Uma thread por worker sonda cada réplica das APIs secundárias a cada
+    HEALTH_PROBE_INTERVAL segundos pelo próprio pool do upstream, o que mantém
+    uma conexão aquecida por réplica e registra a latência usada pelo
+    balanceamento e pela prontidão. A mesma thread aplica as recargas pedidas
+    pelo sinal CONFIG_RELOAD_SIGNAL: as configurações de RECARREGAVEIS são
+    relidas de CONFIG_RELOAD_FILE e as requisições em andamento terminam com a
+    configuração com que começaram.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # O sinal de recarga não é instalado aqui: create_app também roda nos
+        # testes, nos comandos do flask e nos benchmarks. Nos workers do
+        # gunicorn, o hook post_worker_init (gunicorn.conf.py) chama instalar()
+        app.extensions['health'] = _HealthState(app.config)
+
+    @property
+    def state(self):
+        return current_app.extensions['health']
+
+    def instalar(self, app):
+        """
+        Instala o tratamento do sinal de recarga no processo atual, substituindo
+        o tratador anterior; precisa ser chamado na thread principal
+        """
+        nome = app.config['CONFIG_RELOAD_SIGNAL']
+        if not nome:
+            return
+        state = app.extensions['health']
+
+        def pedir_recarga(signum, frame):
+            # Só sinaliza: a recarga roda na thread do monitor, fora do tratador
+            state.recarga.set()
+            self._iniciar(app, state)
+
+        signal.signal(getattr(signal, nome), pedir_recarga)
+
+    def _iniciar(self, app, state):
+        # Uma thread por processo, iniciada depois do fork dos workers
+        if state.monitor_pid == os.getpid():
+            return
+        with state.lock:
+            if state.monitor_pid == os.getpid():
+                return
+            state.monitor_pid = os.getpid()
+            state.sondado.clear()
+
+        def monitorar():
+            while True:
+                try:
+                    with app.app_context():
+                        if state.recarga.is_set():
+                            state.recarga.clear()
+                            self.recarregar(state)
+                        if app.config['HEALTH_PROBE_INTERVAL'] > 0:
+                            self.sondar(state)
+                except Exception as e:
+                    app.logger.error(f"Erro no monitor de saúde: {str(e)}")
+                intervalo = app.config['HEALTH_PROBE_INTERVAL']
+                state.recarga.wait(intervalo if intervalo > 0 else None)
+
+        threading.Thread(target=monitorar, name='saude', daemon=True).start()
+
+    def sondar(self, state=None):
+        """
+        Sonda todas as réplicas de todos os upstreams em paralelo e aguarda o fim
+        """
+        state = state or self.state
+        upstream = current_app.extensions['upstream']
+        timeout = current_app.config['HEALTH_PROBE_TIMEOUT']
+        resultados = []
+
+        def sondar_destino(nome, destino):
+            resultados.append(upstream.sondar(nome, destino, state.caminhos[nome], timeout))
+
+        threads = [
+            threading.Thread(target=sondar_destino, args=(nome, destino), daemon=True)
+            for nome in UPSTREAMS
+            for destino in list(upstream.destinos[nome])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with state.lock:
+            state.stats['sondas'] += len(resultados)
+            state.stats['sondas_falhas'] += resultados.count(False)
+        state.sondado.set()
+
+    def recarregar(self, state=None):
+        """
+        Relê as configurações de RECARREGAVEIS em CONFIG_RELOAD_FILE e as aplica.
+        O ambiente do processo não muda depois do início, por isso o arquivo
+        prevalece sobre as variáveis de ambiente. Um valor inválido descarta a
+        recarga inteira e mantém a configuração atual.
+        """
+        state = state or self.state
+        config = current_app.config
+        arquivo = config['CONFIG_RELOAD_FILE']
+        try:
+            valores = dotenv_values(arquivo) if arquivo and os.path.exists(arquivo) else {}
+            novos = {
+                chave: _converter(valores[chave], config[chave])
+                for chave in RECARREGAVEIS
+                if valores.get(chave) is not None
+            }
+            for nome, chave in UPSTREAMS.items():
+                if chave in novos and not urls_base(novos[chave]):
+                    raise ValueError(f"{chave} sem nenhuma URL")
+        except (OSError, ValueError) as e:
+            with state.lock:
+                state.stats['recargas_falhas'] += 1
+            current_app.logger.error(f"Recarga da configuração descartada: {str(e)}")
+            return None
+
+        config.update(novos)
+        state.caminhos = _caminhos(config['HEALTH_PROBE_PATHS'])
+        alterados = current_app.extensions['upstream'].recarregar()
+        with state.lock:
+            state.stats['recargas'] += 1
+            state.recarregado_em = time.time()
+        current_app.logger.info(
+            f"Configuração recarregada de {arquivo}: {', '.join(sorted(novos)) or 'nenhuma alteração'}"
+            + (f"; réplicas alteradas: {', '.join(alterados)}" if alterados else '')
+        )
+        return novos
+
+    def vivo(self):
+        """
+        O processo responde: não consulta nenhuma dependência
+        """
+        return {'status': 'ok', 'pid': os.getpid()}
+
+    def pronto(self):
+        """
+        Retorna (corpo, pronto). O worker está pronto quando cada upstream tem
+        o pool criado e sem saturação e ao menos uma réplica saudável com sonda
+        recente (até HEALTH_PROBE_MAX_AGE segundos) e latência até
+        HEALTH_READY_MAX_LATENCY segundos. A primeira chamada do worker inicia o
+        monitor e espera a primeira rodada de sondas, de forma que um worker
+        recém-iniciado só fica pronto com as conexões abertas.
+        """
+        state = self.state
+        app = current_app._get_current_object()
+        config = app.config
+        upstream = app.extensions['upstream']
+        sondando = config['HEALTH_PROBE_INTERVAL'] > 0
+        self._iniciar(app, state)
+        if sondando:
+            state.sondado.wait(config['HEALTH_PROBE_TIMEOUT'] + 1)
+
+        agora = time.monotonic()
+        verificacoes = {}
+        for nome in UPSTREAMS:
+            replicas = upstream.destinos[nome]
+            em_andamento = sum(destino.em_andamento for destino in replicas)
+            capacidade = config['UPSTREAM_POOL_MAXSIZE'] * len(replicas)
+            # Sem pool_block, requisições além do pool abrem conexões avulsas e não esperam
+            if not sondando:
+                # Sem sondas, o pool é criado aqui
+                upstream.session(nome)
+            pool = upstream.aquecido(nome) and (not config['UPSTREAM_POOL_BLOCK'] or em_andamento < capacidade)
+            disponiveis = [
+                destino for destino in replicas
+                if destino.saudavel and (not sondando or (
+                    destino.sondado_em is not None
+                    and agora - destino.sondado_em <= config['HEALTH_PROBE_MAX_AGE']
+                    and destino.latencia <= config['HEALTH_READY_MAX_LATENCY']
+                ))
+            ]
+            verificacoes[nome] = {
+                'pronto': bool(pool and disponiveis),
+                'pool': {'criado': upstream.aquecido(nome), 'em_andamento': em_andamento, 'capacidade': capacidade},
+                'replicas_disponiveis': len(disponiveis),
+                'replicas': [destino.info() for destino in replicas]
+            }
+        pronto = all(v['pronto'] for v in verificacoes.values())
+        with state.lock:
+            recargas = dict(state.stats, recarregado_em=state.recarregado_em)
+        corpo = {'status': 'ok' if pronto else 'indisponivel', 'upstreams': verificacoes, 'monitor': recargas}
+        return corpo, pronto
+
+    def stats(self):
+        state = self.state
+        with state.lock:
+            return dict(state.stats)
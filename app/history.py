@@ -0,0 +1,221 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from .utils import iterar_array_json
+
+TIPOS = ('compra', 'venda')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Chave dos totais das transações sem tipo
+SEM_TIPO = 'sem_tipo'
+
+DUAS_CASAS = Decimal('0.01')
+QUATRO_CASAS = Decimal('0.0001')
+
+
+class HistoricoIndisponivel(Exception):
+    """
+    A API secundária não retornou a listagem de transações
+    """
+
+
+class HistoricoNaoEncontrado(Exception):
+    """
+    A API secundária respondeu 404 à listagem (usuário inexistente)
+    """
+
+
+def _instante(valor):
+    """
+    Converte uma data e hora ISO 8601 em datetime sem fuso (horários com fuso
+    são convertidos para UTC), para que todas possam ser comparadas
+    """
+    instante = datetime.fromisoformat(valor)
+    if instante.tzinfo is not None:
+        instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+    return instante
+
+
+def _limite(valor, fim):
+    """
+    Lê um parâmetro from/to. Uma data sem hora é o início do dia; em `to` ela
+    inclui o dia inteiro, e o limite passa a ser o início do dia seguinte
+    (exclusivo). Retorna (instante, exclusivo, texto canônico).
+    """
+    try:
+        dia = date.fromisoformat(valor)
+    except ValueError:
+        instante = _instante(valor)
+        return instante, False, instante.isoformat()
+    instante = datetime.combine(dia, datetime.min.time())
+    if fim:
+        return instante + timedelta(days=1), True, dia.isoformat()
+    return instante, False, dia.isoformat()
+
+
+class FiltroTransacoes:
+    """
+    Filtro por período (from/to, datas ou datas e horas ISO 8601, inclusivos) e por tipo
+    """
+
+    def __init__(self, inicio=None, fim=None, tipo=None):
+        # `inicio` e `fim` são textos ISO 8601 já validados
+        self.inicio = self.fim = None
+        self.fim_exclusivo = False
+        self.params_periodo = {}
+        if inicio:
+            self.inicio, _, self.params_periodo['from'] = _limite(inicio, fim=False)
+        if fim:
+            self.fim, self.fim_exclusivo, self.params_periodo['to'] = _limite(fim, fim=True)
+        self.tipo = tipo
+
+    @classmethod
+    def dos_parametros(cls, args):
+        """
+        Monta o filtro a partir da query string; levanta ValueError com a mensagem de erro
+        """
+        inicio, fim, tipo = args.get('from'), args.get('to'), args.get('tipo')
+        for nome, valor in (('from', inicio), ('to', fim)):
+            if valor:
+                try:
+                    datetime.fromisoformat(valor)
+                except ValueError:
+                    raise ValueError(f'Parâmetro inválido: {nome} deve ser uma data ISO 8601 (AAAA-MM-DD)')
+        if tipo and tipo not in TIPOS:
+            raise ValueError('Parâmetro inválido: tipo deve ser compra ou venda')
+        return cls(inicio or None, fim or None, tipo or None)
+
+    def params(self):
+        """
+        Parâmetros repassados à API secundária, que pode aplicar o filtro na origem
+        """
+        params = dict(self.params_periodo)
+        if self.tipo:
+            params['tipo'] = self.tipo
+        return params
+
+    def aceita(self, transacao):
+        if self.tipo and transacao.get('tipo') != self.tipo:
+            return False
+        if self.inicio is None and self.fim is None:
+            return True
+        # Com período, uma transação sem data (ou com data inválida) fica de fora
+        try:
+            data = _instante(transacao.get('data_transacao') or '')
+        except (TypeError, ValueError):
+            return False
+        if self.inicio is not None and data < self.inicio:
+            return False
+        if self.fim is not None and (data >= self.fim if self.fim_exclusivo else data > self.fim):
+            return False
+        return True
+
+
+def iterar_transacoes(abrir, params, parse_float=None):
+    """
+    Gera as transações retornadas por `abrir(params)` (resposta em streaming da
+    API secundária), seguindo a paginação por X-Next-Cursor. Só a parte atual
+    de cada página fica em memória. Levanta HistoricoIndisponivel se `abrir`
+    retornar None e HistoricoNaoEncontrado se a API secundária responder 404;
+    um corpo que não é um array JSON completo levanta ValueError.
+    """
+    params = dict(params)
+    while True:
+        resposta = abrir(params)
+        if resposta is None:
+            raise HistoricoIndisponivel()
+        if resposta.status_code == 404:
+            try:
+                corpo = resposta.json()
+            except ValueError:
+                corpo = None
+            finally:
+                resposta.close()
+            mensagem = corpo.get('message') if isinstance(corpo, dict) else None
+            raise HistoricoNaoEncontrado(mensagem or 'Usuário não encontrado')
+        try:
+            yield from iterar_array_json(resposta.iter_content(chunk_size=STREAM_CHUNK_SIZE), parse_float)
+            cursor = resposta.headers.get('X-Next-Cursor')
+        finally:
+            resposta.close()
+        if not cursor:
+            return
+        params['cursor'] = cursor
+
+
+def _decimal(valor):
+    # Com parse_float=Decimal os valores já chegam como Decimal; inteiros e
+    # ausentes (None) são convertidos aqui
+    if valor.__class__ is Decimal:
+        return valor
+    return Decimal(valor or 0)
+
+
+class _Totais:
+    __slots__ = ('transacoes', 'quantidade_usd', 'valor_brl', 'cotacao_x_usd')
+
+    def __init__(self):
+        self.transacoes = 0
+        self.quantidade_usd = Decimal(0)
+        self.valor_brl = Decimal(0)
+        # Soma de cotacao * quantidade_usd, para a média ponderada pela quantidade
+        self.cotacao_x_usd = Decimal(0)
+
+    def adicionar(self, quantidade_usd, valor_brl, cotacao):
+        self.transacoes += 1
+        self.quantidade_usd += quantidade_usd
+        self.valor_brl += valor_brl
+        self.cotacao_x_usd += cotacao * quantidade_usd
+
+    def como_dict(self):
+        media = self.cotacao_x_usd / self.quantidade_usd if self.quantidade_usd else None
+        return {
+            'transacoes': self.transacoes,
+            'quantidade_usd': float(self.quantidade_usd.quantize(DUAS_CASAS)),
+            'valor_brl': float(self.valor_brl.quantize(DUAS_CASAS)),
+            'cotacao_media': float(media.quantize(QUATRO_CASAS)) if media is not None else None
+        }
+
+
+class ResumoTransacoes:
+    """
+    Totais por tipo e por dia (soma de quantidade_usd e valor_brl e cotação
+    média ponderada pela quantidade_usd), acumulados uma transação por vez:
+    a memória depende do número de dias, não do número de transações.
+    Os valores devem chegar como Decimal (parse_float=Decimal) para somas exatas.
+    Transações sem tipo são somadas em SEM_TIPO.
+    """
+
+    def __init__(self):
+        self.por_tipo = {}
+        self.por_dia = {}
+
+    def adicionar(self, transacao):
+        tipo = transacao.get('tipo') or SEM_TIPO
+        dia = (transacao.get('data_transacao') or '')[:10]
+        quantidade_usd = _decimal(transacao.get('quantidade_usd'))
+        valor_brl = _decimal(transacao.get('valor_brl'))
+        cotacao = _decimal(transacao.get('cotacao'))
+
+        totais = self.por_tipo.get(tipo)
+        if totais is None:
+            totais = self.por_tipo[tipo] = _Totais()
+        totais.adicionar(quantidade_usd, valor_brl, cotacao)
+
+        tipos_do_dia = self.por_dia.get(dia)
+        if tipos_do_dia is None:
+            tipos_do_dia = self.por_dia[dia] = {}
+        totais = tipos_do_dia.get(tipo)
+        if totais is None:
+            totais = tipos_do_dia[tipo] = _Totais()
+        totais.adicionar(quantidade_usd, valor_brl, cotacao)
+
+    def como_dict(self):
+        return {
+            'transacoes': sum(totais.transacoes for totais in self.por_tipo.values()),
+            'por_tipo': {tipo: totais.como_dict() for tipo, totais in sorted(self.por_tipo.items())},
+            'por_dia': [
+                {'data': dia, **{tipo: totais.como_dict() for tipo, totais in sorted(tipos.items())}}
+                for dia, tipos in sorted(self.por_dia.items())
+            ]
+        }
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import threading
+import time
+
+from flask import current_app
+
+from .cache import MemoryBackend, SQLiteBackend
+
+EM_ANDAMENTO = 'em_andamento'
+CONCLUIDO = 'concluido'
+
+# Intervalo entre as consultas ao backend enquanto outro worker executa a requisição
+INTERVALO_ESPERA = 0.05
+
+BACKENDS = {
+    'memory': lambda config: MemoryBackend(
+        config['IDEMPOTENCY_MAX_ENTRIES'], config['IDEMPOTENCY_MAX_BYTES']
+    ),
+    'sqlite': lambda config: SQLiteBackend(
+        config['IDEMPOTENCY_SQLITE_PATH'], config['IDEMPOTENCY_MAX_ENTRIES'], config['IDEMPOTENCY_MAX_BYTES']
+    ),
+}
+
+
+class IdempotencyConflict(Exception):
+    """
+    A chave já foi usada com outros parâmetros (status 422) ou a requisição
+    original ainda está em andamento em outro worker após a espera (status 409)
+    """
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def impressao_digital(method, path, dados):
+    """
+    Identifica o conteúdo da requisição, para recusar a mesma chave com outros parâmetros
+    """
+    conteudo = json.dumps([method, path, dados], sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+class _Execucao:
+    """
+    Requisição em andamento neste worker; as duplicadas concorrentes esperam pelo evento
+    """
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+
+
+class _IdempotencyState:
+    def __init__(self, backend, ttl, lock_timeout):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.execucoes = {}
+        self.lock = threading.Lock()
+        self.stats = {'executions': 0, 'replays': 0, 'waits': 0, 'conflicts': 0}
+
+    def contar(self, chave):
+        with self.lock:
+            self.stats[chave] += 1
+
+
+class IdempotencyStore:
+    """
+    Executa uma única vez as requisições com o mesmo Idempotency-Key.
+
+    A primeira requisição é executada; duplicadas concorrentes esperam pelo
+    resultado dela e duplicadas posteriores recebem a resposta armazenada
+    (por IDEMPOTENCY_TTL segundos, com despejo LRU). Com o backend `sqlite` a
+    reserva da chave e as respostas são compartilhadas entre os workers.
+    Respostas 5xx não são armazenadas, para que o cliente possa tentar de novo.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        nome = app.config['IDEMPOTENCY_BACKEND']
+        backend = BACKENDS[nome](app.config) if nome != 'none' else None
+        app.extensions['idempotency'] = _IdempotencyState(
+            backend, app.config['IDEMPOTENCY_TTL'], app.config['IDEMPOTENCY_LOCK_TIMEOUT']
+        )
+
+    @property
+    def state(self):
+        return current_app.extensions['idempotency']
+
+    def executar(self, chave, digital, processar):
+        """
+        Retorna (corpo, status, cabeçalhos, reproduzida). `processar()` retorna
+        (corpo, status, cabeçalhos a reproduzir) e só é chamada se nenhuma
+        requisição com a mesma chave foi executada.
+        """
+        state = self.state
+        if state.backend is None:
+            corpo, status, cabecalhos = processar()
+            return corpo, status, cabecalhos, False
+
+        with state.lock:
+            execucao = state.execucoes.get(chave)
+            lider = execucao is None
+            if lider:
+                execucao = state.execucoes[chave] = _Execucao()
+
+        if not lider:
+            # Duplicada concorrente no mesmo worker
+            state.contar('waits')
+            execucao.evento.wait()
+            if execucao.resultado is None:
+                # A requisição original falhou com uma exceção; esta é executada de novo
+                return self.executar(chave, digital, processar)
+            return self._reproduzir(state, execucao.resultado, digital)
+
+        try:
+            registro = self._reservar(state, chave, digital)
+            if registro is not None:
+                execucao.resultado = registro
+                return self._reproduzir(state, registro, digital)
+
+            state.contar('executions')
+            try:
+                corpo, status, cabecalhos = processar()
+            except Exception:
+                state.backend.delete(chave)
+                raise
+            registro = {
+                'estado': CONCLUIDO, 'digital': digital, 'corpo': corpo, 'status': status, 'cabecalhos': cabecalhos
+            }
+            if status < 500:
+                state.backend.set(chave, json.dumps(registro).encode('utf-8'), state.ttl)
+            else:
+                state.backend.delete(chave)
+            execucao.resultado = registro
+            return corpo, status, cabecalhos, False
+        finally:
+            with state.lock:
+                state.execucoes.pop(chave, None)
+            execucao.evento.set()
+
+    def _reservar(self, state, chave, digital):
+        """
+        Reserva a chave para esta requisição, retornando None. Se outra requisição
+        já a concluiu, retorna o registro armazenado; se está em andamento em
+        outro worker, espera até IDEMPOTENCY_LOCK_TIMEOUT pela conclusão.
+        """
+        reserva = json.dumps({'estado': EM_ANDAMENTO, 'digital': digital}).encode('utf-8')
+        limite = time.monotonic() + state.lock_timeout
+        esperou = False
+        while True:
+            if state.backend.add(chave, reserva, state.lock_timeout):
+                return None
+            valor = state.backend.get(chave)
+            if valor is None:
+                # Reserva expirada ou liberada entre as duas operações
+                continue
+            registro = json.loads(valor)
+            if registro['digital'] != digital:
+                state.contar('conflicts')
+                raise IdempotencyConflict('Idempotency-Key já utilizada com outros parâmetros', 422)
+            if registro['estado'] == CONCLUIDO:
+                return registro
+            if not esperou:
+                state.contar('waits')
+                esperou = True
+            if time.monotonic() >= limite:
+                state.contar('conflicts')
+                raise IdempotencyConflict('Requisição com esta Idempotency-Key ainda em andamento', 409)
+            time.sleep(INTERVALO_ESPERA)
+
+    @staticmethod
+    def _reproduzir(state, registro, digital):
+        if registro['digital'] != digital:
+            state.contar('conflicts')
+            raise IdempotencyConflict('Idempotency-Key já utilizada com outros parâmetros', 422)
+        state.contar('replays')
+        return registro['corpo'], registro['status'], registro.get('cabecalhos', {}), True
+
+    def stats(self):
+        state = self.state
+        with state.lock:
+            stats = dict(state.stats)
+        if state.backend is not None:
+            stats.update(state.backend.info())
+        return stats
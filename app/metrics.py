@@ -0,0 +1,404 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from functools import partial, wraps
+
+from flask import current_app, request
+
+# Limites superiores (s) dos buckets dos histogramas de latência
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRICOES = {
+    'api_principal_requests_total': ('counter', 'Requisições atendidas por rota, método e status'),
+    'api_principal_request_duration_seconds': ('histogram', 'Latência das requisições por rota e método'),
+    'api_principal_response_bytes_total': ('counter', 'Bytes enviados nas respostas por rota e método'),
+    'api_principal_requests_in_flight': ('gauge', 'Requisições em andamento por rota'),
+    'api_principal_upstream_duration_seconds': ('histogram', 'Latência das funções de acesso às APIs secundárias'),
+    'api_principal_upstream_in_flight': ('gauge', 'Chamadas em andamento às APIs secundárias por função'),
+    'api_principal_upstream_requests_total': ('counter', 'Requisições HTTP às APIs secundárias por upstream, método e status'),
+    'api_principal_circuit_open': ('gauge', 'Workers com o circuito do upstream aberto ou meio-aberto'),
+    'api_principal_upstream_replica_healthy': ('gauge', 'Workers que consideram a réplica do upstream saudável'),
+    'api_principal_upstream_replica_in_flight': ('gauge', 'Requisições em andamento por réplica do upstream'),
+    'api_principal_cache_events_total': ('counter', 'Eventos dos caches (acertos, falhas, invalidações)'),
+    'api_principal_write_behind_events_total': ('counter', 'Transações aceitas, concluídas, recusadas e recuperadas do journal'),
+    'api_principal_write_behind_pending': ('gauge', 'Transações aceitas aguardando envio à API secundária'),
+}
+
+EVENTOS_CACHE = ('hits', 'stale_hits', 'misses', 'refreshes', 'errors', 'invalidations', 'drifts')
+
+# Registro da aplicação que atende a requisição da thread atual
+_contexto = threading.local()
+
+
+def _gevent_ativo():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+class _Shard:
+    """
+    Métricas acumuladas por uma única thread; só ela escreve, então não há locks
+    """
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def somar(self, outro):
+        # list() copia os itens de uma vez, sem conflito com a thread dona do shard
+        for chave, valor in list(outro.counters.items()):
+            self.counters[chave] = self.counters.get(chave, 0) + valor
+        for chave, valor in list(outro.gauges.items()):
+            self.gauges[chave] = self.gauges.get(chave, 0) + valor
+        for chave, valores in list(outro.histograms.items()):
+            atual = self.histograms.get(chave)
+            if atual is None:
+                self.histograms[chave] = list(valores)
+            else:
+                for i, valor in enumerate(valores):
+                    atual[i] += valor
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas de um worker, com agregação por thread.
+
+    Cada thread escreve no seu próprio shard; os shards são somados apenas na
+    coleta (GET /metrics ou gravação periódica). Sob o gevent todos os greenlets
+    compartilham um shard, pois não há troca de contexto durante o registro.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self.requisicao = threading.local()
+        self._shards = []
+        self._aposentado = _Shard()
+        self._lock = threading.Lock()
+        self._compartilhado = _Shard() if _gevent_ativo() else None
+
+    def _novo_shard(self):
+        shard = self._local.shard = _Shard()
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    def _shard(self):
+        return self._compartilhado or getattr(self._local, 'shard', None) or self._novo_shard()
+
+    def inc(self, nome, labels, valor=1):
+        counters = (self._compartilhado or getattr(self._local, 'shard', None) or self._novo_shard()).counters
+        chave = (nome, labels)
+        counters[chave] = counters.get(chave, 0) + valor
+
+    def gauge_add(self, nome, labels, valor):
+        gauges = (self._compartilhado or getattr(self._local, 'shard', None) or self._novo_shard()).gauges
+        chave = (nome, labels)
+        gauges[chave] = gauges.get(chave, 0) + valor
+
+    def observe(self, nome, labels, valor):
+        histograms = (self._compartilhado or getattr(self._local, 'shard', None) or self._novo_shard()).histograms
+        chave = (nome, labels)
+        h = histograms.get(chave)
+        if h is None:
+            # Contagem por bucket (+Inf no final), soma e total
+            h = histograms[chave] = [0] * (len(BUCKETS) + 3)
+        h[bisect.bisect_left(BUCKETS, valor)] += 1
+        h[-2] += valor
+        h[-1] += 1
+
+    def coletar(self):
+        """
+        Soma os shards de todas as threads. Shards de threads encerradas são
+        incorporados ao acumulado e descartados.
+        """
+        total = _Shard()
+        with self._lock:
+            vivos = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    vivos.append(shard)
+                else:
+                    self._aposentado.somar(shard)
+            self._shards = vivos
+            total.somar(self._aposentado)
+            for shard in vivos:
+                total.somar(shard)
+        if self._compartilhado is not None:
+            total.somar(self._compartilhado)
+        return total
+
+
+def _serializar(shard, pid):
+    def itens(d):
+        return [[nome, list(labels), valor] for (nome, labels), valor in d.items()]
+
+    return {
+        'pid': pid,
+        'counters': itens(shard.counters),
+        'gauges': itens(shard.gauges),
+        'histograms': itens(shard.histograms),
+    }
+
+
+def _desserializar(dados):
+    shard = _Shard()
+    for destino, itens in [(shard.counters, dados['counters']), (shard.gauges, dados['gauges']),
+                           (shard.histograms, dados['histograms'])]:
+        for nome, labels, valor in itens:
+            destino[(nome, tuple(tuple(par) for par in labels))] = valor
+    return shard
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, extra=None):
+    pares = list(labels) + (extra or [])
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+
+def formatar_prometheus(shard):
+    """
+    Formata as métricas no formato de texto do Prometheus (versão 0.0.4)
+    """
+    por_nome = {}
+    for tipo, d in [('counter', shard.counters), ('gauge', shard.gauges), ('histogram', shard.histograms)]:
+        for (nome, labels), valor in d.items():
+            por_nome.setdefault(nome, (tipo, []))[1].append((labels, valor))
+
+    linhas = []
+    for nome in sorted(por_nome):
+        tipo, series = por_nome[nome]
+        descricao = DESCRICOES.get(nome, (tipo, nome))[1]
+        linhas.append(f'# HELP {nome} {descricao}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for labels, valor in sorted(series):
+            if tipo != 'histogram':
+                linhas.append(f'{nome}{_labels(labels)} {valor}')
+                continue
+            acumulado = 0
+            for limite, contagem in zip(BUCKETS + ('+Inf',), valor[:-2]):
+                acumulado += contagem
+                linhas.append(f'{nome}_bucket{_labels(labels, [("le", limite)])} {acumulado}')
+            linhas.append(f'{nome}_sum{_labels(labels)} {valor[-2]}')
+            linhas.append(f'{nome}_count{_labels(labels)} {valor[-1]}')
+    return '\n'.join(linhas) + '\n'
+
+
+class Metrics:
+    """
+    Instrumentação das requisições e das chamadas às APIs secundárias.
+
+    Com METRICS_DIR configurado, cada worker do gunicorn grava periodicamente
+    seu acumulado em METRICS_DIR/<pid>.json e GET /metrics soma os arquivos de
+    todos os workers (gauges apenas dos workers ainda vivos).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        registry = MetricsRegistry()
+        app.extensions['metrics'] = registry
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        # Os ganchos recebem o registro diretamente para evitar buscas em current_app/g
+        app.before_request(partial(self._iniciar, registry))
+        app.after_request(partial(self._finalizar, registry))
+        app.teardown_request(partial(self._encerrar, registry))
+
+        diretorio = app.config['METRICS_DIR']
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+            intervalo = app.config['METRICS_FLUSH_INTERVAL']
+            threading.Thread(
+                target=self._gravar_periodicamente, args=(app, diretorio, intervalo), daemon=True
+            ).start()
+
+    @property
+    def registry(self):
+        return current_app.extensions['metrics']
+
+    @staticmethod
+    def _iniciar(registry):
+        req = request._get_current_object()
+        regra = req.url_rule
+        rota = regra.rule if regra is not None else 'nao_encontrada'
+        _contexto.registry = registry
+        # Estado da requisição atual, local à thread (ou greenlet) que a atende
+        atual = registry.requisicao
+        atual.inicio = time.perf_counter()
+        atual.labels = (('route', rota), ('method', req.method))
+        registry.gauge_add('api_principal_requests_in_flight', (('route', rota),), 1)
+
+    def _finalizar(self, registry, response):
+        atual = registry.requisicao
+        inicio = getattr(atual, 'inicio', None)
+        if inicio is None:
+            return response
+        labels = atual.labels
+        registry.observe('api_principal_request_duration_seconds', labels, time.perf_counter() - inicio)
+        registry.inc('api_principal_requests_total', labels + (('status', str(response.status_code)),))
+        if response.is_streamed:
+            response.response = self._contar_bytes(response.response, registry, labels)
+        else:
+            # Mais barato que ler o cabeçalho Content-Length
+            registry.inc('api_principal_response_bytes_total', labels, sum(map(len, response.response)))
+        return response
+
+    @staticmethod
+    def _contar_bytes(partes, registry, labels):
+        enviados = 0
+        try:
+            for parte in partes:
+                enviados += len(parte)
+                yield parte
+        finally:
+            registry.inc('api_principal_response_bytes_total', labels, enviados)
+
+    @staticmethod
+    def _encerrar(registry, exc):
+        _contexto.registry = None
+        atual = registry.requisicao
+        if getattr(atual, 'inicio', None) is not None:
+            atual.inicio = None
+            registry.gauge_add('api_principal_requests_in_flight', (atual.labels[0],), -1)
+
+    def _gravar_periodicamente(self, app, diretorio, intervalo):
+        while True:
+            time.sleep(intervalo)
+            try:
+                with app.app_context():
+                    self._gravar(self._acumulado_local(), diretorio)
+            except OSError as e:
+                app.logger.error(f"Erro ao gravar métricas: {str(e)}")
+
+    @staticmethod
+    def _gravar(shard, diretorio):
+        pid = os.getpid()
+        caminho = os.path.join(diretorio, f'{pid}.json')
+        temporario = f'{caminho}.tmp'
+        with open(temporario, 'w') as arquivo:
+            json.dump(_serializar(shard, pid), arquivo)
+        os.replace(temporario, caminho)
+
+    def _acumulado_local(self):
+        shard = self.registry.coletar()
+        self._coletar_estado(shard)
+        return shard
+
+    def coletar(self, local=None):
+        """
+        Retorna o acumulado deste worker somado ao dos demais workers (se METRICS_DIR estiver configurado)
+        """
+        if local is None:
+            local = self._acumulado_local()
+        diretorio = current_app.config['METRICS_DIR']
+        if not diretorio:
+            return local
+
+        total = _Shard()
+        total.somar(local)
+        pid = os.getpid()
+        for caminho in glob.glob(os.path.join(diretorio, '*.json')):
+            try:
+                with open(caminho) as arquivo:
+                    dados = json.load(arquivo)
+            except (OSError, ValueError):
+                continue
+            if dados['pid'] == pid:
+                continue
+            outro = _desserializar(dados)
+            if not _processo_vivo(dados['pid']):
+                # Contadores de workers encerrados continuam valendo; gauges não
+                outro.gauges = {}
+            total.somar(outro)
+        return total
+
+    @staticmethod
+    def _coletar_estado(shard):
+        """
+        Inclui no acumulado do worker o estado dos circuit breakers, das réplicas, dos caches e do journal
+        """
+        from .extensions import cotacao_cache, response_cache, cep_store, balance_projection, write_behind
+
+        estado_upstream = current_app.extensions['upstream']
+        for nome, breaker in estado_upstream.breakers.items():
+            aberto = 0 if breaker.info()['estado'] == 'closed' else 1
+            shard.gauges[('api_principal_circuit_open', (('upstream', nome),))] = aberto
+        for nome, destinos in estado_upstream.destinos.items():
+            for destino in destinos:
+                rotulos = (('upstream', nome), ('replica', destino.url))
+                shard.gauges[('api_principal_upstream_replica_healthy', rotulos)] = int(destino.saudavel)
+                shard.gauges[('api_principal_upstream_replica_in_flight', rotulos)] = destino.em_andamento
+        caches = [
+            ('cotacao', cotacao_cache.stats),
+            ('respostas', response_cache.stats),
+            ('ceps', cep_store.stats),
+            ('saldos', balance_projection.stats),
+        ]
+        for cache, stats in caches:
+            for evento, valor in stats().items():
+                if evento not in EVENTOS_CACHE:
+                    continue
+                shard.counters[('api_principal_cache_events_total', (('cache', cache), ('event', evento)))] = valor
+        for evento, valor in write_behind.stats().items():
+            if evento == 'pendentes':
+                shard.gauges[('api_principal_write_behind_pending', ())] = valor
+            else:
+                shard.counters[('api_principal_write_behind_events_total', (('event', evento),))] = valor
+
+    def exportar(self):
+        """
+        Grava o acumulado deste worker (para os demais) e retorna o texto no formato Prometheus
+        """
+        local = self._acumulado_local()
+        diretorio = current_app.config['METRICS_DIR']
+        if diretorio:
+            self._gravar(local, diretorio)
+        return formatar_prometheus(self.coletar(local))
+
+
+def medir_upstream(func):
+    """
+    Decorator das funções de app/utils.py que acessam as APIs secundárias:
+    registra a latência e as chamadas em andamento por função
+    """
+    labels = (('helper', func.__name__),)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Na thread da requisição o registro já está no contexto; em outras threads busca na aplicação
+        registry = getattr(_contexto, 'registry', None) or current_app.extensions['metrics']
+        registry.gauge_add('api_principal_upstream_in_flight', labels, 1)
+        inicio = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            registry.observe('api_principal_upstream_duration_seconds', labels, time.perf_counter() - inicio)
+            registry.gauge_add('api_principal_upstream_in_flight', labels, -1)
+
+    return wrapper
@@ -1,26 +1,144 @@
-from flask import request, Blueprint
+import json
+import math
+from decimal import Decimal
+from functools import wraps
+
+from flask import request, Blueprint, current_app, Response, send_file, stream_with_context
 from flask_restx import Resource, fields
-from .extensions import api
+from .batch import executar_em_lote
+from .cache import contem_mensagem
+from .cep import normalizar_cep
+from .history import (
+    FiltroTransacoes, HistoricoIndisponivel, HistoricoNaoEncontrado, ResumoTransacoes, iterar_transacoes
+)
+from .simulation import CotacaoIndisponivel, SimulacaoInvalida, ler_simulacao, simulacao_json, simular
+from .extensions import api, cotacao_cache, balance_projection, upstream, health, metrics, idempotency, admission, user_import, write_behind
+from .idempotency import IdempotencyConflict, impressao_digital
+from .upstream import CircuitOpenError, modulo_sob_demanda
+from .user_import import ImportacaoInvalida, campo_obrigatorio_ausente, detectar_formato, resultado_criacao
+from .write_behind import JournalIndisponivel, TransacaoInvalida
 from .utils import (
     consultar_api_viacep,
     criar_usuario,
     atualizar_usuario,
     obter_usuario,
+    obter_usuario_bruto,
     listar_usuarios,
+    abrir_stream_usuarios,
+    iterar_array_json,
     excluir_usuario,
     consultar_cotacao_dolar,
+    buscar_cotacao_dolar,
     registrar_compra_dolar,
     registrar_venda_dolar,
     obter_transacao,
-    obter_saldo_usuario
+    obter_saldo_usuario,
+    abrir_transacoes_usuario,
+    executar_em_paralelo
 )
 
+requests = modulo_sob_demanda('requests')
+
 # Blueprint
 main = Blueprint('main', __name__)
 
+
+@main.route('/status/upstreams')
+def status_upstreams():
+    """Estado dos circuit breakers das APIs secundárias"""
+    return upstream.circuitos()
+
+
+@main.route('/health/live')
+def health_live():
+    """Vivacidade do worker: não consulta as APIs secundárias"""
+    return health.vivo()
+
+
+@main.route('/health/ready')
+def health_ready():
+    """Prontidão do worker: pools criados e réplicas das APIs secundárias respondendo"""
+    corpo, pronto = health.pronto()
+    return corpo, 200 if pronto else 503
+
+
+@main.route('/status/admissao')
+def status_admissao():
+    """Contadores do controle de admissão"""
+    return admission.stats()
+
+
+@main.route('/metrics')
+def exportar_metricas():
+    """Métricas no formato de texto do Prometheus"""
+    return Response(metrics.exportar(), mimetype='text/plain; version=0.0.4')
+
+
+def tratar_circuito_aberto(view):
+    """
+    Responde 503 com Retry-After quando o circuito da API secundária está aberto,
+    sem registrar o erro como uma exceção da aplicação
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        except CircuitOpenError as error:
+            retry_after = max(math.ceil(error.retry_after), 1)
+            return api.make_response(
+                {'message': f'API secundária indisponível: {error.nome}'}, 503, {'Retry-After': str(retry_after)}
+            )
+    return wrapper
+
+
+# Cabeçalhos armazenados com a resposta idempotente e devolvidos nas repetições
+CABECALHOS_REPRODUZIDOS = ('Location', 'Preference-Applied')
+
+
+def idempotente(view):
+    """
+    Executa uma única vez as requisições com o mesmo cabeçalho Idempotency-Key;
+    repetições recebem a resposta original com Idempotent-Replayed: true
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        chave = request.headers.get('Idempotency-Key')
+        if not chave:
+            return view(*args, **kwargs)
+        if len(chave) > 255:
+            return {'message': 'Idempotency-Key inválida: use no máximo 255 caracteres'}, 400
+
+        digital = impressao_digital(
+            request.method, request.path, [request.args.to_dict(flat=False), request.get_data(as_text=True)]
+        )
+        # Cabeçalhos da resposta original; só CABECALHOS_REPRODUZIDOS são armazenados com ela
+        headers = {}
+
+        def executar():
+            corpo, status, *extra = view(*args, **kwargs)
+            if extra:
+                headers.update(extra[0])
+            return corpo, status, {nome: headers[nome] for nome in CABECALHOS_REPRODUZIDOS if nome in headers}
+
+        try:
+            corpo, status, reproduzidos, reproduzida = idempotency.executar(
+                f'{request.path}:{chave}', digital, executar
+            )
+        except IdempotencyConflict as error:
+            headers = {'Retry-After': '1'} if error.status == 409 else {}
+            return {'message': error.message}, error.status, headers
+        if reproduzida:
+            headers.update(reproduzidos)
+        headers['Idempotent-Replayed'] = 'true' if reproduzida else 'false'
+        return corpo, status, headers
+    return wrapper
+
+
 # Namespaces
-ns_users = api.namespace('users', description='Operações relacionadas a usuários')
-ns_transactions = api.namespace('transactions', description='Operações relacionadas a transações')
+ns_users = api.namespace('users', description='Operações relacionadas a usuários',
+                         decorators=[tratar_circuito_aberto])
+ns_transactions = api.namespace('transactions', description='Operações relacionadas a transações',
+                                decorators=[tratar_circuito_aberto])
 
 # Models
 user_model = api.model('User', {
@@ -51,17 +169,97 @@ saldo_model = api.model('Saldo', {
 })
 
 
+# Cabeçalhos de paginação da API secundária repassados ao cliente
+CABECALHOS_PAGINACAO = ['X-Next-Cursor', 'Link']
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _transmitir_usuarios(params, formato):
+    """
+    Repassa a listagem de usuários ao cliente à medida que chega da API secundária
+    """
+    resposta = abrir_stream_usuarios(params)
+    if resposta is None:
+        return {'message': 'Erro ao obter usuários da API secundária'}, 500
+
+    def gerar():
+        try:
+            if formato == 'json':
+                # Os bytes do array são repassados sem decodificar
+                yield from resposta.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            else:
+                for usuario in iterar_array_json(resposta.iter_content(chunk_size=STREAM_CHUNK_SIZE)):
+                    yield json.dumps(usuario) + '\n'
+        finally:
+            resposta.close()
+
+    headers = {nome: resposta.headers[nome] for nome in CABECALHOS_PAGINACAO if nome in resposta.headers}
+    mimetype = 'application/json' if formato == 'json' else 'application/x-ndjson'
+    return Response(stream_with_context(gerar()), mimetype=mimetype, headers=headers)
+
+
+def _repassar_usuarios(params):
+    """
+    Repassa ao cliente os bytes da listagem de usuários da API secundária, sem
+    decodificar e recodificar o JSON. Só um corpo que não seja um array (ex.: um
+    erro com 'message') é lido por inteiro e decodificado.
+    """
+    resposta = abrir_stream_usuarios(params)
+    if resposta is None:
+        return {'message': 'Erro ao obter usuários da API secundária'}, 500
+
+    partes = resposta.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+    primeira = next(partes, b'')
+    if not primeira.lstrip().startswith(b'['):
+        try:
+            return json.loads(primeira + b''.join(partes))
+        except ValueError:
+            # Corpo vazio ou que não é JSON (ex.: página de erro em HTML)
+            current_app.logger.error("Resposta inválida da listagem de usuários da API ViaCEP")
+            return {'message': 'Erro ao obter usuários da API secundária'}, 500
+        finally:
+            resposta.close()
+
+    def gerar():
+        try:
+            yield primeira
+            yield from partes
+        finally:
+            resposta.close()
+
+    headers = {nome: resposta.headers[nome] for nome in CABECALHOS_PAGINACAO if nome in resposta.headers}
+    if 'Content-Length' in resposta.headers and 'Content-Encoding' not in resposta.headers:
+        headers['Content-Length'] = resposta.headers['Content-Length']
+    return Response(stream_with_context(gerar()), mimetype='application/json', headers=headers)
+
+
 @ns_users.route('/')
 class UserList(Resource):
-    @ns_users.doc('list_users')
+    @ns_users.doc('list_users',
+                params={
+                    'cursor': 'Cursor de paginação (repassado à API secundária)',
+                    'limit': 'Quantidade máxima de usuários por página',
+                    'stream': 'Transmite a lista em partes: json (array) ou ndjson (um usuário por linha)'
+                })
     @ns_users.response(200, 'Sucesso')
+    @ns_users.response(400, 'Parâmetros inválidos')
     @ns_users.response(500, 'Erro ao listar usuários')
     def get(self):
-        """Lista todos os usuários"""
-        usuarios = listar_usuarios()
+        """Lista os usuários"""
+        params = {campo: request.args[campo] for campo in ['cursor', 'limit'] if request.args.get(campo)}
+        formato = request.args.get('stream')
+        if formato:
+            if formato not in ('json', 'ndjson'):
+                return {'message': 'Parâmetro inválido: stream deve ser json ou ndjson'}, 400
+            return _transmitir_usuarios(params, formato)
+
+        if current_app.config['PASSTHROUGH_ENABLED']:
+            return _repassar_usuarios(params)
+
+        usuarios, cabecalhos = listar_usuarios(params)
         if usuarios is None:
             return {'message': 'Erro ao obter usuários da API secundária'}, 500
-        return usuarios
+        return usuarios, 200, {nome: cabecalhos[nome] for nome in CABECALHOS_PAGINACAO if nome in cabecalhos}
 
     @ns_users.doc('create_user',
                 params={
@@ -89,20 +287,68 @@ class UserList(Resource):
         }
         
         # Verifica se os campos obrigatórios estão presentes
-        for campo in ['nome_completo', 'email', 'senha', 'cpf', 'cep']:
-            if not dados_usuario.get(campo):
-                return {'message': f'Campo obrigatório ausente: {campo}'}, 400
+        campo = campo_obrigatorio_ausente(dados_usuario)
+        if campo is not None:
+            return {'message': f'Campo obrigatório ausente: {campo}'}, 400
         
         # Envia para a API secundária
-        resultado = criar_usuario(dados_usuario)
-        if resultado is None:
-            return {'message': 'Erro ao criar usuário na API secundária'}, 500
-        
-        if 'message' in resultado:
-            # Se a API secundária retornou um erro
-            return resultado, 400 if 'inválido' in resultado['message'] else 409
-        
-        return resultado, 201
+        return resultado_criacao(criar_usuario(dados_usuario))
+
+
+@ns_users.route('/import')
+class UserImportList(Resource):
+    @ns_users.doc('import_users',
+                description='Corpo: arquivo CSV (com cabeçalho) ou NDJSON com os campos nome_completo, email, '
+                            'senha, cpf, cep e complemento, enviado como multipart (campo "arquivo") ou '
+                            'diretamente no corpo (Content-Type text/csv ou application/x-ndjson). '
+                            'A importação roda em segundo plano; acompanhe em GET /users/import/{id}.',
+                params={'formato': 'csv ou ndjson (padrão: pela extensão do arquivo ou pelo Content-Type)'})
+    @ns_users.response(202, 'Importação iniciada')
+    @ns_users.response(400, 'Arquivo inválido')
+    def post(self):
+        """Importa usuários em massa a partir de um arquivo CSV ou NDJSON"""
+        arquivo = request.files.get('arquivo') if request.mimetype == 'multipart/form-data' else None
+        if arquivo is not None:
+            origem, nome, mimetype = arquivo.stream, arquivo.filename, arquivo.mimetype
+        else:
+            origem, nome, mimetype = request.stream, None, request.mimetype
+        formato = detectar_formato(nome, mimetype, request.args.get('formato'))
+        if formato is None:
+            return {'message': 'Formato inválido: envie um arquivo CSV ou NDJSON'}, 400
+
+        try:
+            status = user_import.iniciar(origem, formato, criar_usuario, consultar_api_viacep)
+        except ImportacaoInvalida as error:
+            return {'message': str(error)}, 400
+        return status, 202, {'Location': api.url_for(UserImportStatus, importacao_id=status['id'])}
+
+
+@ns_users.route('/import/<string:importacao_id>')
+@ns_users.param('importacao_id', 'ID da importação')
+class UserImportStatus(Resource):
+    @ns_users.doc('get_user_import')
+    @ns_users.response(200, 'Sucesso')
+    @ns_users.response(404, 'Importação não encontrada')
+    def get(self, importacao_id):
+        """Obtém o progresso de uma importação de usuários"""
+        status = user_import.status(importacao_id)
+        if status is None:
+            return {'message': 'Importação não encontrada'}, 404
+        return status
+
+
+@ns_users.route('/import/<string:importacao_id>/resultado')
+@ns_users.param('importacao_id', 'ID da importação')
+class UserImportResult(Resource):
+    @ns_users.doc('get_user_import_result')
+    @ns_users.response(200, 'Resultado por linha (NDJSON)')
+    @ns_users.response(404, 'Importação não encontrada')
+    def get(self, importacao_id):
+        """Obtém o resultado por linha de uma importação (uma linha NDJSON por linha do arquivo)"""
+        caminho = user_import.caminho_resultado(importacao_id)
+        if caminho is None:
+            return {'message': 'Importação não encontrada'}, 404
+        return send_file(caminho, mimetype='application/x-ndjson', conditional=False, max_age=0)
 
 
 @ns_users.route('/<int:id>')
@@ -114,9 +360,18 @@ class UserResource(Resource):
     @ns_users.response(500, 'Erro ao obter usuário')
     def get(self, id):
         """Obtém os dados de um usuário específico"""
-        usuario = obter_usuario(id)
-        if usuario is None:
-            return {'message': 'Erro ao obter usuário da API secundária'}, 500
+        if current_app.config['PASSTHROUGH_ENABLED']:
+            corpo = obter_usuario_bruto(id)
+            if corpo is None:
+                return {'message': 'Erro ao obter usuário da API secundária'}, 500
+            if not contem_mensagem(corpo):
+                return Response(corpo, mimetype='application/json')
+            # Só decodifica o corpo quando o status depende do campo 'message'
+            usuario = json.loads(corpo)
+        else:
+            usuario = obter_usuario(id)
+            if usuario is None:
+                return {'message': 'Erro ao obter usuário da API secundária'}, 500
         if 'message' in usuario:
             return {'message': 'Usuário não encontrado'}, 404
         return usuario
@@ -172,17 +427,146 @@ class UserResource(Resource):
         return '', 204
 
 
+@ns_users.route('/cep/<string:cep>')
+@ns_users.param('cep', 'CEP com 8 dígitos (com ou sem hífen)')
+class CepResource(Resource):
+    @ns_users.doc('consultar_cep')
+    @ns_users.response(200, 'Sucesso')
+    @ns_users.response(400, 'CEP inválido')
+    @ns_users.response(404, 'CEP não encontrado')
+    @ns_users.response(500, 'Erro ao consultar CEP')
+    def get(self, cep):
+        """Consulta o endereço de um CEP (servido do índice local de CEPs)"""
+        if normalizar_cep(cep) is None:
+            return {'message': 'CEP inválido'}, 400
+
+        endereco = consultar_api_viacep(cep)
+        if endereco is None:
+            return {'message': 'Erro ao consultar CEP na API secundária'}, 500
+        if 'message' in endereco or endereco.get('erro'):
+            return {'message': 'CEP não encontrado'}, 404
+        return endereco
+
+
+CAMPOS_TRANSACAO = {'compra': ('user_id', 'valor_brl'), 'venda': ('user_id', 'quantidade_usd')}
+
+
+def campo_transacao_ausente(tipo, dados):
+    """
+    Retorna o nome do primeiro campo obrigatório ausente da compra ou venda ou None
+    """
+    for campo in CAMPOS_TRANSACAO[tipo]:
+        if not dados.get(campo):
+            return campo
+    return None
+
+
+def processar_compra(dados_compra):
+    """
+    Valida e registra uma compra, retornando (corpo, status) como em POST /transactions/compra
+    """
+    # Verifica se os campos obrigatórios estão presentes
+    campo = campo_transacao_ausente('compra', dados_compra)
+    if campo is not None:
+        return {'message': f'Campo obrigatório ausente: {campo}'}, 400
+    
+    # Envia para a API secundária (o saldo projetado do usuário é atualizado com o resultado)
+    resultado = balance_projection.registrar(
+        dados_compra['user_id'], 'compra', lambda: registrar_compra_dolar(dados_compra)
+    )
+    if resultado is None:
+        return {'message': 'Erro ao registrar compra na API secundária'}, 500
+    
+    if 'message' in resultado:
+        if 'não encontrado' in resultado['message']:
+            return resultado, 404
+        else:
+            return resultado, 400
+    
+    return resultado, 201
+
+
+def processar_venda(dados_venda):
+    """
+    Valida e registra uma venda, retornando (corpo, status) como em POST /transactions/venda
+    """
+    # Verifica se os campos obrigatórios estão presentes
+    campo = campo_transacao_ausente('venda', dados_venda)
+    if campo is not None:
+        return {'message': f'Campo obrigatório ausente: {campo}'}, 400
+    
+    # Envia para a API secundária (o saldo projetado do usuário é atualizado com o resultado)
+    resultado = balance_projection.registrar(
+        dados_venda['user_id'], 'venda', lambda: registrar_venda_dolar(dados_venda)
+    )
+    if resultado is None:
+        return {'message': 'Erro ao registrar venda na API secundária'}, 500
+    
+    if 'message' in resultado:
+        if 'não encontrado' in resultado['message']:
+            return resultado, 404
+        elif 'insuficiente' in resultado['message']:
+            return resultado, 400
+        else:
+            return resultado, 400
+    
+    return resultado, 201
+
+
+@write_behind.processador
+def processar_transacao(tipo, dados):
+    """
+    Envia uma compra ou venda aceita de forma assíncrona (chamada pelo despachante do journal)
+    """
+    if tipo == 'compra':
+        return processar_compra(dados)
+    return processar_venda(dados)
+
+
+def aceitar_transacao(tipo, dados):
+    """
+    Valida a compra ou venda e a grava no journal, respondendo 202 com o id de acompanhamento
+    """
+    campo = campo_transacao_ausente(tipo, dados)
+    if campo is not None:
+        return {'message': f'Campo obrigatório ausente: {campo}'}, 400
+    try:
+        pendente = write_behind.aceitar(tipo, dados)
+    except TransacaoInvalida as error:
+        return {'message': str(error)}, 400
+    except JournalIndisponivel as error:
+        current_app.logger.error(f"Erro ao gravar a transação no journal: {str(error)}")
+        return {'message': 'Não foi possível aceitar a transação agora'}, 503, {'Retry-After': '1'}
+    headers = {
+        'Location': api.url_for(TransacaoPendente, tracking_id=pendente['tracking_id']),
+        'Preference-Applied': 'respond-async'
+    }
+    return pendente, 202, headers
+
+
+PARAMETRO_PREFER = {
+    'in': 'header',
+    'description': 'respond-async: aceita a transação de forma assíncrona (202), se o write-behind estiver ativo'
+}
+
+
 @ns_transactions.route('/compra')
 class CompraTransaction(Resource):
     @ns_transactions.doc('comprar_dolar',
                       params={
                           'user_id': 'ID do usuário',
-                          'valor_brl': 'Valor em BRL para compra de USD'
+                          'valor_brl': 'Valor em BRL para compra de USD',
+                          'Idempotency-Key': {'in': 'header', 'description': 'Chave para repetir a requisição sem duplicar a compra'},
+                          'Prefer': PARAMETRO_PREFER
                       })
     @ns_transactions.response(201, 'Compra registrada')
+    @ns_transactions.response(202, 'Compra aceita para envio posterior (acompanhe em Location)')
     @ns_transactions.response(400, 'Dados inválidos')
     @ns_transactions.response(404, 'Usuário não encontrado')
     @ns_transactions.response(500, 'Erro ao registrar compra')
+    @ns_transactions.response(409, 'Requisição com a mesma Idempotency-Key em andamento')
+    @ns_transactions.response(422, 'Idempotency-Key já utilizada com outros parâmetros')
+    @idempotente
     def post(self):
         """Registra uma compra de dólares"""
         # Coleta os dados dos parâmetros
@@ -191,23 +575,12 @@ class CompraTransaction(Resource):
             'valor_brl': request.args.get('valor_brl')
         }
         
-        # Verifica se os campos obrigatórios estão presentes
-        for campo in ['user_id', 'valor_brl']:
-            if not dados_compra.get(campo):
-                return {'message': f'Campo obrigatório ausente: {campo}'}, 400
-        
-        # Envia para a API secundária
-        resultado = registrar_compra_dolar(dados_compra)
-        if resultado is None:
-            return {'message': 'Erro ao registrar compra na API secundária'}, 500
-        
-        if 'message' in resultado:
-            if 'não encontrado' in resultado['message']:
-                return resultado, 404
-            else:
-                return resultado, 400
-        
-        return resultado, 201
+        # Com o write-behind, grava no journal e responde sem esperar a API secundária
+        if write_behind.assincrona():
+            return aceitar_transacao('compra', dados_compra)
+
+        # Valida e envia para a API secundária
+        return processar_compra(dados_compra)
 
 
 @ns_transactions.route('/venda')
@@ -215,12 +588,18 @@ class VendaTransaction(Resource):
     @ns_transactions.doc('vender_dolar',
                        params={
                            'user_id': 'ID do usuário',
-                           'quantidade_usd': 'Quantidade em USD para vender'
+                           'quantidade_usd': 'Quantidade em USD para vender',
+                           'Idempotency-Key': {'in': 'header', 'description': 'Chave para repetir a requisição sem duplicar a venda'},
+                           'Prefer': PARAMETRO_PREFER
                        })
     @ns_transactions.response(201, 'Venda registrada')
+    @ns_transactions.response(202, 'Venda aceita para envio posterior (acompanhe em Location)')
     @ns_transactions.response(400, 'Dados inválidos')
     @ns_transactions.response(404, 'Usuário não encontrado')
     @ns_transactions.response(500, 'Erro ao registrar venda')
+    @ns_transactions.response(409, 'Requisição com a mesma Idempotency-Key em andamento')
+    @ns_transactions.response(422, 'Idempotency-Key já utilizada com outros parâmetros')
+    @idempotente
     def post(self):
         """Registra uma venda de dólares"""
         # Coleta os dados dos parâmetros
@@ -229,25 +608,140 @@ class VendaTransaction(Resource):
             'quantidade_usd': request.args.get('quantidade_usd')
         }
         
-        # Verifica se os campos obrigatórios estão presentes
-        for campo in ['user_id', 'quantidade_usd']:
-            if not dados_venda.get(campo):
-                return {'message': f'Campo obrigatório ausente: {campo}'}, 400
-        
-        # Envia para a API secundária
-        resultado = registrar_venda_dolar(dados_venda)
-        if resultado is None:
-            return {'message': 'Erro ao registrar venda na API secundária'}, 500
-        
-        if 'message' in resultado:
-            if 'não encontrado' in resultado['message']:
-                return resultado, 404
-            elif 'insuficiente' in resultado['message']:
-                return resultado, 400
+        # Com o write-behind, grava no journal e responde sem esperar a API secundária
+        if write_behind.assincrona():
+            return aceitar_transacao('venda', dados_venda)
+
+        # Valida e envia para a API secundária
+        return processar_venda(dados_venda)
+
+
+def _ler_itens_lote():
+    """
+    Lê os itens do corpo de POST /transactions/batch (array JSON ou NDJSON)
+    """
+    corpo = request.get_data(as_text=True).strip()
+    if request.mimetype == 'application/x-ndjson' or not corpo.startswith('['):
+        return [json.loads(linha) for linha in corpo.splitlines() if linha.strip()]
+    return json.loads(corpo)
+
+
+@ns_transactions.route('/batch')
+class BatchTransaction(Resource):
+    @ns_transactions.doc('lote_transacoes',
+                       description='Corpo: array JSON ou NDJSON (application/x-ndjson) de itens '
+                                   '{"tipo": "compra", "user_id": 1, "valor_brl": 100} ou '
+                                   '{"tipo": "venda", "user_id": 1, "quantidade_usd": 10}. '
+                                   'A resposta é NDJSON com uma linha {"indice", "status", "resultado"} '
+                                   'por item, na ordem de conclusão, e uma linha final "resumo".')
+    @ns_transactions.response(200, 'Resultados por item (NDJSON)')
+    @ns_transactions.response(400, 'Corpo inválido')
+    def post(self):
+        """Registra compras e vendas em lote"""
+        try:
+            itens = _ler_itens_lote()
+        except ValueError:
+            return {'message': 'Corpo inválido: envie um array JSON ou NDJSON'}, 400
+        if not isinstance(itens, list) or not itens:
+            return {'message': 'Corpo inválido: nenhum item informado'}, 400
+        if len(itens) > current_app.config['BATCH_MAX_ITEMS']:
+            return {'message': 'Número máximo de itens excedido'}, 400
+
+        invalidos = []
+        validos = []
+        for indice, item in enumerate(itens):
+            if not isinstance(item, dict) or item.get('tipo') not in ('compra', 'venda'):
+                invalidos.append((indice, {'message': 'Tipo inválido: use compra ou venda'}, 400))
             else:
-                return resultado, 400
-        
-        return resultado, 201
+                # Itens do mesmo usuário são enviados em ordem
+                validos.append((indice, str(item.get('user_id')), item))
+
+        def processar(item):
+            if item['tipo'] == 'compra':
+                return processar_compra({'user_id': item.get('user_id'), 'valor_brl': item.get('valor_brl')})
+            return processar_venda({'user_id': item.get('user_id'), 'quantidade_usd': item.get('quantidade_usd')})
+
+        def gerar():
+            contagem = {}
+            resultados = executar_em_lote(validos, processar, current_app.config['BATCH_MAX_CONCURRENCY'])
+            for indice, corpo, status in invalidos:
+                contagem[status] = contagem.get(status, 0) + 1
+                yield json.dumps({'indice': indice, 'status': status, 'resultado': corpo}) + '\n'
+            for indice, corpo, status in resultados:
+                contagem[status] = contagem.get(status, 0) + 1
+                yield json.dumps({'indice': indice, 'status': status, 'resultado': corpo}) + '\n'
+            yield json.dumps({'resumo': {'total': len(itens), 'status': contagem}}) + '\n'
+
+        return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+
+@ns_transactions.route('/cotacao')
+class CotacaoDolar(Resource):
+    @ns_transactions.doc('get_cotacao')
+    @ns_transactions.response(200, 'Sucesso')
+    @ns_transactions.response(500, 'Erro ao obter cotação')
+    def get(self):
+        """Obtém a cotação atual do dólar em BRL (servida do cache)"""
+        cotacao, status = cotacao_cache.get(buscar_cotacao_dolar)
+        if cotacao is None:
+            return {'message': 'Erro ao obter cotação da API secundária'}, 500
+        return cotacao, 200, {'X-Cache': status}
+
+
+@ns_transactions.route('/cotacao/cache')
+class CotacaoCacheStats(Resource):
+    @ns_transactions.doc('get_cotacao_cache_stats')
+    @ns_transactions.response(200, 'Sucesso')
+    def get(self):
+        """Obtém os contadores de acerto/falha do cache de cotação"""
+        return cotacao_cache.stats()
+
+
+@ns_transactions.route('/simular')
+class SimularTransacoes(Resource):
+    @ns_transactions.doc('simular_transacoes',
+                       description='Corpo: {"valores_brl": [100, 250.5]} (compras) e/ou '
+                                   '{"quantidades_usd": [10, 20]} (vendas). Cada valor é precificado com a '
+                                   'cotação atual (servida do cache), arredondado como na API secundária, '
+                                   'sem registrar transações. A resposta traz as listas na ordem enviada.')
+    @ns_transactions.response(200, 'Sucesso')
+    @ns_transactions.response(400, 'Corpo inválido')
+    @ns_transactions.response(500, 'Erro ao obter cotação')
+    def post(self):
+        """Simula compras e vendas de dólares com a cotação atual"""
+        try:
+            valores_brl, quantidades_usd = ler_simulacao(
+                request.get_data(), current_app.config['SIMULACAO_MAX_ITENS']
+            )
+        except SimulacaoInvalida as error:
+            return {'message': str(error)}, 400
+
+        # Só a cotação é consultada: nenhuma transação é registrada na API secundária
+        cotacao, status = cotacao_cache.get(buscar_cotacao_dolar)
+        if cotacao is None or cotacao.get('cotacao') is None:
+            return {'message': 'Erro ao obter cotação da API secundária'}, 500
+        try:
+            simulacao = simular(cotacao['cotacao'], valores_brl, quantidades_usd)
+        except CotacaoIndisponivel as error:
+            current_app.logger.error(f"Simulação sem cotação válida: {str(error)}")
+            return {'message': 'Cotação indisponível na API secundária'}, 500
+        return Response(
+            simulacao_json(simulacao, cotacao.get('data')), mimetype='application/json', headers={'X-Cache': status}
+        )
+
+
+@ns_transactions.route('/pendentes/<string:tracking_id>')
+@ns_transactions.response(404, 'Transação não encontrada')
+@ns_transactions.param('tracking_id', 'Id de acompanhamento retornado no aceite assíncrono')
+class TransacaoPendente(Resource):
+    @ns_transactions.doc('get_transacao_pendente')
+    @ns_transactions.response(200, 'Sucesso')
+    def get(self, tracking_id):
+        """Obtém o andamento de uma compra ou venda aceita de forma assíncrona"""
+        status = write_behind.status(tracking_id)
+        if status is None:
+            return {'message': 'Transação não encontrada'}, 404
+        return status
 
 
 @ns_transactions.route('/<int:id>')
@@ -276,9 +770,126 @@ class UserBalance(Resource):
     @ns_users.response(500, 'Erro ao obter saldo')
     def get(self, id):
         """Obtém o saldo em USD do usuário"""
-        saldo = obter_saldo_usuario(id)
+        saldo, status = balance_projection.get(id, obter_saldo_usuario)
         if saldo is None:
             return {'message': 'Erro ao obter saldo da API secundária'}, 500
         if 'message' in saldo:
             return {'message': 'Usuário não encontrado'}, 404
-        return saldo
\ No newline at end of file
+        return saldo, 200, {'X-Cache': status} if status else {}
+
+
+@ns_users.route('/<int:id>/resumo')
+@ns_users.response(404, 'Usuário não encontrado')
+@ns_users.param('id', 'ID do usuário')
+class UserSummary(Resource):
+    @ns_users.doc('get_user_summary',
+                params={
+                    'transacoes': 'IDs das transações a incluir, separados por vírgula (opcional)'
+                })
+    @ns_users.response(200, 'Sucesso (seções com falha vêm com null e a mensagem em "erros")')
+    @ns_users.response(400, 'Parâmetros inválidos')
+    def get(self, id):
+        """Obtém usuário, saldo e transações em uma única chamada"""
+        try:
+            ids_transacoes = [int(t) for t in request.args.get('transacoes', '').split(',') if t.strip()]
+        except ValueError:
+            return {'message': 'Parâmetro inválido: transacoes'}, 400
+        if len(ids_transacoes) > current_app.config['RESUMO_MAX_TRANSACOES']:
+            return {'message': 'Número máximo de transações excedido'}, 400
+
+        # Todas as chamadas às APIs secundárias são feitas em paralelo
+        tarefas = {
+            'usuario': lambda: obter_usuario(id),
+            'saldo': lambda: balance_projection.get(id, obter_saldo_usuario)[0]
+        }
+        for transaction_id in ids_transacoes:
+            tarefas[transaction_id] = lambda transaction_id=transaction_id: obter_transacao(transaction_id)
+        resultados = executar_em_paralelo(tarefas)
+
+        usuario = resultados['usuario']
+        if usuario is not None and 'message' in usuario:
+            return {'message': 'Usuário não encontrado'}, 404
+
+        resumo = {'usuario': usuario, 'saldo': resultados['saldo'], 'transacoes': [], 'erros': {}}
+        if usuario is None:
+            resumo['erros']['usuario'] = 'Erro ao obter usuário da API secundária'
+        if resumo['saldo'] is None or 'message' in resumo['saldo']:
+            resumo['saldo'] = None
+            resumo['erros']['saldo'] = 'Erro ao obter saldo da API secundária'
+
+        for transaction_id in ids_transacoes:
+            transacao = resultados[transaction_id]
+            if transacao is None:
+                erro = 'Erro ao obter transação da API secundária'
+            elif 'message' in transacao:
+                erro = 'Transação não encontrada'
+            elif transacao.get('user_id') != id:
+                erro = 'Transação não pertence ao usuário'
+            else:
+                resumo['transacoes'].append(transacao)
+                continue
+            resumo['erros'][f'transacao:{transaction_id}'] = erro
+        return resumo
+
+
+@ns_users.route('/<int:id>/transactions')
+@ns_users.param('id', 'ID do usuário')
+class UserTransactions(Resource):
+    @ns_users.doc('list_user_transactions',
+                params={
+                    'from': 'Data inicial (ISO 8601, inclusiva)',
+                    'to': 'Data final (ISO 8601, inclusiva)',
+                    'tipo': 'compra ou venda',
+                    'limit': 'Quantidade máxima de transações por página',
+                    'cursor': 'Cursor de paginação (cabeçalho X-Next-Cursor da página anterior)',
+                    'resumo': 'true para retornar os totais por dia e por tipo em vez das transações'
+                })
+    @ns_users.response(200, 'Sucesso')
+    @ns_users.response(400, 'Parâmetros inválidos')
+    @ns_users.response(404, 'Usuário não encontrado')
+    @ns_users.response(500, 'Erro ao obter transações')
+    def get(self, id):
+        """Lista as transações do usuário ou os totais por dia e por tipo"""
+        try:
+            filtro = FiltroTransacoes.dos_parametros(request.args)
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        try:
+            limite = int(request.args.get('limit', current_app.config['HISTORICO_LIMIT']))
+        except ValueError:
+            return {'message': 'Parâmetro inválido: limit deve ser um número inteiro'}, 400
+        limite = max(1, min(limite, current_app.config['HISTORICO_MAX_LIMIT']))
+        params = filtro.params()
+        if request.args.get('cursor'):
+            params['cursor'] = request.args['cursor']
+        abrir = lambda p: abrir_transacoes_usuario(id, p)
+
+        try:
+            if request.args.get('resumo', '').lower() == 'true':
+                # Os totais são acumulados à medida que as transações chegam, com valores Decimal
+                resumo = ResumoTransacoes()
+                for transacao in iterar_transacoes(abrir, params, parse_float=Decimal):
+                    if filtro.aceita(transacao):
+                        resumo.adicionar(transacao)
+                return {'user_id': id, **resumo.como_dict()}
+
+            # Lê uma transação além do limite para saber se há uma próxima página
+            transacoes = []
+            for transacao in iterar_transacoes(abrir, params):
+                if filtro.aceita(transacao):
+                    transacoes.append(transacao)
+                    if len(transacoes) > limite:
+                        break
+        except HistoricoNaoEncontrado as error:
+            return {'message': str(error)}, 404
+        except (HistoricoIndisponivel, ValueError, requests.exceptions.RequestException) as error:
+            # ValueError: corpo que não é um array JSON ou truncado; RequestException:
+            # conexão interrompida durante a leitura do corpo
+            current_app.logger.error(f"Erro ao ler transações da API Frankfurter: {str(error)}")
+            return {'message': 'Erro ao obter transações da API secundária'}, 500
+
+        headers = {}
+        if len(transacoes) > limite:
+            transacoes = transacoes[:limite]
+            headers['X-Next-Cursor'] = str(transacoes[-1]['id'])
+        return transacoes, 200, headers
@@ -0,0 +1,115 @@
+import json
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN, localcontext
+
+DUAS_CASAS = Decimal('0.01')
+# Valores a partir de 10^15 não cabem com 2 casas na precisão padrão do Decimal (28 dígitos)
+MAGNITUDE_MAXIMA = 15
+
+
+class SimulacaoInvalida(ValueError):
+    """
+    O corpo de POST /transactions/simular não pode ser precificado
+    """
+
+
+class CotacaoIndisponivel(ValueError):
+    """
+    A cotação recebida não é um número positivo e não pode ser usada na conversão
+    """
+
+
+def _valores(lista, campo):
+    """
+    Valida uma lista de valores lidos com parse_float=Decimal: números finitos e positivos
+    """
+    if lista is None:
+        return []
+    if not isinstance(lista, list):
+        raise SimulacaoInvalida(f'Campo inválido: {campo} deve ser uma lista de números')
+    valores = []
+    for indice, valor in enumerate(lista):
+        classe = valor.__class__
+        if classe is int:
+            valor = Decimal(valor)
+        elif classe is not Decimal or not valor.is_finite():
+            raise SimulacaoInvalida(f'Valor inválido em {campo}[{indice}]: informe um número')
+        if valor <= 0:
+            raise SimulacaoInvalida(f'Valor inválido em {campo}[{indice}]: deve ser maior que zero')
+        if valor.adjusted() >= MAGNITUDE_MAXIMA:
+            raise SimulacaoInvalida(f'Valor inválido em {campo}[{indice}]: maior que o permitido')
+        valores.append(valor)
+    return valores
+
+
+def ler_simulacao(corpo, max_itens):
+    """
+    Lê o corpo {"valores_brl": [...], "quantidades_usd": [...]} e retorna as
+    duas listas de Decimal; levanta SimulacaoInvalida com a mensagem de erro
+    """
+    try:
+        dados = json.loads(corpo, parse_float=Decimal)
+    except ValueError:
+        raise SimulacaoInvalida('Corpo inválido: envie um objeto JSON')
+    if not isinstance(dados, dict):
+        raise SimulacaoInvalida('Corpo inválido: envie um objeto JSON')
+    valores_brl = _valores(dados.get('valores_brl'), 'valores_brl')
+    quantidades_usd = _valores(dados.get('quantidades_usd'), 'quantidades_usd')
+    if not valores_brl and not quantidades_usd:
+        raise SimulacaoInvalida('Corpo inválido: informe valores_brl ou quantidades_usd')
+    if len(valores_brl) + len(quantidades_usd) > max_itens:
+        raise SimulacaoInvalida('Número máximo de itens excedido')
+    return valores_brl, quantidades_usd
+
+
+def simular(cotacao, valores_brl, quantidades_usd):
+    """
+    Precifica de uma vez as compras (valores em BRL) e as vendas (quantidades
+    em USD) com a cotação informada, como a API secundária as registraria:
+    a compra divide o valor em BRL pela cotação e a venda multiplica a
+    quantidade em USD pela cotação, em ponto flutuante (float), e o resultado
+    e o valor informado são arredondados para 2 casas (metade para o par) como
+    o round() da API. O arredondamento é feito em Decimal sobre o valor exato
+    do float, de forma que os empates e os resultados sejam os mesmos da API e
+    a resposta não passe por uma nova conversão para float.
+    Retorna o dicionário com as listas de Decimal, na ordem recebida; levanta
+    CotacaoIndisponivel se a cotação não for um número positivo.
+    """
+    try:
+        cotacao = Decimal(str(cotacao))
+    except InvalidOperation:
+        raise CotacaoIndisponivel(f'Cotação inválida: {cotacao!r}')
+    if not cotacao.is_finite() or cotacao <= 0:
+        raise CotacaoIndisponivel(f'Cotação inválida: {cotacao}')
+    fator = float(cotacao)
+    with localcontext() as contexto:
+        contexto.rounding = ROUND_HALF_EVEN
+        # Métodos resolvidos uma vez para a lista inteira; Decimal(float) é a conversão exata
+        arredondar = Decimal.quantize
+        compras = {
+            'valores_brl': [arredondar(Decimal(float(valor)), DUAS_CASAS) for valor in valores_brl],
+            'quantidades_usd': [arredondar(Decimal(float(valor) / fator), DUAS_CASAS) for valor in valores_brl]
+        }
+        vendas = {
+            'quantidades_usd': [arredondar(Decimal(float(quantidade)), DUAS_CASAS) for quantidade in quantidades_usd],
+            'valores_brl': [arredondar(Decimal(float(quantidade) * fator), DUAS_CASAS) for quantidade in quantidades_usd]
+        }
+    return {'cotacao': cotacao, 'compra': compras, 'venda': vendas}
+
+
+def _lista_json(valores):
+    # Decimais quantizados em 2 casas já são números JSON exatos ("18.41")
+    return '[' + ','.join(map(str, valores)) + ']'
+
+
+def simulacao_json(simulacao, data):
+    """
+    Serializa o resultado de `simular` sem converter os valores para float
+    """
+    compras, vendas = simulacao['compra'], simulacao['venda']
+    return (
+        f'{{"cotacao":{simulacao["cotacao"]},"data":{json.dumps(data)},'
+        f'"compra":{{"valores_brl":{_lista_json(compras["valores_brl"])},'
+        f'"quantidades_usd":{_lista_json(compras["quantidades_usd"])}}},'
+        f'"venda":{{"quantidades_usd":{_lista_json(vendas["quantidades_usd"])},'
+        f'"valores_brl":{_lista_json(vendas["valores_brl"])}}}}}'
+    )
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+import zlib
+
+from flask import Response, current_app, request
+
+# Respostas menores que isso não compensam a compressão
+TAMANHO_MINIMO_COMPRESSAO = 1024
+
+
+class _SpecState:
+    """
+    Especificação Swagger da aplicação já serializada, comprimida e com ETag
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.corpo = None
+        self.corpo_gzip = None
+        self.etag = None
+
+
+class SwaggerSpec:
+    """
+    Serve /swagger.json a partir de bytes gerados uma única vez.
+
+    A especificação do flask-restx é gerada na inicialização (no master do
+    gunicorn com preload) e guardada como JSON codificado e comprimido (gzip);
+    as requisições recebem esses bytes diretamente, com ETag e 304 para
+    If-None-Match. Deve ser inicializada depois de `api.init_app` e dos
+    namespaces, que registram a rota `specs` e os modelos.
+    """
+
+    def __init__(self, api=None, app=None):
+        self.api = api
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = _SpecState()
+        app.extensions['swagger_spec'] = state
+        if 'specs' not in app.view_functions:
+            return
+        app.view_functions['specs'] = self.servir
+        # O basePath da especificação vem do contexto; sem um prefixo (SCRIPT_NAME)
+        # ele é o mesmo em todas as requisições. Se a geração falhar, tenta de novo na primeira.
+        with app.test_request_context():
+            self._gerar(state)
+
+    @property
+    def state(self):
+        return current_app.extensions['swagger_spec']
+
+    def _gerar(self, state):
+        with state.lock:
+            if state.corpo is not None:
+                return True
+            schema = self.api.__schema__
+            if 'error' in schema:
+                return False
+            corpo = json.dumps(schema, separators=(',', ':')).encode('utf-8')
+            # wbits=31: formato gzip, sem carregar o módulo gzip
+            state.corpo_gzip = zlib.compress(corpo, 9, 31) if len(corpo) >= TAMANHO_MINIMO_COMPRESSAO else None
+            state.etag = hashlib.sha256(corpo).hexdigest()[:32]
+            state.corpo = corpo
+            return True
+
+    def servir(self):
+        state = self.state
+        if state.corpo is None and not self._gerar(state):
+            return Response(json.dumps(self.api.__schema__), status=500, mimetype='application/json')
+
+        headers = {'ETag': f'"{state.etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if state.etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+
+        corpo = state.corpo
+        if state.corpo_gzip is not None and 'gzip' in request.accept_encodings:
+            corpo = state.corpo_gzip
+            headers['Content-Encoding'] = 'gzip'
+        return Response(corpo, mimetype='application/json', headers=headers)
@@ -0,0 +1,405 @@
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import socket
+import threading
+import time
+from contextvars import ContextVar
+from functools import partial
+
+from flask import current_app, request
+
+# traceparent (W3C Trace Context): versão-trace_id-parent_id-flags
+TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+ZERO_TRACE = '0' * 32
+ZERO_SPAN = '0' * 16
+
+# OTLP: tipos de span e código de status de erro
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+# Span da requisição atendida pela thread (ou greenlet) atual; copiado para as
+# threads das chamadas paralelas por executar_em_paralelo e executar_em_lote
+_span_atual = ContextVar('span_atual', default=None)
+# Tempos de DNS e conexão da chamada upstream em andamento, preenchidos pelas conexões do pool
+_medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+def _novo_id(bits):
+    while True:
+        valor = random.getrandbits(bits)
+        if valor:
+            return f'{valor:0{bits // 4}x}'
+
+
+class Span:
+    """
+    Operação rastreada: a requisição recebida (servidor) ou uma chamada a uma
+    API secundária (cliente). Spans não amostrados só carregam os ids, para a
+    propagação do traceparent.
+    """
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'amostrado', 'tracestate', 'nome', 'tipo',
+                 'inicio_ns', 'fim_ns', 'atributos', 'erro')
+
+    def __init__(self, trace_id, parent_id, amostrado, nome, tipo, tracestate=None):
+        self.trace_id = trace_id
+        self.span_id = _novo_id(64)
+        self.parent_id = parent_id
+        self.amostrado = amostrado
+        self.tracestate = tracestate
+        self.nome = nome
+        self.tipo = tipo
+        self.inicio_ns = time.time_ns() if amostrado else 0
+        self.fim_ns = None
+        self.atributos = {} if amostrado else None
+        self.erro = False
+
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-{"01" if self.amostrado else "00"}'
+
+    def filho(self, nome, tipo=SPAN_KIND_CLIENT):
+        return Span(self.trace_id, self.span_id, self.amostrado, nome, tipo, self.tracestate)
+
+    def como_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.nome,
+            'kind': self.tipo,
+            'startTimeUnixNano': str(self.inicio_ns),
+            'endTimeUnixNano': str(self.fim_ns),
+            'attributes': [{'key': chave, 'value': _valor_otlp(valor)} for chave, valor in self.atributos.items()],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.erro:
+            span['status'] = {'code': STATUS_ERROR}
+        return span
+
+
+def _valor_otlp(valor):
+    if isinstance(valor, bool):
+        return {'boolValue': valor}
+    if isinstance(valor, int):
+        return {'intValue': str(valor)}
+    if isinstance(valor, float):
+        return {'doubleValue': valor}
+    return {'stringValue': str(valor)}
+
+
+class _Medicao:
+    __slots__ = ('dns', 'conexao')
+
+    def __init__(self):
+        self.dns = None
+        self.conexao = None
+
+
+_classes_medidas = None
+
+
+def adaptador_medido(**kwargs):
+    """
+    HTTPAdapter do requests cujas conexões registram os tempos de DNS e de
+    conexão na chamada upstream em andamento. As classes são criadas na
+    primeira chamada, para não importar o urllib3 na inicialização.
+    """
+    global _classes_medidas
+    if _classes_medidas is None:
+        from requests.adapters import HTTPAdapter
+        from urllib3.connection import HTTPConnection, HTTPSConnection
+        from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+        class _ConexaoMedida:
+            def _new_conn(self):
+                medicao = _medicao_atual.get()
+                if medicao is None:
+                    return super()._new_conn()
+                inicio = time.perf_counter()
+                host = self._dns_host
+                try:
+                    endereco = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+                except OSError:
+                    # O urllib3 repete a resolução e levanta o erro no formato esperado
+                    return super()._new_conn()
+                resolvido = time.perf_counter()
+                medicao.dns = resolvido - inicio
+                # Conecta ao endereço já resolvido; o nome continua em self.host (SNI/Host)
+                self._dns_host = endereco
+                try:
+                    return super()._new_conn()
+                finally:
+                    self._dns_host = host
+                    medicao.conexao = time.perf_counter() - resolvido
+
+        class _HTTPConnection(_ConexaoMedida, HTTPConnection):
+            pass
+
+        class _HTTPSConnection(_ConexaoMedida, HTTPSConnection):
+            pass
+
+        class _HTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = _HTTPConnection
+
+        class _HTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = _HTTPSConnection
+
+        class _AdaptadorMedido(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                super().init_poolmanager(*args, **kwargs)
+                self.poolmanager.pool_classes_by_scheme = {
+                    'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool
+                }
+
+        _classes_medidas = _AdaptadorMedido
+    return _classes_medidas(**kwargs)
+
+
+class _Exportador:
+    """
+    Fila de spans finalizados e thread que os envia em lotes (arquivo NDJSON ou
+    coletor OTLP/HTTP JSON). Com a fila cheia os spans são descartados.
+    """
+
+    def __init__(self, config):
+        self.destino = config['TRACING_EXPORTER']
+        self.arquivo = config['TRACING_FILE']
+        self.endpoint = config['TRACING_OTLP_ENDPOINT']
+        self.servico = config['TRACING_SERVICE_NAME']
+        self.tamanho_lote = config['TRACING_BATCH_SIZE']
+        self.intervalo = config['TRACING_FLUSH_INTERVAL']
+        self.fila = queue.Queue(maxsize=config['TRACING_QUEUE_SIZE'])
+        self.lote_pronto = threading.Event()
+        self.lock = threading.Lock()
+        self.pid = None
+        self.logger = None
+        self.stats = {'exportados': 0, 'descartados': 0, 'falhas': 0}
+
+    def adicionar(self, span):
+        if self.pid != os.getpid():
+            self._iniciar()
+        try:
+            self.fila.put_nowait(span)
+        except queue.Full:
+            self.stats['descartados'] += 1
+            return
+        if self.fila.qsize() >= self.tamanho_lote:
+            self.lote_pronto.set()
+
+    def _iniciar(self):
+        # Uma thread por processo, iniciada no primeiro span (depois do fork dos workers)
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            # Spans e locks herdados do processo pai não valem no worker
+            self.fila = queue.Queue(maxsize=self.fila.maxsize)
+            self.logger = current_app.logger
+            threading.Thread(target=self._executar, name='exportador-spans', daemon=True).start()
+            atexit.register(self.exportar_pendentes)
+
+    def _executar(self):
+        while True:
+            self.lote_pronto.wait(self.intervalo)
+            self.lote_pronto.clear()
+            self.exportar_pendentes()
+
+    def exportar_pendentes(self):
+        while True:
+            lote = []
+            try:
+                while len(lote) < self.tamanho_lote:
+                    lote.append(self.fila.get_nowait())
+            except queue.Empty:
+                pass
+            if not lote:
+                return
+            try:
+                self._enviar(lote)
+                self.stats['exportados'] += len(lote)
+            except Exception as e:
+                self.stats['falhas'] += len(lote)
+                self.logger.error(f"Erro ao exportar {len(lote)} spans: {str(e)}")
+            if len(lote) < self.tamanho_lote:
+                return
+
+    def _enviar(self, lote):
+        if self.destino == 'otlp':
+            # Importado só no envio: com o rastreamento desativado ou exportado para
+            # arquivo, o urllib.request não é carregado
+            from urllib.request import Request, urlopen
+
+            corpo = json.dumps({'resourceSpans': [{
+                'resource': {'attributes': [
+                    {'key': 'service.name', 'value': {'stringValue': self.servico}},
+                    {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+                ]},
+                'scopeSpans': [{'scope': {'name': 'app.tracing'}, 'spans': [span.como_otlp() for span in lote]}]
+            }]}).encode('utf-8')
+            requisicao = Request(self.endpoint, data=corpo, headers={'Content-Type': 'application/json'})
+            with urlopen(requisicao, timeout=10) as resposta:
+                resposta.read()
+            return
+        linhas = ''.join(
+            json.dumps(dict(span.como_otlp(), service=self.servico), separators=(',', ':')) + '\n'
+            for span in lote
+        )
+        # Um único write em modo append por lote: os workers compartilham o arquivo
+        with open(self.arquivo, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linhas)
+
+
+class _TracingState:
+    def __init__(self, config):
+        self.taxa = config['TRACING_SAMPLE_RATE']
+        self.exportador = _Exportador(config)
+
+
+class Tracing:
+    """
+    Rastreamento distribuído (W3C Trace Context).
+
+    Cada requisição recebida ganha um span de servidor, filho do traceparent
+    recebido quando houver; cada chamada às APIs secundárias ganha um span de
+    cliente com os tempos de DNS, conexão, TTFB e transferência e envia o
+    traceparent do span. A amostragem segue a decisão do traceparent recebido
+    ou, sem ele, TRACING_SAMPLE_RATE; requisições não amostradas só propagam os
+    ids. Os spans amostrados são exportados em lotes por uma thread por worker.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['TRACING_ENABLED']:
+            app.extensions['tracing'] = None
+            return
+        state = _TracingState(app.config)
+        app.extensions['tracing'] = state
+        app.before_request(partial(self._iniciar, state))
+        app.after_request(partial(self._finalizar, state))
+        app.teardown_request(partial(self._encerrar, state))
+
+    @property
+    def state(self):
+        return current_app.extensions['tracing']
+
+    def stats(self):
+        state = self.state
+        return dict(state.exportador.stats) if state is not None else {}
+
+    @staticmethod
+    def _iniciar(state):
+        req = request._get_current_object()
+        trace_id, parent_id, amostrado = None, None, None
+        recebido = TRACEPARENT.match(req.headers.get('traceparent', ''))
+        if recebido is not None and recebido.group(1) != 'ff' \
+                and recebido.group(2) != ZERO_TRACE and recebido.group(3) != ZERO_SPAN:
+            trace_id, parent_id = recebido.group(2), recebido.group(3)
+            amostrado = int(recebido.group(4), 16) & 1 == 1
+        else:
+            trace_id = _novo_id(128)
+            amostrado = random.random() < state.taxa
+        regra = req.url_rule
+        rota = regra.rule if regra is not None else 'nao_encontrada'
+        span = Span(trace_id, parent_id, amostrado, f'{req.method} {rota}', SPAN_KIND_SERVER,
+                    req.headers.get('tracestate') if recebido is not None else None)
+        if amostrado:
+            span.atributos.update({'http.method': req.method, 'http.route': rota, 'http.target': req.path})
+        _span_atual.set(span)
+
+    @staticmethod
+    def _finalizar(state, response):
+        span = _span_atual.get()
+        if span is None:
+            return response
+        response.headers['X-Trace-Id'] = span.trace_id
+        if span.amostrado:
+            span.atributos['http.status_code'] = response.status_code
+            span.erro = response.status_code >= 500
+        return response
+
+    @staticmethod
+    def _encerrar(state, exc):
+        span = _span_atual.get()
+        if span is None:
+            return
+        _span_atual.set(None)
+        if span.amostrado:
+            if exc is not None:
+                span.erro = True
+                span.atributos['exception.type'] = type(exc).__name__
+            span.fim_ns = time.time_ns()
+            state.exportador.adicionar(span)
+
+
+class _Chamada:
+    """
+    Span de uma chamada amostrada a uma API secundária, com os tempos da última tentativa
+    """
+    __slots__ = ('span', 'exportador', 'medicao', 'inicio', 'tentativas')
+
+    def __init__(self, span, exportador):
+        self.span = span
+        self.exportador = exportador
+        self.medicao = None
+        self.inicio = None
+        self.tentativas = 0
+
+    def tentativa(self):
+        self.tentativas += 1
+        self.medicao = _Medicao()
+        _medicao_atual.set(self.medicao)
+        self.inicio = time.perf_counter()
+
+    def concluir(self, response=None, erro=None, stream=False):
+        total = time.perf_counter() - self.inicio
+        _medicao_atual.set(None)
+        atributos = self.span.atributos
+        dns = self.medicao.dns or 0.0
+        conexao = self.medicao.conexao or 0.0
+        atributos['net.connection_reused'] = self.medicao.conexao is None
+        atributos['timing.dns_ms'] = round(dns * 1000, 3)
+        atributos['timing.connect_ms'] = round(conexao * 1000, 3)
+        if response is not None:
+            # elapsed: do envio até o fim dos cabeçalhos da resposta (inclui DNS e conexão)
+            cabecalhos = response.elapsed.total_seconds()
+            atributos['http.status_code'] = response.status_code
+            atributos['timing.ttfb_ms'] = round(max(cabecalhos - dns - conexao, 0.0) * 1000, 3)
+            if not stream:
+                atributos['timing.transfer_ms'] = round(max(total - cabecalhos, 0.0) * 1000, 3)
+            self.span.erro = response.status_code >= 500
+        if erro is not None:
+            self.span.erro = True
+            atributos['exception.type'] = type(erro).__name__
+
+    def encerrar(self):
+        self.span.atributos['tentativas'] = self.tentativas
+        self.span.fim_ns = time.time_ns()
+        self.exportador.adicionar(self.span)
+
+
+def iniciar_chamada(state, nome, method, path, kwargs):
+    """
+    Cria o span filho de uma chamada à API secundária e acrescenta o
+    traceparent aos cabeçalhos em `kwargs`. Retorna a _Chamada a medir, ou
+    None se a requisição não for amostrada (o traceparent é enviado mesmo assim).
+    """
+    pai = _span_atual.get()
+    if pai is None:
+        return None
+    span = pai.filho(f'{method} {nome}')
+    headers = dict(kwargs.get('headers') or {})
+    headers['traceparent'] = span.traceparent()
+    if span.tracestate:
+        headers['tracestate'] = span.tracestate
+    kwargs['headers'] = headers
+    if not span.amostrado:
+        return None
+    span.atributos.update({'upstream': nome, 'http.method': method, 'http.target': path})
+    return _Chamada(span, state.exportador)
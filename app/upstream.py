@@ -0,0 +1,599 @@
+import atexit
+import copy
+import importlib.util
+import os
+import random
+import sys
+import threading
+import time
+from functools import wraps
+
+from flask import current_app
+
+from .tracing import adaptador_medido, iniciar_chamada
+
+
+def modulo_sob_demanda(nome):
+    """
+    Importa o módulo só no primeiro acesso a um de seus atributos, para que o
+    custo da importação não entre na inicialização dos workers
+    """
+    if nome in sys.modules:
+        return sys.modules[nome]
+    spec = importlib.util.find_spec(nome)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nome] = modulo
+    loader.exec_module(modulo)
+    return modulo
+
+
+# O requests (e o urllib3) só é carregado na primeira chamada a uma API secundária
+requests = modulo_sob_demanda('requests')
+
+# Upstreams conhecidos e a chave de configuração com a URL base de cada um
+UPSTREAMS = {
+    'viacep': 'VIACEP_API_URL',
+    'frankfurter': 'FRANKFURTER_API_URL',
+}
+
+
+class _Voo:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+def single_flight(func):
+    """
+    Decorator para funções de leitura: chamadas concorrentes com os mesmos
+    argumentos compartilham uma única execução em andamento e recebem o mesmo
+    resultado. Nada é guardado depois que a execução termina.
+    """
+    voos = {}
+    lock = threading.Lock()
+
+    @wraps(func)
+    def wrapper(*args):
+        if not current_app.config['SINGLE_FLIGHT_ENABLED']:
+            return func(*args)
+
+        chave = (id(current_app._get_current_object()), args)
+        with lock:
+            voo = voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = voos[chave] = _Voo()
+
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            # Cópia para que quem recebe o resultado possa alterá-lo sem afetar os demais
+            return copy.deepcopy(voo.resultado)
+
+        try:
+            voo.resultado = func(*args)
+            return voo.resultado
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with lock:
+                del voos[chave]
+            voo.evento.set()
+
+    return wrapper
+
+
+class CircuitOpenError(Exception):
+    """
+    O circuito do upstream está aberto e a chamada foi recusada sem ser enviada
+    """
+
+    def __init__(self, nome, retry_after):
+        super().__init__(f"Circuito aberto para a API {nome}")
+        self.nome = nome
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de um upstream.
+
+    Fechado: as chamadas passam e falhas consecutivas são contadas. Ao atingir
+    `failure_threshold` o circuito abre e as chamadas falham imediatamente por
+    `reset_timeout` segundos. Depois disso fica meio-aberto: até
+    `half_open_max_calls` chamadas de prova passam; se tiverem sucesso o
+    circuito fecha, se falharem volta a abrir.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, nome, failure_threshold, reset_timeout, half_open_max_calls):
+        self.nome = nome
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.estado = self.CLOSED
+        self.falhas = 0
+        self.aberto_em = 0.0
+        self.provas_em_andamento = 0
+        self.aberturas = 0
+        self.lock = threading.Lock()
+
+    def permitir(self):
+        """
+        Levanta CircuitOpenError se a chamada não pode ser enviada agora
+        """
+        with self.lock:
+            if self.estado == self.OPEN:
+                restante = self.aberto_em + self.reset_timeout - time.monotonic()
+                if restante > 0:
+                    raise CircuitOpenError(self.nome, restante)
+                self.estado = self.HALF_OPEN
+                self.provas_em_andamento = 0
+            if self.estado == self.HALF_OPEN:
+                if self.provas_em_andamento >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.nome, self.reset_timeout)
+                self.provas_em_andamento += 1
+
+    def registrar_sucesso(self):
+        with self.lock:
+            self.falhas = 0
+            if self.estado == self.HALF_OPEN:
+                self.estado = self.CLOSED
+                self.provas_em_andamento = 0
+
+    def liberar_prova(self):
+        """
+        Devolve a vaga de prova de uma chamada interrompida sem resultado (ex.:
+        exceção que não é do requests), para que o circuito não fique preso
+        meio-aberto
+        """
+        with self.lock:
+            if self.estado == self.HALF_OPEN and self.provas_em_andamento > 0:
+                self.provas_em_andamento -= 1
+
+    def registrar_falha(self):
+        with self.lock:
+            self.falhas += 1
+            if self.estado == self.HALF_OPEN or self.falhas >= self.failure_threshold:
+                if self.estado != self.OPEN:
+                    self.aberturas += 1
+                self.estado = self.OPEN
+                self.aberto_em = time.monotonic()
+                self.provas_em_andamento = 0
+
+    def info(self):
+        with self.lock:
+            return {'estado': self.estado, 'falhas_consecutivas': self.falhas, 'aberturas': self.aberturas}
+
+
+class RetryBudget:
+    """
+    Orçamento de retentativas: cada requisição original deposita `ratio` fichas
+    e cada retentativa consome uma, além de `min_per_second` fichas por segundo.
+    Evita que retentativas multipliquem a carga sobre um upstream já degradado.
+    """
+
+    def __init__(self, ratio, min_per_second, max_tokens):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.fichas = max_tokens
+        self.atualizado_em = time.monotonic()
+        self.lock = threading.Lock()
+
+    def depositar(self):
+        with self.lock:
+            self.fichas = min(self.fichas + self.ratio, self.max_tokens)
+
+    def retirar(self):
+        with self.lock:
+            agora = time.monotonic()
+            self.fichas = min(self.fichas + (agora - self.atualizado_em) * self.min_per_second, self.max_tokens)
+            self.atualizado_em = agora
+            if self.fichas < 1:
+                return False
+            self.fichas -= 1
+            return True
+
+    def info(self):
+        with self.lock:
+            return {'fichas_retentativa': round(self.fichas, 2)}
+
+
+def urls_base(valor):
+    """
+    Lista de URLs base de um upstream: uma ou mais réplicas separadas por vírgula
+    """
+    return [url.strip().rstrip('/') for url in valor.split(',') if url.strip()]
+
+
+class _Destino:
+    """
+    Uma réplica (URL base) de um upstream: requisições em andamento, falhas
+    consecutivas e o resultado da última sonda de saúde
+    """
+    __slots__ = ('url', 'em_andamento', 'falhas', 'saudavel', 'latencia', 'sondado_em')
+
+    def __init__(self, url):
+        self.url = url
+        self.em_andamento = 0
+        self.falhas = 0
+        self.saudavel = True
+        self.latencia = None
+        self.sondado_em = None
+
+    def info(self):
+        return {
+            'url': self.url,
+            'saudavel': self.saudavel,
+            'em_andamento': self.em_andamento,
+            'falhas_consecutivas': self.falhas,
+            'latencia_sonda_ms': round(self.latencia * 1000, 2) if self.latencia is not None else None,
+            'sondado_ha_s': round(time.monotonic() - self.sondado_em, 2) if self.sondado_em is not None else None
+        }
+
+
+class _UpstreamState:
+    """
+    Estado do cliente upstream de uma aplicação: uma sessão (pool) e as
+    réplicas de cada upstream
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.destinos = {nome: [_Destino(url) for url in urls_base(config[chave])] for nome, chave in UPSTREAMS.items()}
+        self.timeout = (config['UPSTREAM_CONNECT_TIMEOUT'], config['UPSTREAM_READ_TIMEOUT'])
+        self._lock = threading.Lock()
+        # Protege os contadores das réplicas (separado do lock das sessões)
+        self._lock_destinos = threading.Lock()
+        self._pid = None
+        self._sessions = {}
+        # Requisições em andamento por sessão e sessões substituídas por uma recarga
+        self._em_uso = {}
+        self._aposentadas = set()
+        self.breakers = {
+            nome: CircuitBreaker(
+                nome,
+                config['CIRCUIT_FAILURE_THRESHOLD'],
+                config['CIRCUIT_RESET_TIMEOUT'],
+                config['CIRCUIT_HALF_OPEN_MAX_CALLS']
+            )
+            for nome in UPSTREAMS
+        }
+        self.retry_budgets = {
+            nome: RetryBudget(
+                config['UPSTREAM_RETRY_BUDGET_RATIO'],
+                config['UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND'],
+                config['UPSTREAM_RETRY_BUDGET_MAX']
+            )
+            for nome in UPSTREAMS
+        }
+
+    def _criar_sessao(self, nome):
+        session = requests.Session()
+        # Com o rastreamento ativo, as conexões medem os tempos de DNS e de conexão
+        criar_adapter = adaptador_medido if self.config['TRACING_ENABLED'] else requests.adapters.HTTPAdapter
+        adapter = criar_adapter(
+            # Um pool por host: com várias réplicas, nenhum pool é descartado para abrir outro
+            pool_connections=max(self.config['UPSTREAM_POOL_CONNECTIONS'], len(self.destinos[nome])),
+            pool_maxsize=self.config['UPSTREAM_POOL_MAXSIZE'],
+            pool_block=self.config['UPSTREAM_POOL_BLOCK'],
+            max_retries=0
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.config['UPSTREAM_KEEPALIVE']:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def session(self, nome):
+        """
+        Retorna a sessão do upstream, recriando os pools quando o processo muda
+        (ex.: após o fork de um worker do gunicorn)
+        """
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # Conexões herdadas do processo pai não podem ser reutilizadas
+                    self._sessions = {}
+                    self._em_uso = {}
+                    self._aposentadas = set()
+                    self._pid = pid
+        session = self._sessions.get(nome)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(nome)
+                if session is None:
+                    session = self._criar_sessao(nome)
+                    self._sessions[nome] = session
+        return session
+
+    def usar_sessao(self, nome):
+        """
+        Retorna a sessão do upstream marcada como em uso até `devolver_sessao`
+        """
+        session = self.session(nome)
+        with self._lock:
+            self._em_uso[session] = self._em_uso.get(session, 0) + 1
+        return session
+
+    def devolver_sessao(self, session):
+        """
+        Conclui o uso da sessão; uma sessão substituída por uma recarga é
+        fechada quando a última requisição que a usa termina
+        """
+        with self._lock:
+            restantes = self._em_uso.get(session, 1) - 1
+            if restantes > 0:
+                self._em_uso[session] = restantes
+                return
+            self._em_uso.pop(session, None)
+            if session not in self._aposentadas:
+                return
+            self._aposentadas.discard(session)
+        session.close()
+
+    def aquecido(self, nome):
+        """
+        Indica se o pool do upstream já foi criado neste processo
+        """
+        return self._pid == os.getpid() and nome in self._sessions
+
+    def escolher(self, nome, evitar=None):
+        """
+        Escolhe a réplica saudável com menos requisições em andamento (empates
+        resolvidos ao acaso) e a marca como ocupada. Uma retentativa evita a
+        réplica que acabou de falhar. Sem réplicas saudáveis, todas são
+        candidatas: melhor tentar do que recusar sem enviar.
+        """
+        with self._lock_destinos:
+            destinos = self.destinos[nome]
+            candidatos = [d for d in destinos if d.saudavel and d is not evitar]
+            if not candidatos:
+                candidatos = [d for d in destinos if d.saudavel] or destinos
+            menor = min(d.em_andamento for d in candidatos)
+            empatados = [d for d in candidatos if d.em_andamento == menor]
+            destino = empatados[0] if len(empatados) == 1 else random.choice(empatados)
+            destino.em_andamento += 1
+        return destino
+
+    def liberar(self, nome, destino, sucesso):
+        """
+        Conclui uma requisição à réplica. Falhas consecutivas acima de
+        UPSTREAM_UNHEALTHY_THRESHOLD tiram a réplica do balanceamento enquanto
+        houver outra saudável; a sonda de saúde a devolve quando ela responder.
+        Com `sucesso` None (chamada interrompida) a réplica só é liberada.
+        """
+        with self._lock_destinos:
+            destino.em_andamento -= 1
+            if sucesso is None:
+                return
+            if sucesso:
+                destino.falhas = 0
+                return
+            destino.falhas += 1
+            if destino.falhas >= self.config['UPSTREAM_UNHEALTHY_THRESHOLD'] and any(
+                d.saudavel and d is not destino for d in self.destinos[nome]
+            ):
+                destino.saudavel = False
+
+    def sondar(self, nome, destino, path, timeout):
+        """
+        Envia a sonda de saúde à réplica pelo pool do upstream (o que também
+        deixa uma conexão aberta) e guarda a latência. Qualquer resposta abaixo
+        de 500 conta como saudável.
+        """
+        inicio = time.perf_counter()
+        session = self.usar_sessao(nome)
+        try:
+            response = session.get(f"{destino.url}{path}", timeout=timeout)
+            response.content  # Devolve a conexão ao pool
+            saudavel = response.status_code < 500
+        except requests.exceptions.RequestException:
+            saudavel = False
+        finally:
+            self.devolver_sessao(session)
+        latencia = time.perf_counter() - inicio
+        with self._lock_destinos:
+            destino.latencia = latencia
+            destino.sondado_em = time.monotonic()
+            if saudavel:
+                destino.saudavel = True
+                destino.falhas = 0
+            else:
+                destino.falhas += 1
+                if destino.falhas >= self.config['UPSTREAM_UNHEALTHY_THRESHOLD']:
+                    destino.saudavel = False
+        return saudavel
+
+    def recarregar(self):
+        """
+        Aplica a configuração atual (após uma recarga): timeouts, circuit
+        breakers e réplicas. Réplicas mantidas conservam contadores e saúde. As
+        requisições em andamento seguem com a réplica e a sessão que já
+        escolheram; quando as réplicas mudam, a sessão é trocada e a antiga é
+        liberada depois que a última requisição que a usa termina.
+        """
+        config = self.config
+        self.timeout = (config['UPSTREAM_CONNECT_TIMEOUT'], config['UPSTREAM_READ_TIMEOUT'])
+        for breaker in self.breakers.values():
+            breaker.failure_threshold = config['CIRCUIT_FAILURE_THRESHOLD']
+            breaker.reset_timeout = config['CIRCUIT_RESET_TIMEOUT']
+            breaker.half_open_max_calls = config['CIRCUIT_HALF_OPEN_MAX_CALLS']
+        alterados = []
+        with self._lock_destinos:
+            for nome, chave in UPSTREAMS.items():
+                atuais = {d.url: d for d in self.destinos[nome]}
+                urls = urls_base(config[chave])
+                if urls != list(atuais):
+                    self.destinos[nome] = [atuais.get(url) or _Destino(url) for url in urls]
+                    alterados.append(nome)
+        if alterados:
+            ociosas = []
+            with self._lock:
+                for nome in alterados:
+                    session = self._sessions.pop(nome, None)
+                    if session is None:
+                        continue
+                    if self._em_uso.get(session):
+                        self._aposentadas.add(session)
+                    else:
+                        ociosas.append(session)
+            for session in ociosas:
+                session.close()
+        return alterados
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for session in [*self._sessions.values(), *self._aposentadas]:
+                    session.close()
+            self._sessions = {}
+            self._em_uso = {}
+            self._aposentadas = set()
+
+
+class UpstreamClient:
+    """
+    Cliente HTTP compartilhado pelas funções de app/utils.py para acessar as APIs secundárias
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = _UpstreamState(app.config)
+        app.extensions['upstream'] = state
+        # Fecha as conexões do worker quando o processo termina
+        atexit.register(state.close)
+
+    @property
+    def state(self):
+        return current_app.extensions['upstream']
+
+    def request(self, nome, method, path, **kwargs):
+        """
+        Executa uma requisição ao upstream usando a conexão do pool, passando pelo
+        circuit breaker do upstream. Apenas GETs (idempotentes) são retentados,
+        com backoff exponencial com jitter e limitados pelo orçamento de retentativas.
+        """
+        state = self.state
+        kwargs.setdefault('timeout', state.timeout)
+        breaker = state.breakers[nome]
+        budget = state.retry_budgets[nome]
+        tentativas = state.config['UPSTREAM_RETRY_MAX'] + 1 if method == 'GET' else 1
+        budget.depositar()
+
+        registry = current_app.extensions.get('metrics')
+        tracing = current_app.extensions.get('tracing')
+        chamada = iniciar_chamada(tracing, nome, method, path, kwargs) if tracing is not None else None
+        destino = None
+        try:
+            for tentativa in range(tentativas):
+                try:
+                    breaker.permitir()
+                except CircuitOpenError as e:
+                    self._contar(registry, nome, method, 'circuit_open')
+                    if chamada is not None:
+                        chamada.span.erro = True
+                        chamada.span.atributos['exception.type'] = type(e).__name__
+                    raise
+                ultima = tentativa == tentativas - 1
+                if chamada is not None:
+                    chamada.tentativa()
+                destino = state.escolher(nome, evitar=destino)
+                session = state.usar_sessao(nome)
+                try:
+                    # Com stream=True a réplica é liberada ao receber os cabeçalhos
+                    response = session.request(method, f"{destino.url}{path}", **kwargs)
+                except requests.exceptions.RequestException as e:
+                    state.liberar(nome, destino, sucesso=False)
+                    if chamada is not None:
+                        chamada.concluir(erro=e)
+                    self._contar(registry, nome, method, 'error')
+                    breaker.registrar_falha()
+                    retentavel = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                    if ultima or not retentavel or not self._aguardar_retentativa(state, budget, tentativa):
+                        raise
+                    continue
+                except BaseException:
+                    state.liberar(nome, destino, sucesso=None)
+                    breaker.liberar_prova()
+                    raise
+                finally:
+                    # Um corpo em stream ainda lido depois do fechamento da sessão
+                    # antiga tem a conexão fechada ao ser devolvida
+                    state.devolver_sessao(session)
+
+                if chamada is not None:
+                    chamada.concluir(response, stream=kwargs.get('stream', False))
+                self._contar(registry, nome, method, str(response.status_code))
+                state.liberar(nome, destino, sucesso=response.status_code < 500)
+                if response.status_code < 500:
+                    breaker.registrar_sucesso()
+                    return response
+                breaker.registrar_falha()
+                if ultima or not self._aguardar_retentativa(state, budget, tentativa):
+                    return response
+                response.close()
+        finally:
+            if chamada is not None:
+                chamada.encerrar()
+
+    @staticmethod
+    def _contar(registry, nome, method, status):
+        if registry is not None:
+            registry.inc(
+                'api_principal_upstream_requests_total',
+                (('upstream', nome), ('method', method), ('status', status))
+            )
+
+    @staticmethod
+    def _aguardar_retentativa(state, budget, tentativa):
+        if not budget.retirar():
+            return False
+        # Full jitter: espera aleatória entre 0 e base * 2^tentativa
+        base = state.config['UPSTREAM_RETRY_BACKOFF']
+        time.sleep(random.uniform(0, base * (2 ** tentativa)))
+        return True
+
+    def circuitos(self):
+        """
+        Estado do circuit breaker, do orçamento de retentativas e das réplicas de cada upstream
+        """
+        state = self.state
+        return {
+            nome: {
+                **state.breakers[nome].info(),
+                **state.retry_budgets[nome].info(),
+                'replicas': self.replicas(nome)
+            }
+            for nome in UPSTREAMS
+        }
+
+    def replicas(self, nome):
+        state = self.state
+        with state._lock_destinos:
+            return [destino.info() for destino in state.destinos[nome]]
+
+    def get(self, nome, path, **kwargs):
+        return self.request(nome, 'GET', path, **kwargs)
+
+    def post(self, nome, path, **kwargs):
+        return self.request(nome, 'POST', path, **kwargs)
+
+    def put(self, nome, path, **kwargs):
+        return self.request(nome, 'PUT', path, **kwargs)
+
+    def delete(self, nome, path, **kwargs):
+        return self.request(nome, 'DELETE', path, **kwargs)
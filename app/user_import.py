@@ -0,0 +1,336 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from flask import current_app
+
+from .batch import executar_em_lote
+from .cep import normalizar_cep
+from .metrics import _processo_vivo
+from .upstream import modulo_sob_demanda
+
+# Carregado só na importação de um arquivo CSV
+csv = modulo_sob_demanda('csv')
+
+CAMPOS_USUARIO = ('nome_completo', 'email', 'senha', 'cpf', 'cep', 'complemento')
+CAMPOS_OBRIGATORIOS = ('nome_completo', 'email', 'senha', 'cpf', 'cep')
+FORMATOS = ('csv', 'ndjson')
+TAMANHO_PARTE = 64 * 1024
+
+
+class ImportacaoInvalida(Exception):
+    """
+    O arquivo enviado não pode ser importado (formato desconhecido ou tamanho excedido)
+    """
+
+
+def campo_obrigatorio_ausente(dados_usuario):
+    """
+    Retorna o nome do primeiro campo obrigatório ausente ou None
+    """
+    for campo in CAMPOS_OBRIGATORIOS:
+        if not dados_usuario.get(campo):
+            return campo
+    return None
+
+
+def resultado_criacao(resultado):
+    """
+    Converte o retorno de criar_usuario em (corpo, status) de POST /users/
+    """
+    if resultado is None:
+        return {'message': 'Erro ao criar usuário na API secundária'}, 500
+    if 'message' in resultado:
+        # Se a API secundária retornou um erro
+        return resultado, 400 if 'inválido' in resultado['message'] else 409
+    return resultado, 201
+
+
+def detectar_formato(nome_arquivo, mimetype, formato=None):
+    """
+    Formato do arquivo: parâmetro `formato`, extensão do nome ou Content-Type
+    """
+    if formato:
+        return formato if formato in FORMATOS else None
+    nome_arquivo = (nome_arquivo or '').lower()
+    if nome_arquivo.endswith('.csv') or mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    if nome_arquivo.endswith(('.ndjson', '.jsonl')) or mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+
+def _ler_linhas(arquivo, formato):
+    """
+    Gera (numero_linha, dados_usuario, erro) lendo o arquivo uma linha por vez.
+    No CSV a primeira linha é o cabeçalho e a numeração segue a do arquivo.
+    """
+    if formato == 'csv':
+        leitor = csv.DictReader(arquivo)
+        for registro in leitor:
+            dados = {campo: (registro.get(campo) or '').strip() for campo in CAMPOS_USUARIO}
+            yield leitor.line_num, dados, None
+        return
+    for numero, linha in enumerate(arquivo, 1):
+        if not linha.strip():
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError:
+            yield numero, None, 'JSON inválido'
+            continue
+        if not isinstance(registro, dict):
+            yield numero, None, 'A linha deve ser um objeto JSON'
+            continue
+        dados = {campo: str(registro[campo]).strip() for campo in CAMPOS_USUARIO if registro.get(campo) is not None}
+        yield numero, dados, None
+
+
+def _gravar_json(caminho, dados):
+    # Escrita atômica: leitores em outros workers nunca veem o arquivo pela metade
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, caminho)
+
+
+class _Importacao:
+    """
+    Execução de uma importação em uma thread de fundo: lê o arquivo em janelas
+    de IMPORT_WINDOW linhas, consulta uma única vez cada CEP ainda não visto,
+    cria os usuários com no máximo IMPORT_MAX_CONCURRENCY chamadas simultâneas
+    e grava uma linha de resultado por linha do arquivo.
+    """
+
+    def __init__(self, diretorio, formato, config):
+        self.diretorio = diretorio
+        self.formato = formato
+        self.janela = config['IMPORT_WINDOW']
+        self.max_concorrencia = config['IMPORT_MAX_CONCURRENCY']
+        self.intervalo_status = config['IMPORT_STATUS_INTERVAL']
+        # CEP normalizado -> True (válido), False (inexistente) ou None (consulta falhou)
+        self.ceps = {}
+        self.status = {
+            'id': os.path.basename(diretorio),
+            'status': 'processando',
+            'formato': formato,
+            'pid': os.getpid(),
+            'bytes_total': os.path.getsize(os.path.join(diretorio, 'entrada')),
+            'bytes_lidos': 0,
+            'linhas': 0,
+            'criados': 0,
+            'falhas': 0,
+            'ceps_unicos': 0,
+            'ceps_consultados': 0,
+            'iniciada_em': time.time(),
+            'concluida_em': None
+        }
+        self._status_gravado_em = 0.0
+
+    def gravar_status(self, forcar=False):
+        agora = time.monotonic()
+        if forcar or agora - self._status_gravado_em >= self.intervalo_status:
+            _gravar_json(os.path.join(self.diretorio, 'status.json'), self.status)
+            self._status_gravado_em = agora
+
+    def executar(self, criar_usuario, consultar_cep):
+        """
+        `criar_usuario(dados)` e `consultar_cep(cep)` são as funções de app.utils
+        """
+        criar_usuario = self._criar(criar_usuario)
+        consultar_cep = self._consultar(consultar_cep)
+        try:
+            with open(os.path.join(self.diretorio, 'entrada'), newline='', encoding='utf-8-sig') as entrada, \
+                    open(os.path.join(self.diretorio, 'resultado.ndjson'), 'w', encoding='utf-8') as saida:
+                janela = []
+                for linha in _ler_linhas(entrada, self.formato):
+                    janela.append(linha)
+                    if len(janela) >= self.janela:
+                        self._processar_janela(janela, criar_usuario, consultar_cep, saida)
+                        self.status['bytes_lidos'] = entrada.buffer.tell()
+                        self.gravar_status()
+                        janela = []
+                if janela:
+                    self._processar_janela(janela, criar_usuario, consultar_cep, saida)
+                self.status['bytes_lidos'] = self.status['bytes_total']
+            self.status['status'] = 'concluida'
+        except Exception as e:
+            current_app.logger.error(f"Erro na importação {self.status['id']}: {str(e)}")
+            self.status['status'] = 'falhou'
+            self.status['erro'] = str(e)
+        finally:
+            self.status['concluida_em'] = time.time()
+            self.gravar_status(forcar=True)
+            # O arquivo enviado não é mais necessário; o resultado fica disponível
+            try:
+                os.remove(os.path.join(self.diretorio, 'entrada'))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _criar(criar_usuario):
+        return lambda dados: resultado_criacao(criar_usuario(dados))
+
+    @staticmethod
+    def _consultar(consultar_cep):
+        def consultar(cep):
+            endereco = consultar_cep(cep)
+            return endereco, 200 if endereco is not None else 500
+        return consultar
+
+    def _consultar_ceps(self, janela, consultar_cep):
+        """
+        Consulta em paralelo os CEPs da janela ainda não vistos nesta importação
+        """
+        novos = set()
+        for _, dados, erro in janela:
+            if erro is None:
+                cep = normalizar_cep(dados.get('cep'))
+                if cep is not None and cep not in self.ceps:
+                    novos.add(cep)
+        if not novos:
+            return
+        resultados = executar_em_lote(
+            [(cep, cep, cep) for cep in novos], consultar_cep, self.max_concorrencia
+        )
+        for cep, endereco, status in resultados:
+            if status != 200 or endereco is None:
+                self.ceps[cep] = None
+            else:
+                self.ceps[cep] = 'message' not in endereco and not endereco.get('erro')
+        self.status['ceps_unicos'] = len(self.ceps)
+        self.status['ceps_consultados'] += len(novos)
+
+    def _processar_janela(self, janela, criar_usuario, consultar_cep, saida):
+        self._consultar_ceps(janela, consultar_cep)
+
+        resultados = []
+        pendentes = []
+        for numero, dados, erro in janela:
+            if erro is None:
+                campo = campo_obrigatorio_ausente(dados)
+                if campo is not None:
+                    erro = f'Campo obrigatório ausente: {campo}'
+                else:
+                    cep = normalizar_cep(dados['cep'])
+                    if cep is None or self.ceps.get(cep) is False:
+                        erro = 'CEP inválido'
+                    else:
+                        # CEPs cuja consulta falhou seguem para a API secundária, que decide
+                        dados['cep'] = cep
+            if erro is not None:
+                resultados.append((numero, {'message': erro}, 400))
+            else:
+                pendentes.append((numero, numero, dados))
+
+        resultados.extend(executar_em_lote(pendentes, criar_usuario, self.max_concorrencia))
+        resultados.sort(key=lambda resultado: resultado[0])
+        for numero, corpo, status in resultados:
+            linha = {'linha': numero, 'status': status}
+            if status == 201:
+                linha['id'] = corpo.get('id')
+                self.status['criados'] += 1
+            else:
+                linha['message'] = corpo.get('message') if isinstance(corpo, dict) else None
+                self.status['falhas'] += 1
+            saida.write(json.dumps(linha, ensure_ascii=False) + '\n')
+        saida.flush()
+        self.status['linhas'] += len(janela)
+
+
+class UserImport:
+    """
+    Importação em massa de usuários (POST /users/import).
+
+    O arquivo enviado é copiado em partes para IMPORT_DIR/<id>/entrada e
+    processado por uma thread de fundo, sem ser carregado inteiro em memória.
+    O progresso fica em IMPORT_DIR/<id>/status.json e o resultado por linha em
+    IMPORT_DIR/<id>/resultado.ndjson, legíveis por qualquer worker da máquina.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        diretorio = app.config['IMPORT_DIR']
+        os.makedirs(diretorio, exist_ok=True)
+        app.extensions['user_import'] = diretorio
+
+    @property
+    def diretorio(self):
+        return current_app.extensions['user_import']
+
+    def _diretorio_importacao(self, importacao_id):
+        # Ids são gerados aqui (uuid hex); qualquer outro valor é ignorado
+        if not importacao_id or not importacao_id.isalnum():
+            return None
+        caminho = os.path.join(self.diretorio, importacao_id)
+        return caminho if os.path.isdir(caminho) else None
+
+    def iniciar(self, origem, formato, criar_usuario, consultar_cep):
+        """
+        Copia `origem` (objeto com read) para o diretório da importação e inicia
+        o processamento em segundo plano. Retorna o status inicial.
+        """
+        app = current_app._get_current_object()
+        limite = app.config['IMPORT_MAX_BYTES']
+        importacao_id = uuid.uuid4().hex
+        diretorio = os.path.join(self.diretorio, importacao_id)
+        os.makedirs(diretorio)
+        try:
+            copiados = 0
+            with open(os.path.join(diretorio, 'entrada'), 'wb') as destino:
+                while True:
+                    parte = origem.read(TAMANHO_PARTE)
+                    if not parte:
+                        break
+                    copiados += len(parte)
+                    if copiados > limite:
+                        raise ImportacaoInvalida(f'Arquivo maior que o limite de {limite} bytes')
+                    destino.write(parte)
+            if copiados == 0:
+                raise ImportacaoInvalida('Arquivo vazio')
+        except BaseException:
+            shutil.rmtree(diretorio, ignore_errors=True)
+            raise
+
+        importacao = _Importacao(diretorio, formato, app.config)
+        importacao.gravar_status(forcar=True)
+
+        def executar():
+            with app.app_context():
+                importacao.executar(criar_usuario, consultar_cep)
+
+        threading.Thread(target=executar, name=f'importacao-{importacao_id[:8]}', daemon=True).start()
+        return dict(importacao.status)
+
+    def status(self, importacao_id):
+        """
+        Progresso da importação ou None se ela não existir
+        """
+        diretorio = self._diretorio_importacao(importacao_id)
+        if diretorio is None:
+            return None
+        try:
+            with open(os.path.join(diretorio, 'status.json'), encoding='utf-8') as arquivo:
+                status = json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+        if status['status'] == 'processando' and not _processo_vivo(status['pid']):
+            # O worker que processava a importação foi encerrado
+            status['status'] = 'interrompida'
+        if status['bytes_total']:
+            status['progresso'] = round(status['bytes_lidos'] / status['bytes_total'], 4)
+        return status
+
+    def caminho_resultado(self, importacao_id):
+        diretorio = self._diretorio_importacao(importacao_id)
+        if diretorio is None:
+            return None
+        caminho = os.path.join(diretorio, 'resultado.ndjson')
+        return caminho if os.path.exists(caminho) else None
+
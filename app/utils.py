@@ -1,14 +1,48 @@
-import requests
+import codecs
+import contextvars
+import json
+import os
+import re
+
 from flask import current_app
+from .cep import normalizar_cep
+from .extensions import upstream, cotacao_cache, response_cache, cep_store
+from .metrics import medir_upstream
+from .upstream import single_flight, modulo_sob_demanda
+
+requests = modulo_sob_demanda('requests')
 
 
+@medir_upstream
 def consultar_api_viacep(cep):
+    """
+    Obtém os dados de endereço com base no CEP, passando pelo índice local de
+    CEPs; endereços obtidos da API ViaCEP são gravados no índice
+    """
+    normalizado = normalizar_cep(cep)
+    if normalizado is None:
+        return _buscar_cep(cep)
+
+    endereco = cep_store.get(normalizado)
+    if endereco is not None:
+        return endereco
+
+    endereco = _buscar_cep(normalizado)
+    if endereco is not None and 'message' not in endereco and not endereco.get('erro'):
+        cep_store.set(normalizado, endereco)
+    return endereco
+
+
+@single_flight
+def _buscar_cep(cep):
     """
     Consulta a API ViaCEP para obter os dados de endereço com base no CEP
     """
     try:
-        api_url = f"{current_app.config['VIACEP_API_URL']}/cep/{cep}"
-        response = requests.get(api_url)
+        response = upstream.get('viacep', f"/cep/{cep}")
+        if response.status_code == 404:
+            # CEP inexistente informado pelo status, e não pelo corpo {"erro": true}
+            return {'erro': True}
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -16,13 +50,13 @@ def consultar_api_viacep(cep):
         return None
 
 
+@medir_upstream
 def criar_usuario(dados_usuario):
     """
     Envia uma requisição para a API ViaCEP para criar um novo usuário
     """
     try:
-        # Constrói a URL com os parâmetros
-        api_url = f"{current_app.config['VIACEP_API_URL']}/usuarios"
+        # Monta os parâmetros da requisição
         params = {
             'nome_completo': dados_usuario.get('nome_completo'),
             'email': dados_usuario.get('email'),
@@ -32,7 +66,7 @@ def criar_usuario(dados_usuario):
             'complemento': dados_usuario.get('complemento', '')
         }
         
-        response = requests.post(api_url, params=params)
+        response = upstream.post('viacep', "/usuarios", params=params)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -40,13 +74,13 @@ def criar_usuario(dados_usuario):
         return None
 
 
+@medir_upstream
 def atualizar_usuario(user_id, dados_usuario):
     """
     Envia uma requisição para a API ViaCEP para atualizar um usuário existente
     """
     try:
-        # Constrói a URL com os parâmetros
-        api_url = f"{current_app.config['VIACEP_API_URL']}/usuarios/{user_id}"
+        # Monta os parâmetros da requisição
         params = {}
         
         # Adiciona apenas os campos fornecidos
@@ -61,21 +95,36 @@ def atualizar_usuario(user_id, dados_usuario):
         if 'complemento' in dados_usuario:
             params['complemento'] = dados_usuario['complemento']
         
-        response = requests.put(api_url, params=params)
+        response = upstream.put('viacep', f"/usuarios/{user_id}", params=params)
         response.raise_for_status()
-        return response.json()
+        resultado = response.json()
+        if 'message' not in resultado:
+            response_cache.invalidate(f'usuario:{user_id}')
+        return resultado
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f"Erro ao atualizar usuário na API ViaCEP: {str(e)}")
         return None
 
 
+@medir_upstream
 def obter_usuario(user_id):
+    """
+    Obtém os dados de um usuário específico, passando pelo cache de respostas
+    """
+    return response_cache.get_or_fetch(
+        f'usuario:{user_id}',
+        lambda: _buscar_usuario(user_id),
+        current_app.config['RESPONSE_CACHE_USER_TTL']
+    )
+
+
+@single_flight
+def _buscar_usuario(user_id):
     """
     Obtém os dados de um usuário específico da API ViaCEP
     """
     try:
-        api_url = f"{current_app.config['VIACEP_API_URL']}/usuarios/{user_id}"
-        response = requests.get(api_url)
+        response = upstream.get('viacep', f"/usuarios/{user_id}")
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -83,28 +132,113 @@ def obter_usuario(user_id):
         return None
 
 
-def listar_usuarios():
+@medir_upstream
+def obter_usuario_bruto(user_id):
     """
-    Lista todos os usuários da API ViaCEP
+    Obtém o corpo JSON (bytes) de um usuário específico, sem decodificá-lo,
+    passando pelo cache de respostas
+    """
+    return response_cache.get_or_fetch_bruto(
+        f'usuario:{user_id}',
+        lambda: _buscar_usuario_bruto(user_id),
+        current_app.config['RESPONSE_CACHE_USER_TTL']
+    )
+
+
+@single_flight
+def _buscar_usuario_bruto(user_id):
+    """
+    Obtém o corpo da resposta da API ViaCEP para um usuário específico
     """
     try:
-        api_url = f"{current_app.config['VIACEP_API_URL']}/usuarios"
-        response = requests.get(api_url)
+        response = upstream.get('viacep', f"/usuarios/{user_id}")
         response.raise_for_status()
-        return response.json()
+        return response.content
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"Erro ao obter usuário da API ViaCEP: {str(e)}")
+        return None
+
+
+@medir_upstream
+def listar_usuarios(params=None):
+    """
+    Lista os usuários da API ViaCEP. `params` (cursor/limit) é repassado para
+    a paginação da API secundária. Retorna (usuarios, cabecalhos), com os
+    cabeçalhos da resposta (ex.: X-Next-Cursor); usuarios é None em caso de erro.
+    """
+    try:
+        response = upstream.get('viacep', "/usuarios", params=params)
+        response.raise_for_status()
+        return response.json(), response.headers
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"Erro ao listar usuários da API ViaCEP: {str(e)}")
+        return None, {}
+
+
+@medir_upstream
+def abrir_stream_usuarios(params=None):
+    """
+    Abre a listagem de usuários da API ViaCEP sem ler o corpo, para que ele seja
+    repassado ao cliente em partes. Quem chama deve fechar a resposta.
+    """
+    try:
+        response = upstream.get('viacep', "/usuarios", params=params, stream=True)
+        response.raise_for_status()
+        return response
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f"Erro ao listar usuários da API ViaCEP: {str(e)}")
         return None
 
 
+# Espaços e vírgulas entre os elementos de um array JSON
+_SEPARADORES_JSON = re.compile(r'[ \t\r\n,]*')
+
+
+def iterar_array_json(chunks, parse_float=None):
+    """
+    Gera os elementos de um array JSON recebido em partes (bytes), sem montar a
+    lista inteira em memória. `parse_float` é repassado ao decodificador JSON
+    (ex.: Decimal).
+    """
+    decoder = json.JSONDecoder(parse_float=parse_float)
+    texto = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    abriu = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + texto.decode(chunk)
+        pos = 0
+        while True:
+            pos = _SEPARADORES_JSON.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if not abriu:
+                if buffer[pos] != '[':
+                    raise ValueError('A resposta da API secundária não é um array JSON')
+                abriu = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Elemento incompleto; aguarda a próxima parte
+                break
+            yield item
+    if buffer[pos:].strip():
+        raise ValueError('Array JSON incompleto na resposta da API secundária')
+
+
+@medir_upstream
 def excluir_usuario(user_id):
     """
     Exclui um usuário da API ViaCEP
     """
     try:
-        api_url = f"{current_app.config['VIACEP_API_URL']}/usuarios/{user_id}"
-        response = requests.delete(api_url)
+        response = upstream.delete('viacep', f"/usuarios/{user_id}")
         response.raise_for_status()
+        response_cache.invalidate(f'usuario:{user_id}')
         return True
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f"Erro ao excluir usuário da API ViaCEP: {str(e)}")
@@ -112,12 +246,21 @@ def excluir_usuario(user_id):
 
 
 def consultar_cotacao_dolar():
+    """
+    Obtém a cotação atual do dólar em BRL, servida pelo cache de cotação.
+    Não é medida como chamada ao upstream: só buscar_cotacao_dolar acessa a API.
+    """
+    cotacao, _ = cotacao_cache.get(buscar_cotacao_dolar)
+    return cotacao
+
+
+@medir_upstream
+def buscar_cotacao_dolar():
     """
     Consulta a API Frankfurter para obter a cotação atual do dólar em BRL
     """
     try:
-        api_url = f"{current_app.config['FRANKFURTER_API_URL']}/cotacao"
-        response = requests.get(api_url)
+        response = upstream.get('frankfurter', "/cotacao")
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -125,18 +268,36 @@ def consultar_cotacao_dolar():
         return None
 
 
+def _recusa_upstream(response):
+    """
+    Corpo de uma recusa da API secundária (4xx com `message`, ex.: usuário
+    inexistente ou saldo insuficiente), para que a rota e o write-behind a
+    distingam de uma falha temporária; None para as demais respostas
+    """
+    if not 400 <= response.status_code < 500:
+        return None
+    try:
+        corpo = response.json()
+    except ValueError:
+        return None
+    return corpo if isinstance(corpo, dict) and 'message' in corpo else None
+
+
+@medir_upstream
 def registrar_compra_dolar(dados_compra):
     """
     Envia uma requisição para a API Frankfurter para registrar uma compra de dólares
     """
     try:
-        api_url = f"{current_app.config['FRANKFURTER_API_URL']}/transacoes/compra"
         params = {
             'user_id': dados_compra.get('user_id'),
             'valor_brl': dados_compra.get('valor_brl')
         }
         
-        response = requests.post(api_url, params=params)
+        response = upstream.post('frankfurter', "/transacoes/compra", params=params)
+        recusa = _recusa_upstream(response)
+        if recusa is not None:
+            return recusa
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -144,18 +305,21 @@ def registrar_compra_dolar(dados_compra):
         return None
 
 
+@medir_upstream
 def registrar_venda_dolar(dados_venda):
     """
     Envia uma requisição para a API Frankfurter para registrar uma venda de dólares
     """
     try:
-        api_url = f"{current_app.config['FRANKFURTER_API_URL']}/transacoes/venda"
         params = {
             'user_id': dados_venda.get('user_id'),
             'quantidade_usd': dados_venda.get('quantidade_usd')
         }
         
-        response = requests.post(api_url, params=params)
+        response = upstream.post('frankfurter', "/transacoes/venda", params=params)
+        recusa = _recusa_upstream(response)
+        if recusa is not None:
+            return recusa
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -163,13 +327,22 @@ def registrar_venda_dolar(dados_venda):
         return None
 
 
+@medir_upstream
 def obter_transacao(transaction_id):
+    """
+    Obtém os dados de uma transação específica, passando pelo cache de respostas.
+    Transações não mudam depois de criadas, então não expiram.
+    """
+    return response_cache.get_or_fetch(f'transacao:{transaction_id}', lambda: _buscar_transacao(transaction_id))
+
+
+@single_flight
+def _buscar_transacao(transaction_id):
     """
     Obtém os dados de uma transação específica da API Frankfurter
     """
     try:
-        api_url = f"{current_app.config['FRANKFURTER_API_URL']}/transacoes/{transaction_id}"
-        response = requests.get(api_url)
+        response = upstream.get('frankfurter', f"/transacoes/{transaction_id}")
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -177,15 +350,77 @@ def obter_transacao(transaction_id):
         return None
 
 
+@medir_upstream
+def abrir_transacoes_usuario(user_id, params=None):
+    """
+    Abre a listagem de transações de um usuário na API Frankfurter sem ler o
+    corpo, para que ele seja processado em partes. `params` (from, to, tipo,
+    cursor) é repassado à API secundária. Quem chama deve fechar a resposta.
+    Um 404 (usuário inexistente) também é retornado, para que seja repassado.
+    """
+    try:
+        response = upstream.get('frankfurter', f"/transacoes/usuario/{user_id}", params=params, stream=True)
+        if response.status_code == 404:
+            return response
+        response.raise_for_status()
+        return response
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"Erro ao listar transações da API Frankfurter: {str(e)}")
+        return None
+
+
+@medir_upstream
+@single_flight
 def obter_saldo_usuario(user_id):
     """
     Obtém o saldo de um usuário da API Frankfurter
     """
     try:
-        api_url = f"{current_app.config['FRANKFURTER_API_URL']}/transacoes/usuario/{user_id}/saldo"
-        response = requests.get(api_url)
+        response = upstream.get('frankfurter', f"/transacoes/usuario/{user_id}/saldo")
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f"Erro ao obter saldo da API Frankfurter: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _executor(app):
+    """
+    Retorna o pool de threads do processo atual usado nas chamadas paralelas
+    """
+    estado = app.extensions.get('executor')
+    if estado is None or estado[0] != os.getpid():
+        from concurrent.futures import ThreadPoolExecutor
+
+        estado = (os.getpid(), ThreadPoolExecutor(
+            max_workers=app.config['FANOUT_MAX_WORKERS'], thread_name_prefix='fanout'
+        ))
+        app.extensions['executor'] = estado
+    return estado[1]
+
+
+def executar_em_paralelo(tarefas):
+    """
+    Executa em paralelo as funções de `tarefas` (nome -> função sem argumentos),
+    cada uma no contexto da aplicação atual, e retorna um dict nome -> resultado.
+    Uma função que levanta exceção tem resultado None.
+    """
+    app = current_app._get_current_object()
+    executor = _executor(app)
+
+    def com_contexto(func):
+        with app.app_context():
+            return func()
+
+    # Cada tarefa recebe uma cópia do contexto (ex.: span da requisição, para o rastreamento)
+    futures = {
+        nome: executor.submit(contextvars.copy_context().run, com_contexto, func) for nome, func in tarefas.items()
+    }
+    resultados = {}
+    for nome, future in futures.items():
+        try:
+            resultados[nome] = future.result()
+        except Exception as e:
+            current_app.logger.error(f"Erro na chamada paralela {nome}: {str(e)}")
+            resultados[nome] = None
+    return resultados
@@ -0,0 +1,782 @@
+import fcntl
+import glob
+import json
+import mmap
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from flask import current_app, request
+
+from .upstream import CircuitOpenError
+
+SUFIXO = '.journal'
+# Id de acompanhamento: <segmento do journal>-<posição do registro de aceite no segmento>
+TRACKING_ID = re.compile(r'^([0-9a-f]{16})-([0-9]+)$')
+CAMPO_VALOR = {'compra': 'valor_brl', 'venda': 'quantidade_usd'}
+# Segmentos: <partição, 2 dígitos hex><criação em microssegundos, 14 dígitos hex>.journal
+MAX_PARTICOES = 256
+# Trecho lido de cada vez ao procurar o fim da última linha completa de um segmento
+TRECHO_REPARO = 64 * 1024
+
+# Operações registradas no journal
+ACEITA = 'aceita'
+FALHA = 'falha'
+CONCLUIDA = 'concluida'
+RECUSADA = 'recusada'
+FALHOU = 'falhou'
+FINAIS = (CONCLUIDA, RECUSADA, FALHOU)
+PENDENTE = 'pendente'
+
+
+class TransacaoInvalida(ValueError):
+    """
+    Os dados da compra ou venda não podem ser aceitos para envio posterior
+    """
+
+
+class JournalIndisponivel(Exception):
+    """
+    A transação não pôde ser gravada no journal (disco cheio, erro de E/S ou
+    limite de transações pendentes do worker atingido)
+    """
+
+
+def _linha(registro):
+    return (json.dumps(registro, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _ler_registros(conteudo):
+    for linha in conteudo.splitlines():
+        try:
+            yield json.loads(linha)
+        except ValueError:
+            # Linha gravada pela metade (o processo parou durante a escrita)
+            continue
+
+
+def _fim_da_ultima_linha(fd):
+    """
+    Posição logo após a última linha completa do segmento. Um processo que
+    parou durante a escrita pode ter deixado uma linha pela metade, nunca
+    confirmada ao cliente: ela é descartada, para que a próxima escrita não a
+    continue. Chamado com o lock da partição.
+    """
+    fim = os.lseek(fd, 0, os.SEEK_END)
+    if not fim or os.pread(fd, 1, fim - 1) == b'\n':
+        return fim
+    posicao = fim
+    while posicao:
+        inicio = max(0, posicao - TRECHO_REPARO)
+        quebra = os.pread(fd, posicao - inicio, inicio).rfind(b'\n')
+        if quebra != -1:
+            posicao = inicio + quebra + 1
+            break
+        posicao = inicio
+    os.ftruncate(fd, posicao)
+    return posicao
+
+
+class _Segmento:
+    """
+    Segmento do journal de uma partição aberto por este processo. No dono da
+    partição, guarda até onde o arquivo já foi lido e as transações aceitas
+    nele ainda sem registro final.
+    """
+
+    def __init__(self, caminho, fd):
+        self.caminho = caminho
+        self.nome = os.path.basename(caminho)[:-len(SUFIXO)]
+        self.fd = fd
+        self.lido = 0
+        self.abertas = set()
+
+    @classmethod
+    def abrir(cls, caminho, criar=False):
+        """
+        Abre (ou cria) o segmento; retorna None se ele não existir
+        """
+        flags = os.O_RDWR | os.O_APPEND | (os.O_CREAT | os.O_EXCL if criar else 0)
+        try:
+            fd = os.open(caminho, flags, 0o644)
+        except FileNotFoundError:
+            return None
+        return cls(caminho, fd)
+
+    def tamanho(self):
+        return os.fstat(self.fd).st_size
+
+    def fechar(self):
+        os.close(self.fd)
+
+
+class _Particao:
+    """
+    Transações dos usuários com user_id % WRITE_BEHIND_PARTITIONS igual a
+    `numero`, em segmentos compartilhados pelos workers.
+
+    Toda escrita nos segmentos é feita com flock em particao-XX.lock, de forma
+    que a ordem dos registros no journal é a ordem de aceite mesmo com vários
+    workers aceitando transações do mesmo usuário. Só o dono da partição (o
+    worker com flock em particao-XX.dono, liberado pelo sistema operacional
+    quando o processo termina) lê os segmentos e envia as transações.
+    """
+
+    def __init__(self, diretorio, numero, tamanho_segmento):
+        self.diretorio = diretorio
+        self.numero = numero
+        self.prefixo = f'{numero:02x}'
+        self.tamanho_segmento = tamanho_segmento
+        self.trava = os.open(os.path.join(diretorio, f'particao-{self.prefixo}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        self.dono = None
+        # Protege os segmentos abertos entre a thread de gravação, o leitor e a recuperação
+        self.lock = threading.Lock()
+        # Segmentos abertos por este processo, pelo nome: o atual (aceites) e, no dono, os com leitura pendente
+        self.abertos = {}
+        self.atual = None
+        # Segmento mais recente conhecido pelo dono
+        self.ultimo = None
+
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, nome + SUFIXO)
+
+    def listar(self):
+        padrao = os.path.join(self.diretorio, self.prefixo + '?' * 14 + SUFIXO)
+        return sorted(os.path.basename(caminho)[:-len(SUFIXO)] for caminho in glob.glob(padrao))
+
+    def segmento(self, nome):
+        """
+        Chamado com self.lock; retorna None se o segmento não existir mais
+        """
+        segmento = self.abertos.get(nome)
+        if segmento is None:
+            segmento = _Segmento.abrir(self._caminho(nome))
+            if segmento is not None:
+                self.abertos[nome] = segmento
+        return segmento
+
+    def segmento_atual(self):
+        """
+        Chamado com o flock da partição e self.lock: o segmento que recebe os
+        aceites, criando um novo quando o mais recente atinge
+        WRITE_BEHIND_SEGMENT_BYTES. Um segmento menor que isso é sempre o mais recente.
+        """
+        atual = self.atual
+        if atual is not None and atual.tamanho() < self.tamanho_segmento:
+            return atual
+        nomes = self.listar()
+        atual = self.segmento(nomes[-1]) if nomes else None
+        if atual is None or atual.tamanho() >= self.tamanho_segmento:
+            criacao = time.time_ns() // 1000
+            if nomes:
+                criacao = max(criacao, int(nomes[-1][2:], 16) + 1)
+            nome = f'{self.prefixo}{criacao:014x}'
+            atual = self.abertos[nome] = _Segmento.abrir(self._caminho(nome), criar=True)
+        anterior, self.atual = self.atual, atual
+        if anterior is not None and anterior is not atual:
+            self._liberar(anterior)
+        return atual
+
+    def _liberar(self, segmento):
+        """
+        Chamado com self.lock: fecha o segmento se este processo não precisa mais dele
+        """
+        if segmento is self.atual:
+            return
+        if self.dono is not None and (
+            segmento.nome == self.ultimo or segmento.abertas or segmento.lido < segmento.tamanho()
+        ):
+            return
+        del self.abertos[segmento.nome]
+        segmento.fechar()
+
+    def assumir(self):
+        """
+        Chamado com self.lock: tenta se tornar o dono da partição
+        """
+        fd = os.open(os.path.join(self.diretorio, f'particao-{self.prefixo}.dono'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.dono = fd
+        self.ultimo = None
+        return True
+
+    def ler(self):
+        """
+        Chamado pelo dono com self.lock: lê os registros gravados desde a última
+        leitura e retorna [(segmento, registro de aceite, tentativas)] das
+        transações sem registro final, na ordem do journal
+        """
+        ultimo = self.abertos.get(self.ultimo) if self.ultimo is not None else None
+        # Um segmento novo só é criado depois que o mais recente fica cheio; a
+        # listagem vem antes da leitura, para que nenhum aceite no anterior se perca
+        if ultimo is None or ultimo.tamanho() >= self.tamanho_segmento:
+            for nome in self.listar():
+                if self.ultimo is None or nome > self.ultimo:
+                    if self.segmento(nome) is not None:
+                        self.ultimo = nome
+
+        novas = {}
+        for nome in sorted(self.abertos):
+            segmento = self.abertos[nome]
+            fim = segmento.tamanho()
+            if fim > segmento.lido:
+                conteudo = os.pread(segmento.fd, fim - segmento.lido, segmento.lido)
+                # Uma linha sem quebra ainda está sendo gravada (ou ficou pela metade)
+                completo = conteudo.rfind(b'\n') + 1
+                segmento.lido += completo
+                for registro in _ler_registros(conteudo[:completo]):
+                    tracking_id = registro.get('id')
+                    operacao = registro.get('op')
+                    if operacao == ACEITA:
+                        segmento.abertas.add(tracking_id)
+                        novas[tracking_id] = (nome, registro, 0)
+                    elif operacao == FALHA and tracking_id in novas:
+                        novas[tracking_id] = novas[tracking_id][:2] + (registro.get('tentativas', 0),)
+                    elif operacao in FINAIS:
+                        segmento.abertas.discard(tracking_id)
+                        novas.pop(tracking_id, None)
+            self._liberar(segmento)
+        return list(novas.values())
+
+    def limpar(self, retencao):
+        """
+        Chamado pelo dono com self.lock: apaga os segmentos anteriores ao mais
+        recente, já lidos e sem pendências, modificados há mais de `retencao` segundos
+        """
+        for nome in self.listar():
+            if self.ultimo is None or nome >= self.ultimo:
+                break
+            if nome in self.abertos:
+                continue
+            caminho = self._caminho(nome)
+            try:
+                if time.time() - os.stat(caminho).st_mtime > retencao:
+                    os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+
+class _Aviso:
+    __slots__ = ('gravado', 'erro')
+
+    def __init__(self):
+        self.gravado = False
+        self.erro = None
+
+
+class _Journal:
+    """
+    Gravação dos registros nos segmentos das partições.
+
+    Os registros são acumulados em memória e gravados por uma thread que faz
+    um único write e um único fdatasync por segmento a cada lote (group
+    commit), com o lock de cada partição: quem espera pela gravação é liberado
+    depois do fdatasync do seu lote.
+    """
+
+    def __init__(self, intervalo_fsync, timeout, stats):
+        self.intervalo_fsync = intervalo_fsync
+        self.timeout = timeout
+        self.stats = stats
+        self.cond = threading.Condition()
+        self.buffer = []
+        # Acorda o leitor das partições depois de cada lote gravado
+        self.gravado = threading.Event()
+
+    def iniciar(self):
+        threading.Thread(target=self._executar, name='journal', daemon=True).start()
+
+    def aceitar(self, particao, registro):
+        """
+        Grava o registro de uma nova transação no segmento atual da partição e
+        espera o fdatasync. Retorna o id de acompanhamento.
+        """
+        with self.cond:
+            aviso = self._anexar(particao, None, registro)
+            self._esperar(aviso)
+        if aviso.erro is not None:
+            raise JournalIndisponivel(str(aviso.erro))
+        return registro['id']
+
+    def registrar(self, particao, segmento, registro):
+        """
+        Grava o andamento de uma transação no segmento em que ela foi aceita e espera o fdatasync
+        """
+        with self.cond:
+            aviso = self._anexar(particao, segmento, registro)
+            try:
+                self._esperar(aviso)
+            except JournalIndisponivel:
+                return False
+        return aviso.erro is None
+
+    def _anexar(self, particao, segmento, registro):
+        aviso = _Aviso()
+        self.buffer.append((particao, segmento, registro, aviso))
+        self.cond.notify_all()
+        return aviso
+
+    def _esperar(self, aviso):
+        """
+        Chamado com self.cond. Levanta JournalIndisponivel se o lote do registro
+        não for gravado em WRITE_BEHIND_JOURNAL_TIMEOUT segundos.
+        """
+        limite = time.monotonic() + self.timeout
+        while not aviso.gravado:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                # Ainda no buffer, o registro é retirado para não ser gravado depois da recusa
+                self.buffer = [item for item in self.buffer if item[3] is not aviso]
+                raise JournalIndisponivel('Tempo esgotado esperando a gravação no journal')
+            self.cond.wait(restante)
+
+    def _executar(self):
+        while True:
+            with self.cond:
+                while not self.buffer:
+                    self.cond.wait()
+            if self.intervalo_fsync:
+                # Espera mais registros para o mesmo fdatasync
+                time.sleep(self.intervalo_fsync)
+            with self.cond:
+                lote, self.buffer = self.buffer, []
+
+            por_particao = {}
+            for particao, segmento, registro, aviso in lote:
+                por_particao.setdefault(particao, []).append((segmento, registro, aviso))
+            fsyncs = 0
+            for particao, itens in por_particao.items():
+                try:
+                    fsyncs += self._gravar(particao, itens)
+                except Exception as e:
+                    # Erro que não é de E/S: o lote da partição falha, mas a thread
+                    # continua gravando os próximos e quem espera é liberado
+                    for _, _, aviso in itens:
+                        aviso.erro = e
+            self.gravado.set()
+
+            with self.cond:
+                self.stats['fsyncs'] += fsyncs
+                for _, _, _, aviso in lote:
+                    aviso.gravado = True
+                self.cond.notify_all()
+
+    @staticmethod
+    def _gravar(particao, itens):
+        """
+        Grava os registros de uma partição com o lock dela. Os aceites vão para
+        o segmento atual e recebem o id com a posição em que são gravados; os
+        demais, para o segmento da transação. Retorna o número de fdatasyncs.
+        """
+        por_segmento = {}
+        fcntl.flock(particao.trava, fcntl.LOCK_EX)
+        try:
+            with particao.lock:
+                for nome, registro, aviso in itens:
+                    try:
+                        segmento = particao.segmento_atual() if nome is None else particao.segmento(nome)
+                    except OSError as e:
+                        aviso.erro = e
+                        continue
+                    if segmento is None:
+                        aviso.erro = FileNotFoundError(f'Segmento {nome} não encontrado')
+                        continue
+                    por_segmento.setdefault(segmento, []).append((registro, aviso))
+                for segmento, registros in por_segmento.items():
+                    _Journal._gravar_segmento(segmento, registros)
+        finally:
+            fcntl.flock(particao.trava, fcntl.LOCK_UN)
+        return len(por_segmento)
+
+    @staticmethod
+    def _gravar_segmento(segmento, registros):
+        inicio = None
+        try:
+            inicio = _fim_da_ultima_linha(segmento.fd)
+            posicao = inicio
+            partes = []
+            for registro, _ in registros:
+                if registro['op'] == ACEITA:
+                    registro['id'] = f'{segmento.nome}-{posicao}'
+                linha = _linha(registro)
+                partes.append(linha)
+                posicao += len(linha)
+            visao = memoryview(b''.join(partes))
+            while visao:
+                visao = visao[os.write(segmento.fd, visao):]
+            os.fdatasync(segmento.fd)
+        except OSError as e:
+            # Descarta a parte gravada, para que o próximo lote não continue uma linha pela metade
+            if inicio is not None:
+                try:
+                    os.ftruncate(segmento.fd, inicio)
+                except OSError:
+                    pass
+            for _, aviso in registros:
+                aviso.erro = e
+
+
+class _Pendente:
+    __slots__ = ('id', 'particao', 'segmento', 'tipo', 'user_id', 'dados', 'tentativas')
+
+    def __init__(self, tracking_id, particao, segmento, tipo, user_id, dados, tentativas=0):
+        self.id = tracking_id
+        self.particao = particao
+        self.segmento = segmento
+        self.tipo = tipo
+        self.user_id = user_id
+        self.dados = dados
+        self.tentativas = tentativas
+
+
+class _WriteBehindState:
+    def __init__(self, config):
+        self.diretorio = config['WRITE_BEHIND_DIR']
+        self.modo = config['WRITE_BEHIND_MODE']
+        self.num_particoes = max(1, min(MAX_PARTICOES, config['WRITE_BEHIND_PARTITIONS']))
+        self.tamanho_segmento = config['WRITE_BEHIND_SEGMENT_BYTES']
+        self.intervalo_fsync = config['WRITE_BEHIND_FSYNC_INTERVAL']
+        self.timeout_journal = config['WRITE_BEHIND_JOURNAL_TIMEOUT']
+        self.intervalo_leitura = config['WRITE_BEHIND_POLL_INTERVAL']
+        self.max_concorrencia = config['WRITE_BEHIND_MAX_CONCURRENCY']
+        self.max_pendentes = config['WRITE_BEHIND_MAX_PENDING']
+        self.max_tentativas = config['WRITE_BEHIND_MAX_ATTEMPTS']
+        self.retry_base = config['WRITE_BEHIND_RETRY_BASE']
+        self.retry_max = config['WRITE_BEHIND_RETRY_MAX']
+        self.intervalo_recuperacao = config['WRITE_BEHIND_RECOVERY_INTERVAL']
+        self.retencao = config['WRITE_BEHIND_RETENTION']
+        self.lock = threading.Lock()
+        self.recuperacao = threading.Lock()
+        self.pid = None
+        self.journal = None
+        self.particoes = []
+        # Fila de transações por usuário; um usuário está em `prontos` quando
+        # tem transações e nenhuma delas está sendo enviada
+        self.filas = {}
+        self.prontos = None
+        self.pendentes = 0
+        self.stats = {
+            'aceitas': 0, 'concluidas': 0, 'recusadas': 0, 'falhas': 0,
+            'retentativas': 0, 'recuperadas': 0, 'fsyncs': 0
+        }
+
+    def enfileirar(self, pendente):
+        with self.lock:
+            self.pendentes += 1
+            fila = self.filas.get(pendente.user_id)
+            if fila is None:
+                fila = self.filas[pendente.user_id] = deque()
+                self.prontos.put(pendente.user_id)
+            fila.append(pendente)
+
+
+class WriteBehind:
+    """
+    Aceite assíncrono de compras e vendas (opcional).
+
+    Com WRITE_BEHIND_ENABLED, compras e vendas válidas são gravadas em um
+    journal local append-only (em WRITE_BEHIND_DIR) e respondidas com 202 e um
+    id de acompanhamento assim que o registro chega ao disco; com
+    WRITE_BEHIND_MODE=prefer, só as requisições com `Prefer: respond-async`.
+
+    Os usuários são divididos em WRITE_BEHIND_PARTITIONS partições pelo
+    user_id. Qualquer worker grava o aceite no segmento atual da partição do
+    usuário, com o lock da partição, de forma que o journal guarda a ordem de
+    aceite entre todos os workers. Cada partição tem um único dono, o worker
+    que a assumiu primeiro: ele lê os segmentos da partição e envia as
+    transações à API secundária na ordem de aceite de cada usuário, com no
+    máximo WRITE_BEHIND_MAX_CONCURRENCY envios simultâneos, repetindo com
+    espera exponencial enquanto a API secundária falhar. As partições de um
+    worker encerrado são assumidas por outro, que envia as transações
+    pendentes; uma transação enviada pouco antes de uma queda pode ser enviada
+    de novo (entrega ao menos uma vez).
+    """
+
+    def __init__(self, app=None):
+        self._processar = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['WRITE_BEHIND_ENABLED']:
+            app.extensions['write_behind'] = None
+            return
+        os.makedirs(app.config['WRITE_BEHIND_DIR'], exist_ok=True)
+        state = _WriteBehindState(app.config)
+        app.extensions['write_behind'] = state
+        app.before_request(partial(self._iniciar, state))
+
+    def processador(self, func):
+        """
+        Registra a função que envia uma transação: func(tipo, dados) -> (corpo, status)
+        """
+        self._processar = func
+        return func
+
+    @property
+    def state(self):
+        return current_app.extensions['write_behind']
+
+    def assincrona(self):
+        """
+        Indica se a compra ou venda da requisição atual deve ser aceita de forma assíncrona
+        """
+        state = self.state
+        if state is None:
+            return False
+        return state.modo == 'always' or 'respond-async' in request.headers.get('Prefer', '')
+
+    def _iniciar(self, state):
+        # Journal, despachante, leitor e recuperação: uma vez por processo, no
+        # primeiro uso (depois do fork dos workers)
+        if state.pid == os.getpid():
+            return
+        with state.lock:
+            if state.pid == os.getpid():
+                return
+            state.particoes = [
+                _Particao(state.diretorio, numero, state.tamanho_segmento) for numero in range(state.num_particoes)
+            ]
+            state.journal = _Journal(state.intervalo_fsync, state.timeout_journal, state.stats)
+            state.filas = {}
+            state.prontos = queue.Queue()
+            state.pendentes = 0
+            # Por último: quem não pega o lock só segue depois que tudo foi criado
+            state.pid = os.getpid()
+
+        app = current_app._get_current_object()
+        state.journal.iniciar()
+        for i in range(state.max_concorrencia):
+            threading.Thread(target=self._despachar, args=(app, state), name=f'despachante-{i}', daemon=True).start()
+        threading.Thread(target=self._acompanhar, args=(app, state), name='leitor-journal', daemon=True).start()
+        threading.Thread(target=self._supervisionar, args=(app, state), name='recuperacao-journal', daemon=True).start()
+
+    def aceitar(self, tipo, dados):
+        """
+        Valida e grava a transação no journal; retorna o corpo da resposta 202.
+        Levanta TransacaoInvalida ou JournalIndisponivel.
+        """
+        state = self.state
+        self._iniciar(state)
+        campo = CAMPO_VALOR[tipo]
+        try:
+            user_id = int(dados['user_id'])
+        except (TypeError, ValueError):
+            raise TransacaoInvalida('Campo inválido: user_id deve ser um número inteiro')
+        try:
+            valor = Decimal(str(dados[campo]))
+        except (InvalidOperation, ValueError):
+            valor = None
+        if valor is None or not valor.is_finite() or valor <= 0:
+            raise TransacaoInvalida(f'Campo inválido: {campo} deve ser um número maior que zero')
+        if state.max_pendentes and state.pendentes >= state.max_pendentes:
+            raise JournalIndisponivel('Limite de transações pendentes atingido')
+
+        particao = state.particoes[user_id % len(state.particoes)]
+        tracking_id = state.journal.aceitar(
+            particao, {'op': ACEITA, 'tipo': tipo, 'user_id': user_id, 'dados': dict(dados), 'em': time.time()}
+        )
+        with state.lock:
+            state.stats['aceitas'] += 1
+        return {'tracking_id': tracking_id, 'status': PENDENTE, 'tipo': tipo, 'user_id': user_id, campo: float(valor)}
+
+    @staticmethod
+    def _enfileirar(state, particao, pendentes):
+        """
+        Chamado com o lock da partição, para que as transações entrem na fila na ordem do journal
+        """
+        for segmento, registro, tentativas in pendentes:
+            state.enfileirar(_Pendente(
+                registro['id'], particao, segmento, registro['tipo'], registro['user_id'], registro['dados'], tentativas
+            ))
+
+    def _acompanhar(self, app, state):
+        """
+        Enfileira as transações aceitas (por qualquer worker) nas partições de
+        que este worker é dono, depois de cada lote gravado por este worker ou a
+        cada WRITE_BEHIND_POLL_INTERVAL segundos
+        """
+        while True:
+            state.journal.gravado.wait(state.intervalo_leitura)
+            state.journal.gravado.clear()
+            for particao in state.particoes:
+                if particao.dono is None:
+                    continue
+                try:
+                    with particao.lock:
+                        self._enfileirar(state, particao, particao.ler())
+                except Exception as e:
+                    app.logger.error(f"Erro ao ler a partição {particao.prefixo} do journal: {str(e)}")
+
+    def _despachar(self, app, state):
+        while True:
+            user_id = state.prontos.get()
+            with state.lock:
+                pendente = state.filas[user_id][0]
+            with app.app_context():
+                try:
+                    self._enviar(state, pendente)
+                except Exception as e:
+                    # A transação continua pendente no journal e é reenviada na recuperação
+                    app.logger.error(f"Erro ao enviar a transação {pendente.id}: {str(e)}")
+            with state.lock:
+                state.pendentes -= 1
+                fila = state.filas[user_id]
+                fila.popleft()
+                if fila:
+                    state.prontos.put(user_id)
+                else:
+                    del state.filas[user_id]
+
+    def _enviar(self, state, pendente):
+        """
+        Envia a transação até obter uma resposta definitiva ou esgotar WRITE_BEHIND_MAX_ATTEMPTS
+        """
+        while True:
+            pendente.tentativas += 1
+            espera = None
+            try:
+                corpo, status = self._processar(pendente.tipo, pendente.dados)
+            except CircuitOpenError as e:
+                corpo, status = {'message': f'API secundária indisponível: {e.nome}'}, 503
+                espera = e.retry_after
+            except Exception as e:
+                current_app.logger.error(f"Erro ao enviar a transação {pendente.id}: {str(e)}")
+                corpo, status = {'message': str(e)}, 500
+
+            if status < 500:
+                self._concluir(state, pendente, CONCLUIDA if status < 300 else RECUSADA, corpo, status)
+                return
+            if state.max_tentativas and pendente.tentativas >= state.max_tentativas:
+                self._concluir(state, pendente, FALHOU, corpo, status)
+                return
+            state.journal.registrar(pendente.particao, pendente.segmento, {
+                'id': pendente.id, 'op': FALHA, 'tentativas': pendente.tentativas, 'status': status,
+                'message': corpo.get('message') if isinstance(corpo, dict) else None, 'em': time.time()
+            })
+            with state.lock:
+                state.stats['retentativas'] += 1
+            if espera is None:
+                espera = min(state.retry_max, state.retry_base * 2 ** (pendente.tentativas - 1))
+                espera *= random.uniform(0.5, 1.0)
+            time.sleep(max(espera, 0.0))
+
+    @staticmethod
+    def _concluir(state, pendente, operacao, corpo, status):
+        state.journal.registrar(pendente.particao, pendente.segmento, {
+            'id': pendente.id, 'op': operacao, 'tentativas': pendente.tentativas, 'status': status,
+            'resultado': corpo, 'em': time.time()
+        })
+        contador = {CONCLUIDA: 'concluidas', RECUSADA: 'recusadas', FALHOU: 'falhas'}[operacao]
+        with state.lock:
+            state.stats[contador] += 1
+
+    def _supervisionar(self, app, state):
+        while True:
+            with app.app_context():
+                try:
+                    self.recuperar(state)
+                except Exception as e:
+                    app.logger.error(f"Erro na recuperação do journal: {str(e)}")
+            time.sleep(state.intervalo_recuperacao)
+
+    def recuperar(self, state=None):
+        """
+        Assume as partições sem dono (nenhum worker iniciado ou worker
+        encerrado) e enfileira as transações pendentes dos seus segmentos, na
+        ordem do journal; nas partições deste worker, apaga os segmentos sem
+        pendências modificados há mais de WRITE_BEHIND_RETENTION segundos.
+        Retorna o número de transações recuperadas.
+        """
+        state = state or self.state
+        recuperadas = 0
+        with state.recuperacao:
+            for particao in state.particoes:
+                with particao.lock:
+                    if particao.dono is None:
+                        if not particao.assumir():
+                            continue
+                        pendentes = particao.ler()
+                        self._enfileirar(state, particao, pendentes)
+                        if pendentes:
+                            recuperadas += len(pendentes)
+                            current_app.logger.warning(
+                                f"Partição {particao.prefixo} do journal: {len(pendentes)} transações pendentes recuperadas"
+                            )
+                    particao.limpar(state.retencao)
+        if recuperadas:
+            with state.lock:
+                state.stats['recuperadas'] += recuperadas
+        return recuperadas
+
+    def status(self, tracking_id):
+        """
+        Andamento da transação ou None se o id não existir. Lê só as linhas do
+        segmento que citam o id (busca em um mmap do arquivo).
+        """
+        encontrado = TRACKING_ID.match(tracking_id or '')
+        if encontrado is None:
+            return None
+        caminho = os.path.join(current_app.config['WRITE_BEHIND_DIR'], encontrado.group(1) + SUFIXO)
+        marcador = f'"id":"{tracking_id}"'.encode('utf-8')
+        registros = []
+        try:
+            with open(caminho, 'rb') as arquivo, \
+                    mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as conteudo:
+                posicao = conteudo.find(marcador)
+                while posicao != -1:
+                    inicio = conteudo.rfind(b'\n', 0, posicao) + 1
+                    fim = conteudo.find(b'\n', posicao)
+                    if fim == -1:
+                        break
+                    registros.extend(_ler_registros(conteudo[inicio:fim]))
+                    posicao = conteudo.find(marcador, fim)
+        except (OSError, ValueError):
+            # Segmento inexistente, apagado ou vazio
+            return None
+        if not registros or registros[0].get('op') != ACEITA:
+            return None
+
+        aceite = registros[0]
+        campo = CAMPO_VALOR.get(aceite['tipo'])
+        status = {
+            'tracking_id': tracking_id,
+            'status': PENDENTE,
+            'tipo': aceite['tipo'],
+            'user_id': aceite['user_id'],
+            # Validado como número no aceite
+            campo: float(aceite['dados'][campo]),
+            'aceita_em': aceite['em'],
+            'tentativas': 0
+        }
+        for registro in registros[1:]:
+            status['tentativas'] = registro.get('tentativas', status['tentativas'])
+            if registro['op'] == FALHA:
+                status['ultimo_erro'] = registro.get('message')
+            elif registro['op'] in FINAIS:
+                status['status'] = registro['op']
+                status['http_status'] = registro.get('status')
+                status['resultado'] = registro.get('resultado')
+                status['concluida_em'] = registro.get('em')
+        return status
+
+    def stats(self):
+        state = self.state
+        if state is None:
+            return {}
+        with state.lock:
+            stats = dict(state.stats)
+            stats['pendentes'] = state.pendentes
+        # Partições de que este worker é dono (envia as transações)
+        stats['particoes'] = sum(particao.dono is not None for particao in state.particoes)
+        return stats
@@ -0,0 +1,48 @@
+"""
+Microbenchmark do custo do controle de admissão por requisição (balde de
+fichas do cliente mais a vaga de concorrência da rota), com o backend em
+memória e com o backend SQLite compartilhado entre os workers.
+
+Uso:
+    python -m benchmarks.bench_admission_overhead --iterations 50000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app import create_app
+from app.admission import AdmissionControl, BACKENDS, _AdmissionState
+
+
+def medir(app, state, iteracoes):
+    with app.test_request_context('/transactions/compra', method='POST', headers={'X-API-Key': 'bench'}):
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            AdmissionControl._admitir(state)
+            AdmissionControl._liberar(state, None)
+        return (time.perf_counter() - inicio) / iteracoes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=50000)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with tempfile.TemporaryDirectory() as diretorio:
+        app.config.update(
+            # Taxa alta o bastante para que todas as requisições sejam admitidas
+            ADMISSION_RATE=1e9,
+            ADMISSION_API_KEYS='bench',
+            ADMISSION_CONCURRENCY='/transactions/compra=64',
+            ADMISSION_SQLITE_PATH=os.path.join(diretorio, 'admission.sqlite3')
+        )
+        for nome in ('memory', 'sqlite'):
+            state = _AdmissionState(BACKENDS[nome](app.config), app.config)
+            custo = medir(app, state, args.iterations)
+            print(f'{nome:<8} {custo:>8.2f} µs por requisição  {state.stats}')
+
+
+if __name__ == '__main__':
+    main()
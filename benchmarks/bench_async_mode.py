@@ -0,0 +1,37 @@
+"""
+Teste de carga do modo síncrono (worker sync) contra o modo assíncrono (worker
+gevent) com 1000 clientes concorrentes e um upstream lento.
+
+Uso:
+    python -m benchmarks.bench_async_mode --clients 1000 --latency 0.1 --duration 15
+"""
+import argparse
+import json
+
+from benchmarks.loadgen import executar, get
+from benchmarks.server import GunicornServer
+from benchmarks.stub_upstream import StubProcess
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.1, help='Latência do upstream (s)')
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    # Sem cache de respostas para que toda requisição espere o upstream
+    env = {'RESPONSE_CACHE_BACKEND': 'none'}
+    resultados = {}
+    with StubProcess(latency=args.latency) as stub:
+        for modo in ['sync', 'gevent']:
+            with GunicornServer(stub.url, worker_class=modo, workers=args.workers, env=env) as server:
+                resultados[modo] = executar(
+                    server.url, get('/users/1'), clientes=args.clients, duracao=args.duration
+                )
+            print(f"{modo:<7} {json.dumps(resultados[modo])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark de GET /users/<id>/saldo com e sem a projeção de saldos: latência
+média por consulta e chamadas à API secundária, numa carga com uma compra ou
+venda a cada --writes-every consultas e latência simulada no upstream.
+
+Uso:
+    python -m benchmarks.bench_balance_projection --requests 3000 --users 50 --latency 0.005
+"""
+import argparse
+import time
+
+from app import create_app
+from app.extensions import upstream, balance_projection
+from benchmarks.stub_upstream import StubProcess
+
+
+def executar(client, requisicoes, usuarios, escritas_a_cada):
+    # Saldo inicial para que as vendas sejam aceitas
+    for user_id in range(1, usuarios + 1):
+        client.post(f'/transactions/compra?user_id={user_id}&valor_brl=10000')
+    leituras = 0
+    tempo_leituras = 0.0
+    for i in range(requisicoes):
+        user_id = i % usuarios + 1
+        if escritas_a_cada and i % escritas_a_cada == 0:
+            tipo, parametro = ('compra', 'valor_brl=10') if i % 2 else ('venda', 'quantidade_usd=1')
+            client.post(f'/transactions/{tipo}?user_id={user_id}&{parametro}')
+            continue
+        inicio = time.perf_counter()
+        client.get(f'/users/{user_id}/saldo')
+        tempo_leituras += time.perf_counter() - inicio
+        leituras += 1
+    return tempo_leituras / leituras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--writes-every', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.005, help='Latência do upstream (s)')
+    args = parser.parse_args()
+
+    with StubProcess(latency=args.latency) as stub:
+        for nome, habilitada in (('sem projeção', False), ('com projeção', True)):
+            app = create_app('testing')
+            app.config.update(
+                VIACEP_API_URL=stub.url,
+                FRANKFURTER_API_URL=stub.url,
+                BALANCE_PROJECTION_ENABLED=habilitada
+            )
+            upstream.init_app(app)
+            balance_projection.init_app(app)
+            chamadas = stub.chamadas()
+            media = executar(app.test_client(), args.requests, args.users, args.writes_every)
+            print(f'{nome:<14} consulta de saldo {media * 1000:>7.2f} ms  chamadas ao stub {stub.chamadas() - chamadas}')
+            with app.app_context():
+                if habilitada:
+                    print(f'               {balance_projection.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark do índice local de CEPs: chamadas à API ViaCEP e latência de
+consultar_api_viacep para uma rajada de consultas (distribuição de Zipf sobre
+os CEPs), sem índice, com o índice frio (write-through) e com o índice aquecido
+por um arquivo de importação.
+
+Uso:
+    python -m benchmarks.bench_cep_store --lookups 5000 --ceps 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app import create_app
+from app.extensions import upstream, cep_store
+from app.utils import consultar_api_viacep
+from benchmarks.bench_single_flight import amostra_zipf
+from benchmarks.loadgen import percentil
+from benchmarks.stub_upstream import StubProcess
+
+
+def gerar_importacao(caminho, ceps):
+    with open(caminho, 'w') as arquivo:
+        arquivo.write('cep,logradouro,bairro,localidade,uf\n')
+        for i in range(1, ceps + 1):
+            arquivo.write(f'{i:08d},Rua {i},Centro,São Paulo,SP\n')
+
+
+def medir(stub, config, lookups, ceps):
+    app = create_app('testing')
+    app.config.update(VIACEP_API_URL=stub.url, FRANKFURTER_API_URL=stub.url, **config)
+    # Recria o cliente e o índice com a configuração do benchmark
+    upstream.init_app(app)
+    cep_store.init_app(app)
+    antes = stub.chamadas()
+    latencias = []
+    with app.app_context():
+        for cep in amostra_zipf(lookups, ceps, 1.1):
+            inicio = time.perf_counter()
+            consultar_api_viacep(f'{cep:08d}')
+            latencias.append(time.perf_counter() - inicio)
+    return stub.chamadas() - antes, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--ceps', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio, StubProcess() as stub:
+        importacao = os.path.join(diretorio, 'ceps.csv')
+        gerar_importacao(importacao, args.ceps)
+        cenarios = [
+            ('sem índice', '', ''),
+            ('índice frio (write-through)', os.path.join(diretorio, 'frio.sqlite3'), ''),
+            ('índice aquecido', os.path.join(diretorio, 'aquecido.sqlite3'), importacao),
+        ]
+        for nome, path, arquivo in cenarios:
+            config = {'CEP_STORE_PATH': path, 'CEP_STORE_IMPORT_FILE': arquivo}
+            chamadas, latencias = medir(stub, config, args.lookups, args.ceps)
+            print(
+                f'{nome:<30} chamadas upstream={chamadas:>6}  '
+                f'p50={percentil(latencias, 50) * 1e6:>8.1f} µs  p99={percentil(latencias, 99) * 1e6:>8.1f} µs'
+            )
+
+
+if __name__ == '__main__':
+    main()
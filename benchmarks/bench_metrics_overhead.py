@@ -0,0 +1,66 @@
+"""
+Microbenchmark do custo da instrumentação por requisição: ganchos de início e
+fim da requisição mais duas chamadas instrumentadas às APIs secundárias.
+Falha (código de saída 1) se o custo passar do limite.
+
+Uso:
+    python -m benchmarks.bench_metrics_overhead --iterations 200000 --limit-us 20
+"""
+import argparse
+import sys
+import time
+
+from flask import Response
+
+from app import create_app
+from app.extensions import metrics
+from app.metrics import medir_upstream
+
+
+@medir_upstream
+def helper_instrumentado():
+    return None
+
+
+def helper_puro():
+    return None
+
+
+def medir(app, iteracoes, instrumentado):
+    response = Response('{}', mimetype='application/json')
+    helper = helper_instrumentado if instrumentado else helper_puro
+    registry = app.extensions['metrics']
+    with app.test_request_context('/users/1'):
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            if instrumentado:
+                metrics._iniciar(registry)
+            helper()
+            helper()
+            if instrumentado:
+                metrics._finalizar(registry, response)
+                metrics._encerrar(registry, None)
+        return (time.perf_counter() - inicio) / iteracoes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--limit-us', type=float, default=20.0)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    base = medir(app, args.iterations, False)
+    total = medir(app, args.iterations, True)
+    custo = total - base
+    print(f'custo da instrumentação por requisição: {custo:.2f} µs (limite {args.limit_us} µs)')
+    with app.app_context():
+        coleta_inicio = time.perf_counter()
+        metrics.exportar()
+        print(f'GET /metrics (coleta e formatação): {(time.perf_counter() - coleta_inicio) * 1000:.2f} ms')
+    if custo > args.limit_us:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
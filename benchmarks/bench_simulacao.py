@@ -0,0 +1,64 @@
+"""
+Benchmark de POST /transactions/simular: latência de uma simulação com
+--amounts valores (metade compras, metade vendas) e, para comparação, o custo
+de obter os mesmos preços registrando uma compra por valor, com latência
+simulada no upstream. Mostra também as chamadas à API secundária de cada caso.
+
+Uso:
+    python -m benchmarks.bench_simulacao --amounts 1000,10000 --requests 20 --latency 0.005
+"""
+import argparse
+import json
+import random
+import time
+
+from app import create_app
+from app.extensions import upstream
+from benchmarks.stub_upstream import StubProcess
+
+
+def corpo_simulacao(quantidade, gerador):
+    metade = quantidade // 2
+    return json.dumps({
+        'valores_brl': [round(gerador.uniform(1, 100000), 2) for _ in range(quantidade - metade)],
+        'quantidades_usd': [round(gerador.uniform(1, 20000), 2) for _ in range(metade)]
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--amounts', default='100,1000,10000', help='Valores por simulação (lista)')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--compras', type=int, default=100, help='Compras registradas para comparação')
+    parser.add_argument('--latency', type=float, default=0.005, help='Latência do upstream (s)')
+    args = parser.parse_args()
+    gerador = random.Random(42)
+
+    with StubProcess(latency=args.latency) as stub:
+        app = create_app('testing')
+        app.config.update(VIACEP_API_URL=stub.url, FRANKFURTER_API_URL=stub.url)
+        upstream.init_app(app)
+        client = app.test_client()
+
+        for quantidade in (int(valor) for valor in args.amounts.split(',')):
+            corpo = corpo_simulacao(quantidade, gerador)
+            client.post('/transactions/simular', data=corpo, content_type='application/json')
+            chamadas = stub.chamadas()
+            inicio = time.perf_counter()
+            for _ in range(args.requests):
+                resposta = client.post('/transactions/simular', data=corpo, content_type='application/json')
+                assert resposta.status_code == 200, resposta.get_data(as_text=True)
+            media = (time.perf_counter() - inicio) / args.requests
+            print(f'simular {quantidade:>6} valores  {media * 1000:>8.2f} ms por requisição  '
+                  f'{media / quantidade * 1e6:>6.2f} µs por valor  chamadas ao stub {stub.chamadas() - chamadas}')
+
+        chamadas = stub.chamadas()
+        inicio = time.perf_counter()
+        for i in range(args.compras):
+            client.post(f'/transactions/compra?user_id={i % 10 + 1}&valor_brl={round(gerador.uniform(1, 100000), 2)}')
+        media = (time.perf_counter() - inicio) / args.compras
+        print(f'compra por valor        {media * 1000:>8.2f} ms por valor  chamadas ao stub {stub.chamadas() - chamadas}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark do single-flight: número de chamadas ao upstream com e sem
+coalescência de GETs idênticos concorrentes, sob uma carga com distribuição
+de Zipf (poucos IDs muito acessados).
+
+Uso:
+    python -m benchmarks.bench_single_flight --requests 4000 --threads 32 --ids 1000
+"""
+import argparse
+import random
+import threading
+import time
+
+from app import create_app
+from app.extensions import upstream, response_cache
+from benchmarks.stub_upstream import StubProcess
+
+
+def amostra_zipf(total, ids, s, seed=42):
+    pesos = [1 / (k ** s) for k in range(1, ids + 1)]
+    return random.Random(seed).choices(range(1, ids + 1), weights=pesos, k=total)
+
+
+def executar(app, caminhos, threads):
+    indice = iter(range(len(caminhos)))
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(indice, None)
+            if i is None:
+                return
+            client.get(caminhos[i])
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    inicio = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--ids', type=int, default=1000)
+    parser.add_argument('--zipf', type=float, default=1.1, help='Expoente da distribuição de Zipf')
+    parser.add_argument('--latency', type=float, default=0.02, help='Latência do upstream (s)')
+    args = parser.parse_args()
+
+    ids = amostra_zipf(args.requests, args.ids, args.zipf)
+    # Metade das requisições para o saldo e metade para o usuário
+    caminhos = [f'/users/{i}/saldo' if n % 2 else f'/users/{i}' for n, i in enumerate(ids)]
+
+    with StubProcess(latency=args.latency, usuarios=args.ids) as stub:
+        for habilitado in [False, True]:
+            app = create_app('testing')
+            app.config.update(
+                VIACEP_API_URL=stub.url,
+                FRANKFURTER_API_URL=stub.url,
+                UPSTREAM_POOL_MAXSIZE=args.threads,
+                RESPONSE_CACHE_BACKEND='none',
+                SINGLE_FLIGHT_ENABLED=habilitado
+            )
+            upstream.init_app(app)
+            response_cache.init_app(app)
+
+            antes = stub.chamadas()
+            duracao = executar(app, caminhos, args.threads)
+            chamadas = stub.chamadas() - antes
+            nome = 'com single-flight' if habilitado else 'sem single-flight'
+            print(f'{nome:<18} requisições={args.requests} chamadas ao upstream={chamadas} '
+                  f'({chamadas / args.requests:.0%}) em {duracao:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de inicialização: tempo de importação de run.py (create_app incluso)
+e tempo até a primeira resposta de `python run.py` para GET /swagger.json e
+para uma rota que chama a API secundária, medidos em processos novos.
+
+Uso:
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from benchmarks.server import RAIZ, porta_livre
+from benchmarks.stub_upstream import StubProcess
+
+MEDIR_IMPORTACAO = (
+    'import time; inicio = time.perf_counter(); import run; '
+    'print(time.perf_counter() - inicio)'
+)
+
+
+def ambiente(stub_url, **extra):
+    env = dict(os.environ)
+    env.update({
+        'FLASK_ENV': 'production',
+        'VIACEP_API_URL': stub_url,
+        'FRANKFURTER_API_URL': stub_url,
+    })
+    env.update(extra)
+    return env
+
+
+def tempo_importacao(env):
+    saida = subprocess.check_output([sys.executable, '-c', MEDIR_IMPORTACAO], cwd=RAIZ, env=env)
+    return float(saida.decode().strip().splitlines()[-1])
+
+
+def aguardar(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with urlopen(url, timeout=1) as resposta:
+                resposta.read()
+                return time.perf_counter()
+        except (URLError, ConnectionError):
+            time.sleep(0.005)
+    raise RuntimeError(f'{url} não respondeu')
+
+
+def tempo_primeira_resposta(env, caminhos, timeout=30):
+    porta = porta_livre()
+    url = f'http://127.0.0.1:{porta}'
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, 'run.py'], cwd=RAIZ, env=dict(env, PORT=str(porta)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = inicio + timeout
+        tempos = {}
+        for caminho in caminhos:
+            tempos[caminho] = aguardar(url + caminho, deadline) - inicio
+        return tempos
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    caminhos = ['/swagger.json', '/users/1']
+    with StubProcess() as stub:
+        env = ambiente(stub.url)
+        importacoes = [tempo_importacao(env) for _ in range(args.runs)]
+        respostas = [tempo_primeira_resposta(env, caminhos) for _ in range(args.runs)]
+
+    print(f'importação de run.py: mediana {statistics.median(importacoes) * 1000:.1f} ms')
+    for caminho in caminhos:
+        tempos = [r[caminho] for r in respostas]
+        print(f'primeira resposta {caminho:<14} mediana {statistics.median(tempos) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Microbenchmark do custo do rastreamento por requisição: ganchos de início e
+fim da requisição mais duas chamadas às APIs secundárias (span filho e
+traceparent), com o rastreamento desligado e com diferentes taxas de
+amostragem. Falha (código de saída 1) se o custo com a taxa padrão passar do limite.
+
+Uso:
+    python -m benchmarks.bench_tracing_overhead --iterations 100000 --limit-us 25
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from flask import Response
+
+from app import create_app
+from app.extensions import tracing
+from app.tracing import iniciar_chamada
+
+
+class _RespostaFalsa:
+    status_code = 200
+    elapsed = timedelta(milliseconds=1)
+
+
+def chamada_upstream(state, kwargs):
+    chamada = iniciar_chamada(state, 'frankfurter', 'GET', '/cotacao', kwargs)
+    if chamada is not None:
+        chamada.tentativa()
+        chamada.concluir(_RespostaFalsa())
+        chamada.encerrar()
+
+
+def medir(app, iteracoes, rastreado):
+    response = Response('{}', mimetype='application/json')
+    state = app.extensions['tracing']
+    with app.test_request_context('/users/1'):
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            if rastreado:
+                tracing._iniciar(state)
+                chamada_upstream(state, {})
+                chamada_upstream(state, {})
+                tracing._finalizar(state, response)
+                tracing._encerrar(state, None)
+        return (time.perf_counter() - inicio) / iteracoes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--limit-us', type=float, default=25.0)
+    args = parser.parse_args()
+
+    taxa_padrao = create_app('testing').config['TRACING_SAMPLE_RATE']
+    with tempfile.TemporaryDirectory() as diretorio:
+        base = medir(create_app('testing'), args.iterations, False)
+        custo_padrao = None
+        for taxa in (0.0, 0.01, 0.1, 1.0):
+            app = create_app('testing')
+            app.config.update(
+                TRACING_ENABLED=True,
+                TRACING_SAMPLE_RATE=taxa,
+                TRACING_FILE=os.path.join(diretorio, 'traces.ndjson'),
+                TRACING_QUEUE_SIZE=args.iterations * 3,
+                # A exportação é feita ao fim da medição, sem a thread de fundo
+                TRACING_BATCH_SIZE=args.iterations * 3,
+                TRACING_FLUSH_INTERVAL=3600
+            )
+            tracing.init_app(app)
+            custo = medir(app, args.iterations, True) - base
+            with app.app_context():
+                app.extensions['tracing'].exportador.exportar_pendentes()
+                stats = tracing.stats()
+            print(f'amostragem {taxa:>5.0%}: {custo:>6.2f} µs por requisição  {stats}')
+            if taxa == taxa_padrao:
+                custo_padrao = custo
+    if custo_padrao is not None and custo_padrao > args.limit_us:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark de GET /users/<id>/transactions?resumo=true com um histórico grande:
+tempo por requisição e pico de memória alocada (tracemalloc) agregando em
+streaming, comparados com carregar a listagem inteira e agregar depois.
+
+Uso:
+    python -m benchmarks.bench_transactions_history --transactions 200000 --requests 3
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from decimal import Decimal
+
+from app import create_app
+from app.extensions import upstream
+from app.history import ResumoTransacoes
+from benchmarks.stub_upstream import StubProcess
+
+
+def resumo_carregando_tudo(url):
+    # Comportamento ingênuo: lê a listagem inteira em memória antes de agregar
+    import requests
+    corpo = requests.get(f'{url}/transacoes/usuario/1', timeout=60).content
+    resumo = ResumoTransacoes()
+    for transacao in json.loads(corpo, parse_float=Decimal):
+        resumo.adicionar(transacao)
+    return resumo.como_dict()
+
+
+def medir(funcao, requisicoes):
+    funcao()  # aquecimento
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        resultado = funcao()
+    duracao = (time.perf_counter() - inicio) / requisicoes
+    # Memória medida numa execução à parte: o tracemalloc deixa as alocações mais lentas
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--transactions', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=3)
+    args = parser.parse_args()
+
+    with StubProcess(transacoes_sinteticas=args.transactions) as stub:
+        app = create_app('testing')
+        app.config.update(VIACEP_API_URL=stub.url, FRANKFURTER_API_URL=stub.url)
+        upstream.init_app(app)
+        client = app.test_client()
+
+        cenarios = [
+            ('carrega tudo e agrega', lambda: resumo_carregando_tudo(stub.url)),
+            ('resumo em streaming', lambda: client.get('/users/1/transactions?resumo=true').json),
+        ]
+        resultados = []
+        for nome, funcao in cenarios:
+            duracao, pico, resultado = medir(funcao, args.requests)
+            resultados.append(resultado)
+            print(f'{nome:<24} {duracao * 1000:>9.1f} ms/req  pico de memória {pico / 2 ** 20:>8.1f} MiB')
+
+    iguais = resultados[0]['por_tipo'] == resultados[1]['por_tipo']
+    print(f'totais por tipo iguais: {"sim" if iguais else "NÃO"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark das réplicas das APIs secundárias: distribuição das requisições
+entre uma réplica lenta e uma rápida (menos requisições em andamento), erros
+quando uma réplica cai no meio da carga e erros durante a troca das réplicas
+por uma recarga da configuração (sinal CONFIG_RELOAD_SIGNAL). Termina com
+código 1 se alguma requisição falhar na queda ou na recarga.
+
+Uso:
+    python -m benchmarks.bench_upstream_failover --requests 3000 --threads 16 --slow-latency 0.02
+"""
+import argparse
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from app import create_app
+from app.extensions import health, upstream
+from benchmarks.stub_upstream import StubProcess
+
+
+def carga(app, total, threads, durante=None):
+    """
+    Envia `total` GETs à API ViaCEP pelo cliente upstream; `durante()` é
+    chamado quando metade das requisições foi enviada
+    """
+    por_thread = total // threads
+    barreira = threading.Barrier(threads + 1)
+    enviadas = [0]
+    lock = threading.Lock()
+    erros = []
+
+    def worker(indice):
+        barreira.wait()
+        with app.app_context():
+            for i in range(por_thread):
+                try:
+                    response = upstream.get('viacep', f'/usuarios/{(indice + i) % 100 + 1}')
+                    if response.status_code != 200:
+                        erros.append(response.status_code)
+                except Exception as e:
+                    erros.append(type(e).__name__)
+                with lock:
+                    enviadas[0] += 1
+                    metade = enviadas[0] == total // 2
+                if metade and durante is not None:
+                    durante()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in workers:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return por_thread * threads / duracao, erros
+
+
+def criar_app(urls, arquivo):
+    app = create_app('testing')
+    app.config.update(
+        VIACEP_API_URL=','.join(urls),
+        FRANKFURTER_API_URL=urls[0],
+        HEALTH_PROBE_INTERVAL=0.5,
+        CONFIG_RELOAD_FILE=arquivo
+    )
+    # Recria as réplicas com a configuração do benchmark
+    upstream.init_app(app)
+    # Como o post_worker_init do gunicorn
+    health.instalar(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--slow-latency', type=float, default=0.02)
+    parser.add_argument('--fast-latency', type=float, default=0.002)
+    args = parser.parse_args()
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivo = os.path.join(diretorio, '.env')
+        with StubProcess(latency=args.slow_latency) as lenta, StubProcess(latency=args.fast_latency) as rapida:
+            app = criar_app([lenta.url, rapida.url], arquivo)
+            app.test_client().get('/health/ready')  # inicia as sondas e aquece os pools
+
+            antes = (lenta.chamadas(), rapida.chamadas())
+            rps, erros = carga(app, args.requests, args.threads)
+            na_lenta, na_rapida = lenta.chamadas() - antes[0], rapida.chamadas() - antes[1]
+            print(
+                f'{"balanceamento":<14} {rps:>9.1f} req/s  erros={len(erros)}  '
+                f'lenta={na_lenta} ({na_lenta / max(na_lenta + na_rapida, 1):.0%})  rapida={na_rapida}'
+            )
+
+            with StubProcess(latency=args.fast_latency) as nova:
+                # Queda da réplica lenta no meio da carga
+                rps, erros = carga(app, args.requests, args.threads, durante=lenta.stop)
+                falhas += len(erros)
+                print(f'{"queda":<14} {rps:>9.1f} req/s  erros={len(erros)}')
+
+                # Troca das réplicas pela recarga da configuração no meio da carga
+                with open(arquivo, 'w') as f:
+                    f.write(f'VIACEP_API_URL={nova.url}\n')
+                antes = nova.chamadas()
+                rps, erros = carga(
+                    app, args.requests, args.threads, durante=lambda: os.kill(os.getpid(), signal.SIGUSR2)
+                )
+                falhas += len(erros)
+                print(f'{"recarga":<14} {rps:>9.1f} req/s  erros={len(erros)}  nova={nova.chamadas() - antes}')
+
+    if falhas:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark do cliente upstream: requisições por segundo no proxy com conexões
+novas a cada chamada (comportamento anterior, requests.get) e com o pool keep-alive.
+
+Uso:
+    python -m benchmarks.bench_upstream_pool --requests 2000 --threads 16
+"""
+import argparse
+import threading
+import time
+
+from app import create_app
+from app.extensions import upstream
+from benchmarks.stub_upstream import StubProcess
+
+
+def medir(app, total, threads):
+    por_thread = total // threads
+    barreira = threading.Barrier(threads + 1)
+    erros = []
+
+    def worker(indice):
+        client = app.test_client()
+        barreira.wait()
+        for i in range(por_thread):
+            response = client.get(f'/users/{(indice + i) % 100 + 1}')
+            if response.status_code != 200:
+                erros.append(response.status_code)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in workers:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return por_thread * threads / duracao, len(erros)
+
+
+def criar_app(stub, keepalive):
+    app = create_app('testing')
+    app.config.update(
+        VIACEP_API_URL=stub.url,
+        FRANKFURTER_API_URL=stub.url,
+        UPSTREAM_KEEPALIVE=keepalive
+    )
+    # Recria os pools com a configuração do benchmark
+    upstream.init_app(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    with StubProcess() as stub:
+        for nome, keepalive in [('sem pool (conexão por requisição)', False), ('com pool keep-alive', True)]:
+            app = criar_app(stub, keepalive)
+            medir(app, args.threads * 10, args.threads)  # aquecimento
+            rps, erros = medir(app, args.requests, args.threads)
+            print(f'{nome:<36} {rps:>10.1f} req/s  erros={erros}')
+
+
+if __name__ == '__main__':
+    main()
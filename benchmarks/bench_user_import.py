@@ -0,0 +1,84 @@
+"""
+Benchmark da importação em massa de usuários: tempo para criar N usuários com
+uma chamada POST /users/ por usuário (sequencial, como um script de carga
+faria hoje) e com POST /users/import, com latência simulada nas APIs
+secundárias. Mostra também as chamadas recebidas pelo stub e as consultas de
+CEP feitas pela importação.
+
+Uso:
+    python -m benchmarks.bench_user_import --users 5000 --ceps 200 --latency 0.01
+"""
+import argparse
+import tempfile
+import time
+
+from app import create_app
+from app.extensions import upstream, cep_store, user_import
+from benchmarks.stub_upstream import StubProcess
+
+
+def gerar_csv(usuarios, ceps):
+    linhas = ['nome_completo,email,senha,cpf,cep,complemento']
+    for i in range(usuarios):
+        linhas.append(f'Usuário {i},usuario{i}@example.com,senha,{i:011d},{10000000 + i % ceps},')
+    return ('\n'.join(linhas) + '\n').encode('utf-8')
+
+
+def um_por_um(client, usuarios, ceps):
+    for i in range(usuarios):
+        client.post('/users/', query_string={
+            'nome_completo': f'Usuário {i}', 'email': f'usuario{i}@example.com', 'senha': 'senha',
+            'cpf': f'{i:011d}', 'cep': str(10000000 + i % ceps)
+        })
+
+
+def importacao(client, usuarios, ceps):
+    resposta = client.post('/users/import', data=gerar_csv(usuarios, ceps), content_type='text/csv')
+    url = resposta.headers['Location']
+    while True:
+        status = client.get(url).json
+        if status['status'] != 'processando':
+            return status
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--ceps', type=int, default=200, help='CEPs distintos no arquivo')
+    parser.add_argument('--latency', type=float, default=0.01, help='Latência das APIs secundárias (s)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    with StubProcess(latency=args.latency) as stub, tempfile.TemporaryDirectory() as diretorio:
+        app = create_app('testing')
+        app.config.update(
+            VIACEP_API_URL=stub.url,
+            FRANKFURTER_API_URL=stub.url,
+            CEP_STORE_PATH='',
+            IMPORT_DIR=diretorio,
+            IMPORT_MAX_CONCURRENCY=args.concurrency
+        )
+        upstream.init_app(app)
+        cep_store.init_app(app)
+        user_import.init_app(app)
+        client = app.test_client()
+
+        chamadas = stub.chamadas()
+        inicio = time.perf_counter()
+        um_por_um(client, args.users, args.ceps)
+        duracao = time.perf_counter() - inicio
+        print(f'POST /users/ um por um  {duracao:>8.1f} s  {args.users / duracao:>8.0f} usuários/s  '
+              f'chamadas ao stub {stub.chamadas() - chamadas}')
+
+        chamadas = stub.chamadas()
+        inicio = time.perf_counter()
+        status = importacao(client, args.users, args.ceps)
+        duracao = time.perf_counter() - inicio
+        print(f'POST /users/import      {duracao:>8.1f} s  {args.users / duracao:>8.0f} usuários/s  '
+              f'chamadas ao stub {stub.chamadas() - chamadas}  '
+              f'(criados {status["criados"]}, falhas {status["falhas"]}, CEPs consultados {status["ceps_consultados"]})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark de GET /users/ com uma listagem grande: CPU da API Principal por
+requisição e bytes enviados ao cliente, decodificando e recodificando o JSON
+(comportamento anterior), repassando os bytes da API secundária e repassando
+com compressão gzip e brotli (se o pacote brotli estiver instalado).
+
+Uso:
+    python -m benchmarks.bench_users_passthrough --users 10000 --requests 20
+"""
+import argparse
+import time
+
+from app import create_app
+from app.compression import brotli
+from app.extensions import upstream
+from benchmarks.stub_upstream import StubProcess
+
+
+def medir(app, requisicoes, accept_encoding):
+    client = app.test_client()
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    client.get('/users/', headers=headers).get_data()  # aquecimento
+    enviados = 0
+    cpu_inicio = time.process_time()
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        response = client.get('/users/', headers=headers)
+        enviados += len(response.data)
+    cpu = (time.process_time() - cpu_inicio) / requisicoes
+    duracao = (time.perf_counter() - inicio) / requisicoes
+    return cpu, duracao, enviados // requisicoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    cenarios = [
+        ('decodifica e recodifica', False, None),
+        ('repasse', True, None),
+        ('repasse + gzip', True, 'gzip'),
+    ]
+    if brotli is not None:
+        cenarios.append(('repasse + brotli', True, 'br'))
+
+    with StubProcess(usuarios_sinteticos=args.users) as stub:
+        for nome, passthrough, accept_encoding in cenarios:
+            app = create_app('testing')
+            app.config.update(
+                VIACEP_API_URL=stub.url,
+                FRANKFURTER_API_URL=stub.url,
+                PASSTHROUGH_ENABLED=passthrough
+            )
+            upstream.init_app(app)
+            cpu, duracao, enviados = medir(app, args.requests, accept_encoding)
+            print(
+                f'{nome:<26} CPU {cpu * 1000:>8.1f} ms/req  '
+                f'latência {duracao * 1000:>8.1f} ms  bytes enviados {enviados:>10}'
+            )
+    if brotli is None:
+        print('(brotli não instalado: cenário brotli omitido)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark de memória de GET /users/ com muitos usuários: lista bufferizada
+(comportamento anterior) contra os modos ?stream=json e ?stream=ndjson.
+
+Cada modo roda em um processo separado e mede o pico de memória residente
+(ru_maxrss) acima do consumo da aplicação já inicializada.
+
+Uso:
+    python -m benchmarks.bench_users_streaming --users 1000000
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+from app import create_app
+from app.extensions import upstream
+from benchmarks.stub_upstream import StubProcess
+
+MODOS = {
+    'bufferizado': '/users/',
+    'stream=json': '/users/?stream=json',
+    'stream=ndjson': '/users/?stream=ndjson',
+}
+
+
+def _medir(stub_url, path, fila):
+    app = create_app('testing')
+    app.config.update(VIACEP_API_URL=stub_url, FRANKFURTER_API_URL=stub_url)
+    upstream.init_app(app)
+    client = app.test_client()
+    client.get('/swagger.json')
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    inicio = time.perf_counter()
+    response = client.get(path, buffered=False)
+    recebidos = 0
+    for parte in response.iter_encoded():
+        recebidos += len(parte)
+    response.close()
+    duracao = time.perf_counter() - inicio
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    fila.put({'status': response.status_code, 'bytes': recebidos, 'segundos': round(duracao, 2),
+              'pico_mb': round((pico - base) / 1024, 1)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('fork')
+    with StubProcess(usuarios_sinteticos=args.users) as stub:
+        for nome, path in MODOS.items():
+            fila = ctx.Queue()
+            processo = ctx.Process(target=_medir, args=(stub.url, path, fila))
+            processo.start()
+            resultado = fila.get()
+            processo.join()
+            print(f'{nome:<14} {resultado}')
+
+
+if __name__ == '__main__':
+    main()
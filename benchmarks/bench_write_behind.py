@@ -0,0 +1,145 @@
+"""
+Benchmark do aceite assíncrono de compras (write-behind).
+
+1. Vazão do journal: --clients clientes simultâneos enviam --trades compras
+   com `Prefer: respond-async`; mostra aceites por segundo, latência do aceite
+   (p50/p99) e registros por fdatasync (efeito do group commit), para cada
+   valor de --fsync-intervals. O despachante envia as compras ao stub em paralelo.
+2. Recuperação: um processo filho aceita --crash-trades compras com a API
+   secundária fora do ar e é encerrado com SIGKILL; outro processo adota o
+   journal e envia as compras. Mostra o tempo de adoção, o tempo até o envio
+   de todas e se alguma foi perdida ou enviada duas vezes.
+
+Uso:
+    python -m benchmarks.bench_write_behind --trades 5000 --clients 16 --crash-trades 2000
+"""
+import argparse
+import os
+import signal
+import statistics
+import tempfile
+import threading
+import time
+
+from app import create_app
+from app.extensions import upstream, write_behind
+from benchmarks.stub_upstream import StubProcess
+
+USUARIOS = 50
+
+
+def criar_app(url, diretorio, **config):
+    app = create_app('testing')
+    app.config.update(
+        VIACEP_API_URL=url,
+        FRANKFURTER_API_URL=url,
+        WRITE_BEHIND_ENABLED=True,
+        WRITE_BEHIND_DIR=diretorio,
+        WRITE_BEHIND_RETRY_BASE=0.05,
+        WRITE_BEHIND_RETRY_MAX=0.5,
+        **config
+    )
+    upstream.init_app(app)
+    write_behind.init_app(app)
+    return app
+
+
+def aceitar(app, total, clientes):
+    """
+    Envia `total` compras assíncronas com `clientes` threads; retorna as latências (s)
+    """
+    latencias = []
+    lock = threading.Lock()
+    proxima = iter(range(total))
+
+    def cliente():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(proxima, None)
+            if i is None:
+                return
+            inicio = time.perf_counter()
+            resposta = client.post(f'/transactions/compra?user_id={i % USUARIOS + 1}&valor_brl=10',
+                                   headers={'Prefer': 'respond-async'})
+            duracao = time.perf_counter() - inicio
+            assert resposta.status_code == 202, resposta.get_data(as_text=True)
+            with lock:
+                latencias.append(duracao)
+
+    threads = [threading.Thread(target=cliente) for _ in range(clientes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencias
+
+
+def esperar_envio(app, limite=120):
+    with app.app_context():
+        fim = time.monotonic() + limite
+        while write_behind.stats()['pendentes'] and time.monotonic() < fim:
+            time.sleep(0.01)
+        return write_behind.stats()
+
+
+def vazao(stub, args):
+    for intervalo in (float(valor) for valor in args.fsync_intervals.split(',')):
+        with tempfile.TemporaryDirectory() as diretorio:
+            app = criar_app(stub.url, diretorio, WRITE_BEHIND_FSYNC_INTERVAL=intervalo)
+            inicio = time.perf_counter()
+            latencias = aceitar(app, args.trades, args.clients)
+            duracao = time.perf_counter() - inicio
+            stats = esperar_envio(app)
+            drenagem = time.perf_counter() - inicio
+            quantis = statistics.quantiles(latencias, n=100)
+            print(f'fsync a cada {intervalo * 1000:>4.1f} ms  {args.trades / duracao:>7.0f} aceites/s  '
+                  f'p50 {quantis[49] * 1000:>6.2f} ms  p99 {quantis[98] * 1000:>6.2f} ms  '
+                  f'registros/fdatasync {2 * args.trades / max(stats["fsyncs"], 1):>5.1f}  '
+                  f'todas enviadas em {drenagem:>5.2f} s')
+
+
+def recuperacao(stub, args):
+    with tempfile.TemporaryDirectory() as diretorio:
+        pid = os.fork()
+        if pid == 0:
+            # Filho: API secundária fora do ar (porta sem servidor); aceita e morre sem enviar
+            try:
+                app = criar_app('http://127.0.0.1:9', diretorio, WRITE_BEHIND_MAX_CONCURRENCY=1)
+                aceitar(app, args.crash_trades, args.clients)
+            finally:
+                os.kill(os.getpid(), signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+        chamadas = stub.chamadas()
+        app = criar_app(stub.url, diretorio)
+        with app.test_request_context():
+            inicio = time.perf_counter()
+            write_behind._iniciar(app.extensions['write_behind'])
+            # A thread de recuperação pode assumir as partições antes desta chamada
+            write_behind.recuperar()
+            adocao = time.perf_counter() - inicio
+        stats = esperar_envio(app)
+        recuperadas = stats['recuperadas']
+        drenagem = time.perf_counter() - inicio
+        enviadas = stub.chamadas() - chamadas
+        print(f'recuperação: {recuperadas}/{args.crash_trades} compras adotadas em {adocao * 1000:.1f} ms, '
+              f'enviadas em {drenagem:.2f} s ({enviadas} chamadas ao stub, {stats["concluidas"]} concluídas)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--trades', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--fsync-intervals', default='0,0.001,0.005', help='WRITE_BEHIND_FSYNC_INTERVAL (lista, s)')
+    parser.add_argument('--crash-trades', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.005, help='Latência do upstream (s)')
+    args = parser.parse_args()
+
+    with StubProcess(latency=args.latency, usuarios=USUARIOS) as stub:
+        vazao(stub, args)
+        recuperacao(stub, args)
+
+
+if __name__ == '__main__':
+    main()
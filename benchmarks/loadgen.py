@@ -0,0 +1,142 @@
+"""
+Gerador de carga HTTP/1.1 baseado em asyncio, capaz de manter milhares de
+clientes concorrentes em um único processo.
+"""
+import asyncio
+import time
+from urllib.parse import urlparse
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(int(round(p / 100 * (len(ordenados) - 1))), len(ordenados) - 1)
+    return ordenados[indice]
+
+
+class _Conexao:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def abrir(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def fechar(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def requisitar(self, method, path, body=b'', headers=None):
+        if self.writer is None:
+            await self.abrir()
+        linhas = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        for nome, valor in (headers or {}).items():
+            linhas.append(f'{nome}: {valor}')
+        self.writer.write(('\r\n'.join(linhas) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_linha = await self.reader.readline()
+        if not status_linha:
+            raise ConnectionError('Conexão encerrada pelo servidor')
+        status = int(status_linha.split()[1])
+        tamanho = None
+        chunked = False
+        fechar = False
+        while True:
+            linha = await self.reader.readline()
+            if linha in (b'\r\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            nome = nome.strip().lower()
+            valor = valor.strip().lower()
+            if nome == 'content-length':
+                tamanho = int(valor)
+            elif nome == 'transfer-encoding' and 'chunked' in valor:
+                chunked = True
+            elif nome == 'connection' and valor == 'close':
+                fechar = True
+
+        recebidos = 0
+        if status in (204, 304) or method == 'HEAD':
+            # Respostas sem corpo, mesmo sem Content-Length
+            pass
+        elif chunked:
+            while True:
+                tamanho_chunk = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(tamanho_chunk + 2)
+                recebidos += tamanho_chunk
+                if tamanho_chunk == 0:
+                    break
+        elif tamanho is not None:
+            recebidos = len(await self.reader.readexactly(tamanho))
+        else:
+            recebidos = len(await self.reader.read())
+            fechar = True
+
+        if fechar:
+            self.fechar()
+        return status, recebidos
+
+
+async def _cliente(url, requisicoes, deadline, timeout, resultado, indice):
+    parsed = urlparse(url)
+    conexao = _Conexao(parsed.hostname, parsed.port or 80)
+    i = indice
+    while time.perf_counter() < deadline:
+        method, path, body, headers = requisicoes(i)
+        i += 1
+        inicio = time.perf_counter()
+        try:
+            status, recebidos = await asyncio.wait_for(conexao.requisitar(method, path, body, headers), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            conexao.fechar()
+            resultado['erros'] += 1
+            continue
+        resultado['latencias'].append(time.perf_counter() - inicio)
+        resultado['bytes'] += recebidos
+        resultado['status'][status] = resultado['status'].get(status, 0) + 1
+    conexao.fechar()
+
+
+async def _executar(url, requisicoes, clientes, duracao, timeout):
+    resultado = {'latencias': [], 'erros': 0, 'bytes': 0, 'status': {}}
+    inicio = time.perf_counter()
+    deadline = inicio + duracao
+    await asyncio.gather(*[
+        _cliente(url, requisicoes, deadline, timeout, resultado, i) for i in range(clientes)
+    ])
+    resultado['duracao'] = time.perf_counter() - inicio
+    return resultado
+
+
+def executar(url, requisicoes, clientes=100, duracao=10.0, timeout=30.0):
+    """
+    Mantém `clientes` conexões enviando requisições por `duracao` segundos.
+
+    `requisicoes(i)` retorna a i-ésima requisição como (method, path, body, headers).
+    Retorna um resumo com vazão, percentis de latência (ms), erros e status.
+    """
+    resultado = asyncio.run(_executar(url, requisicoes, clientes, duracao, timeout))
+    latencias = resultado['latencias']
+    return {
+        'clientes': clientes,
+        'requisicoes': len(latencias),
+        'erros': resultado['erros'],
+        'status': resultado['status'],
+        'vazao_rps': round(len(latencias) / resultado['duracao'], 1),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2) if latencias else None,
+        'bytes': resultado['bytes'],
+    }
+
+
+def get(path):
+    """
+    Atalho para gerar sempre a mesma requisição GET
+    """
+    return lambda i: ('GET', path, b'', None)
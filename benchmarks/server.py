@@ -0,0 +1,98 @@
+"""
+Inicialização da API Principal sob o gunicorn em um subprocesso, para os benchmarks
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class GunicornServer:
+    """
+    Executa `gunicorn -c gunicorn.conf.py run:app` com as variáveis de ambiente informadas
+    """
+
+    def __init__(self, upstream_url, worker_class='sync', workers=1, env=None):
+        self.port = porta_livre()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.env = dict(os.environ)
+        self.env.update({
+            'FLASK_ENV': 'production',
+            'VIACEP_API_URL': upstream_url,
+            'FRANKFURTER_API_URL': upstream_url,
+            'GUNICORN_BIND': f'127.0.0.1:{self.port}',
+            'GUNICORN_WORKER_CLASS': worker_class,
+            'GUNICORN_WORKERS': str(workers),
+        })
+        self.env.update(env or {})
+        self.process = None
+
+    def start(self, timeout=30):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+            cwd=RAIZ, env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            try:
+                with urlopen(f'{self.url}/swagger.json', timeout=1):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError('gunicorn não respondeu a tempo')
+
+    def processos(self):
+        """
+        PIDs do master do gunicorn e dos seus workers
+        """
+        pids = [self.process.pid]
+        for nome in os.listdir('/proc'):
+            if not nome.isdigit():
+                continue
+            try:
+                with open(f'/proc/{nome}/stat') as arquivo:
+                    # O campo 4 é o PID do processo pai; o nome (campo 2) pode conter espaços
+                    ppid = int(arquivo.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == self.process.pid:
+                pids.append(int(nome))
+        return pids
+
+    def memoria(self):
+        """
+        Memória residente atual (VmRSS) e de pico (VmHWM) do master e dos workers, em KiB
+        """
+        total = {'rss_kib': 0, 'pico_kib': 0}
+        for pid in self.processos():
+            try:
+                with open(f'/proc/{pid}/status') as arquivo:
+                    for linha in arquivo:
+                        if linha.startswith('VmRSS:'):
+                            total['rss_kib'] += int(linha.split()[1])
+                        elif linha.startswith('VmHWM:'):
+                            total['pico_kib'] += int(linha.split()[1])
+            except OSError:
+                continue
+        return total
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
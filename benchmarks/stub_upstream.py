@@ -0,0 +1,434 @@
+"""
+Implementação local e simplificada das APIs secundárias (ViaCEP e Frankfurter)
+usada pelos benchmarks. Não implementa regras de negócio reais.
+"""
+import json
+import multiprocessing
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+
+class StubState:
+    """
+    Dados em memória compartilhados pelas requisições do stub
+    """
+
+    def __init__(self, usuarios=100, cotacao=5.0, usuarios_sinteticos=0, transacoes_sinteticas=0):
+        self.lock = threading.Lock()
+        # Quando > 0, GET /usuarios gera essa quantidade de usuários sob demanda, sem mantê-los em memória
+        self.usuarios_sinteticos = usuarios_sinteticos
+        # Quando > 0, GET /transacoes/usuario/<id> gera essa quantidade de transações por usuário
+        self.transacoes_sinteticas = transacoes_sinteticas
+        self.cotacao = cotacao
+        self.usuarios = {}
+        self.transacoes = {}
+        self.saldos = {}
+        for i in range(1, usuarios + 1):
+            self.usuarios[i] = self.novo_usuario(i)
+            self.saldos[i] = 0.0
+        self.proximo_usuario = usuarios + 1
+        self.proxima_transacao = 1
+        self.chamadas = 0
+
+    @staticmethod
+    def novo_usuario(user_id, **dados):
+        usuario = {
+            'id': user_id,
+            'nome_completo': f'Usuário {user_id}',
+            'email': f'usuario{user_id}@example.com',
+            'cpf': f'{user_id:011d}',
+            'cep': '01001000',
+            'complemento': '',
+            'logradouro': 'Praça da Sé',
+            'bairro': 'Sé',
+            'localidade': 'São Paulo',
+            'estado': 'SP'
+        }
+        usuario.update({k: v for k, v in dados.items() if k != 'senha'})
+        return usuario
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _params(self):
+        return {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+
+    def _send(self, status, body, headers=None):
+        if self.server.payload_bytes and isinstance(body, (dict, list)):
+            body = _preencher(body, self.server.payload_bytes)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        if isinstance(body, (dict, list)):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        # Corpo gerado em partes (bytes), enviado com chunked transfer encoding
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for parte in body:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(parte), parte))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # O cliente pode fechar a conexão antes do fim (ex.: página já completa)
+            self.close_connection = True
+
+    def _dispatch(self, method):
+        path = urlparse(self.path).path.rstrip('/')
+        if not path.startswith('/_stub'):
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            with self.state.lock:
+                self.state.chamadas += 1
+            if self.server.error_rate and self.server.random.random() < self.server.error_rate:
+                return self._send(500, {'message': 'Erro simulado pelo stub'})
+        for rota_method, padrao, handler in ROTAS:
+            if rota_method != method:
+                continue
+            match = re.fullmatch(padrao, path)
+            if match:
+                return self._send(*handler(self.state, self._params(), *match.groups()))
+        self._send(404, {'message': 'Rota não encontrada'})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+def _preencher(body, tamanho):
+    """
+    Acrescenta um campo `_preenchimento` com `tamanho` bytes aos objetos da
+    resposta, para simular payloads maiores
+    """
+    preenchimento = 'x' * tamanho
+    if isinstance(body, dict):
+        return dict(body, _preenchimento=preenchimento)
+    return [dict(item, _preenchimento=preenchimento) if isinstance(item, dict) else item for item in body]
+
+
+def _consultar_cep(state, params, cep):
+    if cep.startswith('999'):
+        # Como a API ViaCEP, CEPs inexistentes retornam 200 com {"erro": true}
+        return 200, {'erro': True}
+    return 200, {'cep': cep, 'logradouro': 'Praça da Sé', 'bairro': 'Sé', 'localidade': 'São Paulo', 'uf': 'SP'}
+
+
+def _gerar_usuarios_sinteticos(state, inicio, fim, tamanho_parte=500):
+    yield b'['
+    for bloco in range(inicio, fim, tamanho_parte):
+        ids = range(bloco, min(bloco + tamanho_parte, fim))
+        parte = ','.join(json.dumps(state.novo_usuario(i)) for i in ids)
+        yield (parte if bloco == inicio else ',' + parte).encode('utf-8')
+    yield b']'
+
+
+def _listar_usuarios(state, params):
+    cursor = int(params.get('cursor', 0))
+    limit = int(params['limit']) if 'limit' in params else None
+    if state.usuarios_sinteticos:
+        fim = state.usuarios_sinteticos + 1 if limit is None else min(cursor + 1 + limit, state.usuarios_sinteticos + 1)
+        headers = {'X-Next-Cursor': str(fim - 1)} if fim <= state.usuarios_sinteticos else {}
+        return 200, _gerar_usuarios_sinteticos(state, cursor + 1, fim), headers
+    with state.lock:
+        usuarios = [u for user_id, u in sorted(state.usuarios.items()) if user_id > cursor]
+    headers = {}
+    if limit is not None and len(usuarios) > limit:
+        usuarios = usuarios[:limit]
+        headers['X-Next-Cursor'] = str(usuarios[-1]['id'])
+    return 200, usuarios, headers
+
+
+def _criar_usuario(state, params):
+    with state.lock:
+        user_id = state.proximo_usuario
+        state.proximo_usuario += 1
+        usuario = state.novo_usuario(user_id, **params)
+        state.usuarios[user_id] = usuario
+        state.saldos[user_id] = 0.0
+    return 201, usuario
+
+
+def _obter_usuario(state, params, user_id):
+    usuario = state.usuarios.get(int(user_id))
+    if usuario is None:
+        return 404, {'message': 'Usuário não encontrado'}
+    return 200, usuario
+
+
+def _atualizar_usuario(state, params, user_id):
+    with state.lock:
+        usuario = state.usuarios.get(int(user_id))
+        if usuario is None:
+            return 404, {'message': 'Usuário não encontrado'}
+        usuario.update({k: v for k, v in params.items() if k != 'senha'})
+        return 200, usuario
+
+
+def _excluir_usuario(state, params, user_id):
+    with state.lock:
+        if state.usuarios.pop(int(user_id), None) is None:
+            return 404, {'message': 'Usuário não encontrado'}
+    return 200, {'message': 'Usuário excluído'}
+
+
+def _cotacao(state, params):
+    return 200, {'moeda_origem': 'USD', 'moeda_destino': 'BRL', 'cotacao': state.cotacao,
+                 'data': datetime.now().strftime('%Y-%m-%d')}
+
+
+def _registrar(state, user_id, tipo, quantidade_usd, valor_brl):
+    with state.lock:
+        transacao = {
+            'id': state.proxima_transacao,
+            'user_id': user_id,
+            'tipo': tipo,
+            'quantidade_usd': round(quantidade_usd, 2),
+            'valor_brl': round(valor_brl, 2),
+            'cotacao': state.cotacao,
+            'data_transacao': datetime.now().isoformat()
+        }
+        state.transacoes[transacao['id']] = transacao
+        state.proxima_transacao += 1
+        delta = quantidade_usd if tipo == 'compra' else -quantidade_usd
+        state.saldos[user_id] = state.saldos.get(user_id, 0.0) + delta
+    return 201, transacao
+
+
+def _compra(state, params):
+    user_id = int(params.get('user_id', 0))
+    if user_id not in state.usuarios:
+        return 404, {'message': 'Usuário não encontrado'}
+    valor_brl = float(params.get('valor_brl', 0))
+    return _registrar(state, user_id, 'compra', valor_brl / state.cotacao, valor_brl)
+
+
+def _venda(state, params):
+    user_id = int(params.get('user_id', 0))
+    if user_id not in state.usuarios:
+        return 404, {'message': 'Usuário não encontrado'}
+    quantidade_usd = float(params.get('quantidade_usd', 0))
+    if state.saldos.get(user_id, 0.0) < quantidade_usd:
+        return 400, {'message': 'Saldo insuficiente'}
+    return _registrar(state, user_id, 'venda', quantidade_usd, quantidade_usd * state.cotacao)
+
+
+def _obter_transacao(state, params, transaction_id):
+    transacao = state.transacoes.get(int(transaction_id))
+    if transacao is None:
+        return 404, {'message': 'Transação não encontrada'}
+    return 200, transacao
+
+
+def _transacao_sintetica(user_id, i):
+    # Uma transação a cada 15 minutos, alternando compras e vendas, a partir de 2024-01-01
+    data = datetime(2024, 1, 1) + timedelta(minutes=15 * (i - 1))
+    quantidade_usd = round(10 + i % 90 + (i % 7) / 10, 2)
+    cotacao = round(4.8 + (i % 50) / 100, 4)
+    return {
+        'id': i,
+        'user_id': user_id,
+        'tipo': 'compra' if i % 3 else 'venda',
+        'quantidade_usd': quantidade_usd,
+        'valor_brl': round(quantidade_usd * cotacao, 2),
+        'cotacao': cotacao,
+        'data_transacao': data.isoformat()
+    }
+
+
+def _gerar_transacoes_sinteticas(user_id, inicio, fim, tamanho_parte=500):
+    yield b'['
+    for bloco in range(inicio, fim, tamanho_parte):
+        ids = range(bloco, min(bloco + tamanho_parte, fim))
+        parte = ','.join(json.dumps(_transacao_sintetica(user_id, i)) for i in ids)
+        yield (parte if bloco == inicio else ',' + parte).encode('utf-8')
+    yield b']'
+
+
+def _listar_transacoes_usuario(state, params, user_id):
+    user_id = int(user_id)
+    if user_id not in state.usuarios:
+        return 404, {'message': 'Usuário não encontrado'}
+    cursor = int(params.get('cursor', 0))
+    limit = int(params['limit']) if 'limit' in params else None
+    if state.transacoes_sinteticas:
+        total = state.transacoes_sinteticas
+        fim = total + 1 if limit is None else min(cursor + 1 + limit, total + 1)
+        headers = {'X-Next-Cursor': str(fim - 1)} if fim <= total else {}
+        return 200, _gerar_transacoes_sinteticas(user_id, cursor + 1, fim), headers
+    with state.lock:
+        transacoes = [t for t_id, t in sorted(state.transacoes.items()) if t['user_id'] == user_id and t_id > cursor]
+    headers = {}
+    if limit is not None and len(transacoes) > limit:
+        transacoes = transacoes[:limit]
+        headers['X-Next-Cursor'] = str(transacoes[-1]['id'])
+    return 200, transacoes, headers
+
+
+def _saldo(state, params, user_id):
+    if int(user_id) not in state.usuarios:
+        return 404, {'message': 'Usuário não encontrado'}
+    return 200, {'user_id': int(user_id), 'saldo_usd': round(state.saldos.get(int(user_id), 0.0), 2)}
+
+
+def _estatisticas(state, params):
+    return 200, {'chamadas': state.chamadas}
+
+
+ROTAS = [
+    ('GET', r'/_stub/stats', _estatisticas),
+    ('GET', r'/cep/(\d+)', _consultar_cep),
+    ('GET', r'/usuarios', _listar_usuarios),
+    ('POST', r'/usuarios', _criar_usuario),
+    ('GET', r'/usuarios/(\d+)', _obter_usuario),
+    ('PUT', r'/usuarios/(\d+)', _atualizar_usuario),
+    ('DELETE', r'/usuarios/(\d+)', _excluir_usuario),
+    ('GET', r'/cotacao', _cotacao),
+    ('POST', r'/transacoes/compra', _compra),
+    ('POST', r'/transacoes/venda', _venda),
+    ('GET', r'/transacoes/(\d+)', _obter_transacao),
+    ('GET', r'/transacoes/usuario/(\d+)/saldo', _saldo),
+    ('GET', r'/transacoes/usuario/(\d+)', _listar_transacoes_usuario),
+]
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clientes de carga fecham conexões ociosas a qualquer momento
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubUpstream:
+    """
+    Servidor HTTP local que responde às rotas das duas APIs secundárias
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, payload_bytes=0, seed=None,
+                 state=None, **state_kwargs):
+        """
+        `latency`: espera (s) antes de cada resposta; `error_rate`: fração das
+        requisições respondidas com 500; `payload_bytes`: bytes acrescentados a
+        cada objeto das respostas JSON
+        """
+        self.server = _StubServer((host, port), StubHandler)
+        self.server.latency = latency
+        self.server.error_rate = error_rate
+        self.server.payload_bytes = payload_bytes
+        self.server.random = random.Random(seed)
+        self.server.state = state or StubState(**state_kwargs)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _servir(fila, kwargs):
+    stub = StubUpstream(**kwargs)
+    fila.put(stub.url)
+    stub.server.serve_forever()
+
+
+class StubProcess:
+    """
+    Executa o stub em um processo separado, para não disputar o GIL com o proxy
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.process = None
+        self.url = None
+
+    def start(self):
+        ctx = multiprocessing.get_context('fork')
+        fila = ctx.Queue()
+        self.process = ctx.Process(target=_servir, args=(fila, self.kwargs), daemon=True)
+        self.process.start()
+        self.url = fila.get(timeout=10)
+        return self
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+    def chamadas(self):
+        """
+        Número de requisições recebidas pelo stub até agora
+        """
+        with urlopen(f'{self.url}/_stub/stats') as response:
+            return json.loads(response.read())['chamadas']
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Stub local das APIs secundárias')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency', type=float, default=0.0, help='Latência por requisição (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração das requisições respondidas com 500')
+    parser.add_argument('--payload-bytes', type=int, default=0, help='Bytes acrescentados a cada objeto JSON')
+    args = parser.parse_args()
+
+    stub = StubUpstream(
+        port=args.port, latency=args.latency, error_rate=args.error_rate, payload_bytes=args.payload_bytes
+    )
+    print(f'Stub das APIs secundárias em {stub.url}')
+    stub.server.serve_forever()
@@ -0,0 +1,348 @@
+"""
+Suíte de benchmarks de regressão: inicia a API Principal (`create_app('testing')`
+sob o gunicorn) com stubs locais da API ViaCEP e da API Frankfurter, exercita
+todas as rotas de app/routes.py em níveis fixos de concorrência e registra
+vazão, latência p50/p95/p99 e memória em um arquivo JSON.
+
+Com --baseline, compara a execução com uma execução anterior e termina com
+código 1 se alguma rota piorar além de --threshold (vazão menor, p95/p99 ou
+pico de memória maiores).
+
+Uso:
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 0.2
+    python -m benchmarks.suite --routes users --concurrency 1,8 --viacep-latency 0.02 --viacep-error-rate 0.01
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from app import create_app
+from benchmarks.loadgen import executar
+from benchmarks.server import GunicornServer
+from benchmarks.stub_upstream import StubProcess
+
+# Endpoints registrados fora de app/routes.py (documentação e arquivos estáticos)
+ENDPOINTS_IGNORADOS = ('static', 'specs', 'doc', 'root', 'restx_doc.static')
+
+# Usuários do stub: os primeiros são lidos e alterados, os últimos são excluídos
+USUARIOS_STUB = 50000
+USUARIOS_LEITURA = 100
+USUARIOS_COM_SALDO = 20
+TRANSACOES_SINTETICAS = 200
+
+
+class Cenario:
+    """
+    Uma rota exercitada pela suíte: `requisicao(i)` gera a i-ésima requisição
+    como (method, path, body, headers), no formato de benchmarks.loadgen
+    """
+
+    def __init__(self, metodo, regra, requisicao, nome=None):
+        self.metodo = metodo
+        self.regra = regra
+        self.requisicao = requisicao
+        self.nome = nome or f'{metodo} {regra}'
+
+
+def _get(caminho):
+    return lambda i: ('GET', caminho, b'', None)
+
+
+def _usuario(i):
+    return {
+        'nome_completo': f'Usuário {i}', 'email': f'carga{i}@example.com', 'senha': 'senha',
+        'cpf': f'{i:011d}', 'cep': '01001000'
+    }
+
+
+def _csv_importacao(linhas=5):
+    registros = ['nome_completo,email,senha,cpf,cep,complemento']
+    for i in range(linhas):
+        registros.append(f'Usuário {i},importacao{i}@example.com,senha,{i:011d},01001000,')
+    return ('\n'.join(registros) + '\n').encode('utf-8')
+
+
+def _lote(itens=10):
+    linhas = []
+    for i in range(itens):
+        user_id = i % USUARIOS_COM_SALDO + 1
+        if i % 2:
+            linhas.append({'tipo': 'venda', 'user_id': user_id, 'quantidade_usd': 0.01})
+        else:
+            linhas.append({'tipo': 'compra', 'user_id': user_id, 'valor_brl': 10})
+    return ''.join(json.dumps(linha) + '\n' for linha in linhas).encode('utf-8')
+
+
+def cenarios(dados):
+    """
+    Cenários de todas as rotas; `dados` vem de `preparar` (ids existentes)
+    """
+    transacoes = dados['transacoes']
+    csv_importacao = _csv_importacao()
+    lote = _lote()
+    simulacao = json.dumps({
+        'valores_brl': [10 + i for i in range(500)], 'quantidades_usd': [1 + i / 100 for i in range(500)]
+    }).encode('utf-8')
+    excluidos = itertools.count()
+    return [
+        Cenario('GET', '/health/live', _get('/health/live')),
+        Cenario('GET', '/health/ready', _get('/health/ready')),
+        Cenario('GET', '/status/upstreams', _get('/status/upstreams')),
+        Cenario('GET', '/status/admissao', _get('/status/admissao')),
+        Cenario('GET', '/metrics', _get('/metrics')),
+        Cenario('GET', '/users/', _get('/users/?limit=50')),
+        Cenario('POST', '/users/', lambda i: ('POST', '/users/?' + urlencode(_usuario(i)), b'', None)),
+        Cenario('POST', '/users/import', lambda i: (
+            'POST', '/users/import', csv_importacao, {'Content-Type': 'text/csv'}
+        )),
+        Cenario('GET', '/users/import/<string:importacao_id>', _get(f'/users/import/{dados["importacao"]}')),
+        Cenario('GET', '/users/import/<string:importacao_id>/resultado',
+                _get(f'/users/import/{dados["importacao"]}/resultado')),
+        Cenario('GET', '/users/<int:id>', lambda i: ('GET', f'/users/{i % USUARIOS_LEITURA + 1}', b'', None)),
+        Cenario('PUT', '/users/<int:id>', lambda i: (
+            'PUT', f'/users/{i % USUARIOS_LEITURA + 1}?complemento=apto%20{i}', b'', None
+        )),
+        # Cada requisição exclui um usuário diferente, a partir do último (o
+        # contador não recomeça entre o aquecimento e os níveis de concorrência)
+        Cenario('DELETE', '/users/<int:id>', lambda i: ('DELETE', f'/users/{USUARIOS_STUB - next(excluidos)}', b'', None)),
+        Cenario('GET', '/users/cep/<string:cep>', lambda i: (
+            'GET', f'/users/cep/{1001000 + i % 1000:08d}', b'', None
+        )),
+        Cenario('GET', '/users/<int:id>/saldo', lambda i: (
+            'GET', f'/users/{i % USUARIOS_COM_SALDO + 1}/saldo', b'', None
+        )),
+        Cenario('GET', '/users/<int:id>/resumo', lambda i: (
+            'GET', f'/users/{i % USUARIOS_COM_SALDO + 1}/resumo?transacoes={transacoes[i % len(transacoes)]}', b'', None
+        )),
+        Cenario('GET', '/users/<int:id>/transactions', lambda i: (
+            'GET', f'/users/{i % USUARIOS_LEITURA + 1}/transactions?limit=50', b'', None
+        )),
+        Cenario('GET', '/users/<int:id>/transactions', lambda i: (
+            'GET', f'/users/{i % USUARIOS_LEITURA + 1}/transactions?resumo=true', b'', None
+        ), nome='GET /users/<int:id>/transactions?resumo=true'),
+        Cenario('POST', '/transactions/compra', lambda i: (
+            'POST', f'/transactions/compra?user_id={i % USUARIOS_COM_SALDO + 1}&valor_brl=10', b'', None
+        )),
+        Cenario('POST', '/transactions/compra', lambda i: (
+            'POST', f'/transactions/compra?user_id={i % USUARIOS_COM_SALDO + 1}&valor_brl=10', b'',
+            {'Prefer': 'respond-async'}
+        ), nome='POST /transactions/compra (respond-async)'),
+        Cenario('GET', '/transactions/pendentes/<string:tracking_id>',
+                _get(f'/transactions/pendentes/{dados["pendente"]}')),
+        Cenario('POST', '/transactions/venda', lambda i: (
+            'POST', f'/transactions/venda?user_id={i % USUARIOS_COM_SALDO + 1}&quantidade_usd=0.01', b'', None
+        )),
+        Cenario('POST', '/transactions/batch', lambda i: (
+            'POST', '/transactions/batch', lote, {'Content-Type': 'application/x-ndjson'}
+        )),
+        Cenario('POST', '/transactions/simular', lambda i: (
+            'POST', '/transactions/simular', simulacao, {'Content-Type': 'application/json'}
+        )),
+        Cenario('GET', '/transactions/cotacao', _get('/transactions/cotacao')),
+        Cenario('GET', '/transactions/cotacao/cache', _get('/transactions/cotacao/cache')),
+        Cenario('GET', '/transactions/<int:id>', lambda i: (
+            'GET', f'/transactions/{transacoes[i % len(transacoes)]}', b'', None
+        )),
+    ]
+
+
+def rotas_da_aplicacao(app=None):
+    """
+    (método, regra) de cada rota registrada por app/routes.py
+    """
+    app = app or create_app('testing')
+    rotas = set()
+    for regra in app.url_map.iter_rules():
+        if regra.endpoint in ENDPOINTS_IGNORADOS:
+            continue
+        for metodo in regra.methods - {'HEAD', 'OPTIONS'}:
+            rotas.add((metodo, regra.rule))
+    return rotas
+
+
+def _requisitar(url, metodo='GET', corpo=None, headers=None, tentativas=10):
+    # Repete em caso de erro 5xx: os stubs podem estar simulando falhas
+    for tentativa in range(tentativas):
+        try:
+            with urlopen(Request(url, data=corpo, method=metodo, headers=headers or {}), timeout=30) as resposta:
+                return json.loads(resposta.read())
+        except HTTPError as erro:
+            if erro.code < 500 or tentativa == tentativas - 1:
+                raise
+
+
+def preparar(url):
+    """
+    Cria os dados usados pelos cenários: compras (saldo e ids de transação),
+    uma importação concluída e uma compra aceita pelo journal
+    """
+    transacoes = []
+    for user_id in range(1, USUARIOS_COM_SALDO + 1):
+        for _ in range(5):
+            transacao = _requisitar(f'{url}/transactions/compra?user_id={user_id}&valor_brl=1000', 'POST')
+            transacoes.append(transacao['id'])
+
+    importacao = _requisitar(f'{url}/users/import', 'POST', _csv_importacao(), {'Content-Type': 'text/csv'})
+    limite = time.monotonic() + 30
+    while _requisitar(f'{url}/users/import/{importacao["id"]}')['status'] == 'processando':
+        if time.monotonic() > limite:
+            raise RuntimeError('A importação de preparação não terminou')
+        time.sleep(0.05)
+
+    pendente = _requisitar(f'{url}/transactions/compra?user_id=1&valor_brl=10', 'POST',
+                           headers={'Prefer': 'respond-async'})
+    return {'transacoes': transacoes, 'importacao': importacao['id'], 'pendente': pendente['tracking_id']}
+
+
+def comparar(atual, baseline, limite, delta_minimo_ms):
+    """
+    Lista as regressões da execução `atual` em relação à `baseline`
+    """
+    regressoes = []
+    for rota, niveis in atual['rotas'].items():
+        for concorrencia, resultado in niveis.items():
+            anterior = baseline.get('rotas', {}).get(rota, {}).get(concorrencia)
+            if anterior is None:
+                continue
+            if anterior['vazao_rps'] and resultado['vazao_rps'] < anterior['vazao_rps'] * (1 - limite):
+                regressoes.append(
+                    f'{rota} (concorrência {concorrencia}): vazão {resultado["vazao_rps"]} req/s, '
+                    f'antes {anterior["vazao_rps"]} req/s'
+                )
+            for metrica in ('p95_ms', 'p99_ms'):
+                antes, agora = anterior.get(metrica), resultado.get(metrica)
+                if antes is None or agora is None:
+                    continue
+                if agora > antes * (1 + limite) and agora - antes > delta_minimo_ms:
+                    regressoes.append(
+                        f'{rota} (concorrência {concorrencia}): {metrica} {agora} ms, antes {antes} ms'
+                    )
+    pico, pico_anterior = atual['memoria']['pico_kib'], baseline.get('memoria', {}).get('pico_kib')
+    if pico_anterior and pico > pico_anterior * (1 + limite):
+        regressoes.append(f'pico de memória {pico} KiB, antes {pico_anterior} KiB')
+    return regressoes
+
+
+def _stub(prefixo, args, **kwargs):
+    return StubProcess(
+        latency=getattr(args, f'{prefixo}_latency'),
+        error_rate=getattr(args, f'{prefixo}_error_rate'),
+        payload_bytes=getattr(args, f'{prefixo}_payload_bytes'),
+        seed=0,
+        **kwargs
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,16', help='Níveis de concorrência (clientes simultâneos)')
+    parser.add_argument('--duration', type=float, default=2.0, help='Duração (s) de cada rota em cada nível')
+    parser.add_argument('--warmup', type=float, default=0.5, help='Aquecimento (s) de cada rota')
+    parser.add_argument('--routes', default='', help='Expressão regular: executa só as rotas cujo nome casar')
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=16)
+    for prefixo, nome in (('viacep', 'API ViaCEP'), ('frankfurter', 'API Frankfurter')):
+        parser.add_argument(f'--{prefixo}-latency', type=float, default=0.0, help=f'Latência (s) do stub da {nome}')
+        parser.add_argument(f'--{prefixo}-error-rate', type=float, default=0.0,
+                            help=f'Fração das respostas 500 do stub da {nome}')
+        parser.add_argument(f'--{prefixo}-payload-bytes', type=int, default=0,
+                            help=f'Bytes acrescentados a cada objeto JSON do stub da {nome}')
+    parser.add_argument('--save', help='Grava o resultado da execução neste arquivo JSON')
+    parser.add_argument('--baseline', help='Compara com o resultado gravado neste arquivo JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Piora máxima tolerada (fração)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Diferença mínima (ms) de p95/p99 considerada regressão')
+    args = parser.parse_args()
+
+    niveis = [int(nivel) for nivel in args.concurrency.split(',') if nivel.strip()]
+    with tempfile.TemporaryDirectory() as diretorio, \
+            _stub('viacep', args, usuarios=USUARIOS_STUB) as viacep, \
+            _stub('frankfurter', args, usuarios=USUARIOS_STUB, transacoes_sinteticas=TRANSACOES_SINTETICAS) as frankfurter:
+        env = {
+            'FLASK_ENV': 'testing',
+            'VIACEP_API_URL': viacep.url,
+            'FRANKFURTER_API_URL': frankfurter.url,
+            'GUNICORN_THREADS': str(args.threads),
+            # Estado em arquivos temporários, para que execuções não interfiram entre si
+            'RESPONSE_CACHE_SQLITE_PATH': os.path.join(diretorio, 'cache.sqlite3'),
+            'CEP_STORE_PATH': os.path.join(diretorio, 'ceps.sqlite3'),
+            'IDEMPOTENCY_SQLITE_PATH': os.path.join(diretorio, 'idempotency.sqlite3'),
+            'ADMISSION_SQLITE_PATH': os.path.join(diretorio, 'admission.sqlite3'),
+            'IMPORT_DIR': os.path.join(diretorio, 'imports'),
+            # Compras e vendas com `Prefer: respond-async` passam pelo journal
+            'WRITE_BEHIND_ENABLED': 'true',
+            'WRITE_BEHIND_DIR': os.path.join(diretorio, 'journal'),
+            # Sem limites de concorrência por rota: a suíte mede a vazão das rotas
+            'ADMISSION_CONCURRENCY': '',
+        }
+        with GunicornServer(viacep.url, worker_class=args.worker_class, workers=args.workers, env=env) as server:
+            todos = cenarios(preparar(server.url))
+            if args.routes:
+                selecionados = [c for c in todos if re.search(args.routes, c.nome)]
+            else:
+                faltando = rotas_da_aplicacao() - {(c.metodo, c.regra) for c in todos}
+                if faltando:
+                    print('Rotas sem cenário na suíte:', ', '.join(f'{m} {r}' for m, r in sorted(faltando)))
+                    return 2
+                selecionados = todos
+
+            memoria_inicio = server.memoria()
+            rotas = {}
+            for cenario in selecionados:
+                executar(server.url, cenario.requisicao, clientes=1, duracao=args.warmup)
+                rotas[cenario.nome] = {}
+                for nivel in niveis:
+                    resultado = executar(server.url, cenario.requisicao, clientes=nivel, duracao=args.duration)
+                    rotas[cenario.nome][str(nivel)] = resultado
+                    print(
+                        f'{cenario.nome:<52} c={nivel:<3} {resultado["vazao_rps"]:>8.1f} req/s  '
+                        f'p50 {resultado["p50_ms"]} ms  p95 {resultado["p95_ms"]} ms  p99 {resultado["p99_ms"]} ms  '
+                        f'status {resultado["status"]}  erros {resultado["erros"]}'
+                    )
+            memoria_fim = server.memoria()
+
+    execucao = {
+        'gerado_em': datetime.now(timezone.utc).isoformat(),
+        'ambiente': {'python': platform.python_version(), 'plataforma': platform.platform(), 'cpus': os.cpu_count()},
+        'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('save', 'baseline')},
+        'rotas': rotas,
+        'memoria': {
+            'rss_kib_inicio': memoria_inicio['rss_kib'],
+            'rss_kib_fim': memoria_fim['rss_kib'],
+            'pico_kib': memoria_fim['pico_kib'],
+        },
+    }
+    print(f'memória: RSS {memoria_inicio["rss_kib"]} -> {memoria_fim["rss_kib"]} KiB, pico {memoria_fim["pico_kib"]} KiB')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as arquivo:
+            json.dump(execucao, arquivo, indent=2, ensure_ascii=False)
+            arquivo.write('\n')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as arquivo:
+            baseline = json.load(arquivo)
+        regressoes = comparar(execucao, baseline, args.threshold, args.min_delta_ms)
+        if regressoes:
+            print(f'{len(regressoes)} regressão(ões) acima de {args.threshold:.0%}:')
+            for regressao in regressoes:
+                print(f'  {regressao}')
+            return 1
+        print(f'Sem regressões acima de {args.threshold:.0%} em relação a {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Configuração do gunicorn para a API Principal.
+
+Modos de execução (GUNICORN_WORKER_CLASS):
+- sync: um worker atende uma requisição por vez (padrão do gunicorn)
+- gthread: cada worker atende GUNICORN_THREADS requisições simultâneas
+- gevent: modo assíncrono; o gevent torna não bloqueantes as chamadas de rede
+  feitas pelo requests em app/utils.py, e cada worker mantém até
+  GUNICORN_WORKER_CONNECTIONS requisições aguardando as APIs secundárias
+
+Recarga da configuração das APIs secundárias sem reiniciar os workers: edite
+o arquivo CONFIG_RELOAD_FILE (.env) e envie CONFIG_RELOAD_SIGNAL aos workers
+(o SIGHUP no master reinicia os workers e o SIGUSR2 no master troca o binário):
+    pkill -USR2 -P <pid do master>
+
+Uso:
+    gunicorn -c gunicorn.conf.py run:app
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+# Com threads > 1 o gunicorn troca o worker sync por gthread automaticamente
+threads = int(os.environ.get('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+if worker_class == 'gevent':
+    # Cada requisição em espera ocupa uma conexão do pool upstream; sem isso o
+    # pool limitaria a concorrência do worker assíncrono
+    os.environ.setdefault('UPSTREAM_POOL_MAXSIZE', str(worker_connections))
+
+
+def post_worker_init(worker):
+    # Instala o sinal de recarga só nos workers (create_app não o instala),
+    # depois que o gunicorn restaurou os sinais padrão do worker
+    from app.extensions import health
+    health.instalar(worker.wsgi)
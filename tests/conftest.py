@@ -0,0 +1,60 @@
+import itertools
+
+import pytest
+
+from benchmarks.stub_upstream import StubUpstream
+
+_nomes = itertools.count()
+
+
+@pytest.fixture
+def stub():
+    """
+    Stub local das duas APIs secundárias (benchmarks/stub_upstream.py)
+    """
+    with StubUpstream() as stub:
+        yield stub
+
+
+@pytest.fixture
+def criar_app(stub, tmp_path):
+    """
+    Cria aplicações com a configuração de teste apontando para o stub e com
+    os arquivos em tmp_path; argumentos nomeados sobrescrevem a configuração
+    """
+    from app import create_app
+    from app.config import TestingConfig, config
+
+    criados = []
+
+    def criar(**sobrescritas):
+        valores = {
+            'VIACEP_API_URL': stub.url,
+            'FRANKFURTER_API_URL': stub.url,
+            'RESPONSE_CACHE_SQLITE_PATH': str(tmp_path / 'cache.sqlite3'),
+            'IDEMPOTENCY_SQLITE_PATH': str(tmp_path / 'idempotency.sqlite3'),
+            'ADMISSION_SQLITE_PATH': str(tmp_path / 'admission.sqlite3'),
+            'CEP_STORE_PATH': str(tmp_path / 'ceps.sqlite3'),
+            'IMPORT_DIR': str(tmp_path / 'imports'),
+            'WRITE_BEHIND_DIR': str(tmp_path / 'journal'),
+            'TRACING_FILE': str(tmp_path / 'traces.ndjson'),
+            'HEALTH_PROBE_INTERVAL': 0,
+            **sobrescritas
+        }
+        nome = f'teste-{next(_nomes)}'
+        config[nome] = type('ConfigTeste', (TestingConfig,), valores)
+        try:
+            app = create_app(nome)
+        finally:
+            del config[nome]
+        criados.append(app)
+        return app
+
+    yield criar
+    for app in criados:
+        app.extensions['upstream'].close()
+
+
+@pytest.fixture
+def app(criar_app):
+    return criar_app()
@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def criar_app_admissao(request, criar_app):
+    def criar(**sobrescritas):
+        return criar_app(ADMISSION_BACKEND=request.param, **sobrescritas)
+    return criar
+
+
+def test_limite_por_taxa_responde_429(criar_app_admissao):
+    client = criar_app_admissao(ADMISSION_RATE=0.01, ADMISSION_BURST=2).test_client()
+
+    status = [client.get('/transactions/cotacao').status_code for _ in range(3)]
+
+    assert status == [200, 200, 429]
+    response = client.get('/transactions/cotacao')
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_trocar_o_cabecalho_nao_renova_o_balde(criar_app_admissao):
+    client = criar_app_admissao(ADMISSION_RATE=0.01, ADMISSION_BURST=1, ADMISSION_API_KEYS='conhecida').test_client()
+
+    assert client.get('/transactions/cotacao', headers={'X-API-Key': 'a'}).status_code == 200
+    assert client.get('/transactions/cotacao', headers={'X-API-Key': 'b'}).status_code == 429
+    assert client.get('/transactions/cotacao').status_code == 429
+
+
+def test_chave_reconhecida_tem_balde_proprio(criar_app_admissao):
+    client = criar_app_admissao(ADMISSION_RATE=0.01, ADMISSION_BURST=1, ADMISSION_API_KEYS='k1,k2').test_client()
+
+    assert client.get('/transactions/cotacao', headers={'X-API-Key': 'k1'}).status_code == 200
+    assert client.get('/transactions/cotacao', headers={'X-API-Key': 'k1'}).status_code == 429
+    assert client.get('/transactions/cotacao', headers={'X-API-Key': 'k2'}).status_code == 200
+    assert client.get('/transactions/cotacao').status_code == 200
+
+
+def test_recusa_por_concorrencia_nao_gasta_ficha(criar_app_admissao):
+    app = criar_app_admissao(
+        ADMISSION_RATE=0.01, ADMISSION_BURST=1, ADMISSION_CONCURRENCY='/transactions/compra=1'
+    )
+    client = app.test_client()
+    backend = app.extensions['admission'].backend
+    compra = '/transactions/compra?user_id=1&valor_brl=100'
+
+    assert backend.entrar('/transactions/compra', 1)
+    assert client.post(compra).status_code == 503
+    backend.sair('/transactions/compra')
+
+    assert client.post(compra).status_code == 201
+    assert client.post(compra).status_code == 429
+    # As vagas ocupadas pelas requisições admitidas e limitadas foram liberadas
+    assert backend.info()['em_andamento'].get('/transactions/compra', 0) == 0
+
+
+def test_caminhos_isentos(criar_app_admissao):
+    client = criar_app_admissao(ADMISSION_RATE=0.01, ADMISSION_BURST=1).test_client()
+
+    assert all(client.get('/health/live').status_code == 200 for _ in range(3))
@@ -0,0 +1,82 @@
+import json
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from benchmarks.loadgen import executar, get, percentil
+from benchmarks.stub_upstream import StubProcess, StubUpstream
+from benchmarks.suite import cenarios, comparar, rotas_da_aplicacao
+
+
+def test_suite_cobre_todas_as_rotas(app):
+    dados = {'transacoes': [1, 2], 'importacao': 'abc', 'pendente': 'def'}
+    todos = cenarios(dados)
+    assert rotas_da_aplicacao(app) - {(c.metodo, c.regra) for c in todos} == set()
+    assert len({c.nome for c in todos}) == len(todos)
+
+
+def _execucao(vazao, p95, pico=1000):
+    return {
+        'rotas': {'GET /users/<int:id>': {'16': {'vazao_rps': vazao, 'p95_ms': p95, 'p99_ms': None}}},
+        'memoria': {'pico_kib': pico},
+    }
+
+
+def test_comparar_sem_regressoes():
+    baseline = _execucao(1000, 10.0)
+    assert comparar(_execucao(850, 11.9), baseline, 0.2, 1.0) == []
+    # p95 30% maior, mas abaixo da diferença mínima
+    assert comparar(_execucao(1000, 1.3), _execucao(1000, 1.0), 0.2, 1.0) == []
+    # Rotas e níveis ausentes da baseline são ignorados
+    assert comparar(_execucao(1, 100.0), {'rotas': {}, 'memoria': {}}, 0.2, 1.0) == []
+
+
+def test_comparar_aponta_regressoes():
+    regressoes = comparar(_execucao(700, 15.0, pico=1300), _execucao(1000, 10.0), 0.2, 1.0)
+    assert regressoes == [
+        'GET /users/<int:id> (concorrência 16): vazão 700 req/s, antes 1000 req/s',
+        'GET /users/<int:id> (concorrência 16): p95_ms 15.0 ms, antes 10.0 ms',
+        'pico de memória 1300 KiB, antes 1000 KiB',
+    ]
+
+
+def test_percentil():
+    assert percentil([], 50) is None
+    valores = list(range(1, 101))
+    assert (percentil(valores, 50), percentil(valores, 99), percentil(valores, 100)) == (51, 99, 100)
+
+
+@pytest.mark.parametrize('caminho', ['/usuarios/1', '/usuarios'])
+def test_gerador_de_carga(stub, caminho):
+    # /usuarios com usuários sintéticos responde com chunked transfer encoding
+    stub.state.usuarios_sinteticos = 1000
+    resultado = executar(stub.url, get(caminho), clientes=4, duracao=0.3)
+    assert resultado['erros'] == 0
+    assert resultado['requisicoes'] > 0
+    assert resultado['status'] == {200: resultado['requisicoes']}
+    assert resultado['bytes'] > 0
+    assert resultado['p50_ms'] <= resultado['p99_ms']
+
+
+def _obter(url):
+    with urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def test_stub_com_erros_latencia_e_payload():
+    with StubUpstream(error_rate=1.0) as stub:
+        with pytest.raises(HTTPError) as erro:
+            _obter(f'{stub.url}/usuarios/1')
+        assert erro.value.code == 500
+    with StubUpstream(payload_bytes=100) as stub:
+        assert len(_obter(f'{stub.url}/usuarios/1')['_preenchimento']) == 100
+        assert all(len(usuario['_preenchimento']) == 100 for usuario in _obter(f'{stub.url}/usuarios?limit=3'))
+
+
+def test_stub_em_outro_processo():
+    with StubProcess(latency=0.01) as stub:
+        assert _obter(f'{stub.url}/usuarios/1')['id'] == 1
+        _obter(f'{stub.url}/cotacao')
+        # As consultas de estatísticas não são contadas
+        assert stub.chamadas() == 2
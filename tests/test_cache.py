@@ -0,0 +1,122 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.cache import MemoryBackend, SQLiteBackend
+from app.extensions import response_cache
+
+
+def _contagem_real(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM cache').fetchone()
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / 'cache.sqlite3'), max_entries=3, max_bytes=1000)
+
+
+def test_sqlite_despeja_as_entradas_menos_usadas(sqlite_backend):
+    for i in range(5):
+        sqlite_backend.set(f'k{i}', b'x' * 10)
+        time.sleep(0.01)
+
+    assert sqlite_backend.get('k0') is None
+    assert sqlite_backend.get('k1') is None
+    assert sqlite_backend.get('k4') == b'x' * 10
+    assert sqlite_backend.info() == {'backend': 'sqlite', 'entradas': 3, 'bytes': 30}
+
+
+def test_sqlite_despeja_por_bytes(sqlite_backend):
+    sqlite_backend.set('a', b'x' * 600)
+    sqlite_backend.set('b', b'x' * 600)
+
+    assert sqlite_backend.get('a') is None
+    assert sqlite_backend.info()['bytes'] == 600
+
+
+def test_sqlite_totais_acompanham_substituicoes_e_remocoes(sqlite_backend):
+    sqlite_backend.set('a', b'x' * 10)
+    sqlite_backend.set('a', b'x' * 40)
+    sqlite_backend.set('b', b'x' * 5, ttl=0.01)
+    assert sqlite_backend.add('a', b'y') is False
+    time.sleep(0.02)
+    assert sqlite_backend.get('b') is None  # expirada e removida na leitura
+    sqlite_backend.set('c', b'x' * 7)
+    sqlite_backend.delete('c')
+
+    info = sqlite_backend.info()
+    assert (info['entradas'], info['bytes']) == _contagem_real(sqlite_backend.path) == (1, 40)
+
+    sqlite_backend.clear()
+    assert sqlite_backend.info()['entradas'] == 0
+
+
+def test_sqlite_inicializa_os_totais_de_um_arquivo_existente(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    SQLiteBackend(path, 10, 1000).set('a', b'x' * 10)
+
+    reaberto = SQLiteBackend(path, 10, 1000)
+
+    assert reaberto.info()['entradas'] == 1
+    assert reaberto.get('a') == b'x' * 10
+
+
+def test_memoria_despeja_as_entradas_menos_usadas():
+    backend = MemoryBackend(max_entries=2, max_bytes=1000)
+    backend.set('a', b'1')
+    backend.set('b', b'2')
+    backend.get('a')
+    backend.set('c', b'3')
+
+    assert backend.get('b') is None
+    assert backend.get('a') == b'1'
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_usuario_servido_do_cache_de_respostas(criar_app, stub, backend):
+    client = criar_app(RESPONSE_CACHE_BACKEND=backend).test_client()
+
+    primeira = client.get('/users/1')
+    segunda = client.get('/users/1')
+
+    assert primeira.status_code == segunda.status_code == 200
+    assert primeira.get_json() == segunda.get_json()
+    assert stub.state.chamadas == 1
+
+
+@pytest.mark.parametrize('criar_backend', [
+    lambda tmp_path: MemoryBackend(max_entries=10, max_bytes=1000),
+    lambda tmp_path: SQLiteBackend(str(tmp_path / 'cache.sqlite3'), max_entries=10, max_bytes=1000),
+])
+def test_trocar_somente_com_o_valor_esperado(criar_backend, tmp_path):
+    backend = criar_backend(tmp_path)
+    assert backend.trocar('a', None, b'1')
+    assert not backend.trocar('a', None, b'2')
+    assert not backend.trocar('a', b'x', b'2')
+    assert backend.trocar('a', b'1', b'2')
+    assert backend.get('a') == b'2'
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_invalidacao_durante_a_busca_nao_armazena_o_valor_antigo(criar_app, backend):
+    app = criar_app(RESPONSE_CACHE_BACKEND=backend)
+    with app.app_context():
+        def buscar_e_invalidar():
+            # PUT concluído entre a falta no cache e o armazenamento do valor lido antes dele
+            response_cache.invalidate('usuario:1')
+            return {'id': 1, 'nome_completo': 'antigo'}
+
+        assert response_cache.get_or_fetch('usuario:1', buscar_e_invalidar)['nome_completo'] == 'antigo'
+        assert response_cache.get_or_fetch_bruto('usuario:1', lambda: b'{"id": 1}') == b'{"id": 1}'
+        # A busca iniciada depois da invalidação é armazenada
+        assert response_cache.get_or_fetch('usuario:1', lambda: {'id': 2}) == {'id': 1}
+
+        response_cache.invalidate('usuario:2')
+        response_cache.invalidate('usuario:2')
+        corpo = response_cache.get_or_fetch_bruto(
+            'usuario:2', lambda: response_cache.invalidate('usuario:2') or b'{"id": 2}'
+        )
+        assert corpo == b'{"id": 2}'
+        assert response_cache.get_or_fetch_bruto('usuario:2', lambda: b'{"id": 3}') == b'{"id": 3}'
@@ -0,0 +1,57 @@
+import json
+import socket
+
+
+def _porta_fechada():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_cep_consultado_uma_vez_e_servido_do_indice_local(client, stub):
+    primeira = client.get('/users/cep/01001-000')
+    segunda = client.get('/users/cep/01001000')
+
+    assert primeira.status_code == segunda.status_code == 200
+    assert primeira.json['localidade'] == 'São Paulo'
+    assert segunda.json == primeira.json
+    assert stub.state.chamadas == 1
+
+
+def test_cep_invalido(client, stub):
+    response = client.get('/users/cep/123')
+
+    assert response.status_code == 400
+    assert stub.state.chamadas == 0
+
+
+def test_cep_inexistente_responde_404_e_nao_e_gravado(client, stub):
+    assert client.get('/users/cep/99999999').status_code == 404
+    assert client.get('/users/cep/99999999').status_code == 404
+    assert stub.state.chamadas == 2
+
+
+def test_falha_de_transporte_responde_500(criar_app):
+    app = criar_app(VIACEP_API_URL=f'http://127.0.0.1:{_porta_fechada()}', UPSTREAM_RETRY_MAX=0)
+
+    response = app.test_client().get('/users/cep/01001000')
+
+    assert response.status_code == 500
+    assert response.json == {'message': 'Erro ao consultar CEP na API secundária'}
+
+
+def test_importar_ceps_pela_cli(app, client, stub, tmp_path):
+    arquivo = tmp_path / 'ceps.ndjson'
+    arquivo.write_text(
+        json.dumps({'cep': '20040-020', 'logradouro': 'Av. Rio Branco', 'localidade': 'Rio de Janeiro'}) + '\n'
+        + json.dumps({'cep': 'invalido'}) + '\n',
+        encoding='utf-8'
+    )
+
+    resultado = app.test_cli_runner().invoke(args=['importar-ceps', str(arquivo)])
+
+    assert resultado.exit_code == 0
+    assert '1 CEPs importados' in resultado.output
+    response = client.get('/users/cep/20040020')
+    assert response.json['localidade'] == 'Rio de Janeiro'
+    assert stub.state.chamadas == 0
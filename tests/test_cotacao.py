@@ -0,0 +1,25 @@
+def _chamadas_medidas(client, helper):
+    prefixo = f'api_principal_upstream_duration_seconds_count{{helper="{helper}"}} '
+    for linha in client.get('/metrics').get_data(as_text=True).splitlines():
+        if linha.startswith(prefixo):
+            return int(linha[len(prefixo):])
+    return 0
+
+
+def test_cotacao_servida_pelo_cache(client, stub):
+    primeira = client.get('/transactions/cotacao')
+    segunda = client.get('/transactions/cotacao')
+
+    assert primeira.status_code == segunda.status_code == 200
+    assert primeira.json['cotacao'] == segunda.json['cotacao'] == 5.0
+    assert stub.state.chamadas == 1
+
+
+def test_acerto_do_cache_nao_conta_como_chamada_ao_upstream(app, client):
+    from app.utils import consultar_cotacao_dolar
+
+    assert consultar_cotacao_dolar()['cotacao'] == 5.0
+    assert consultar_cotacao_dolar()['cotacao'] == 5.0
+
+    assert _chamadas_medidas(client, 'buscar_cotacao_dolar') == 1
+    assert _chamadas_medidas(client, 'consultar_cotacao_dolar') == 0
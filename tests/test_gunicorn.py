@@ -0,0 +1,89 @@
+import json
+import os
+import runpy
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+from benchmarks.server import RAIZ, GunicornServer
+from benchmarks.stub_upstream import StubProcess
+
+
+def _configuracao(monkeypatch, **env):
+    # gunicorn.conf.py altera o ambiente; cada teste usa uma cópia
+    ambiente = {k: v for k, v in os.environ.items() if not k.startswith(('GUNICORN_', 'UPSTREAM_POOL_'))}
+    monkeypatch.setattr(os, 'environ', {**ambiente, **env})
+    return runpy.run_path(os.path.join(RAIZ, 'gunicorn.conf.py'))
+
+
+def test_configuracao_padrao_sync(monkeypatch):
+    conf = _configuracao(monkeypatch)
+    assert conf['worker_class'] == 'sync'
+    assert conf['threads'] == 1
+    assert 'UPSTREAM_POOL_MAXSIZE' not in os.environ
+
+
+def test_configuracao_gthread(monkeypatch):
+    conf = _configuracao(monkeypatch, GUNICORN_WORKER_CLASS='gthread')
+    assert conf['threads'] == 8
+
+
+def test_configuracao_gevent_dimensiona_o_pool(monkeypatch):
+    conf = _configuracao(monkeypatch, GUNICORN_WORKER_CLASS='gevent', GUNICORN_WORKER_CONNECTIONS='300')
+    assert conf['worker_connections'] == 300
+    assert os.environ['UPSTREAM_POOL_MAXSIZE'] == '300'
+
+
+def test_configuracao_gevent_respeita_o_pool_informado(monkeypatch):
+    _configuracao(monkeypatch, GUNICORN_WORKER_CLASS='gevent', UPSTREAM_POOL_MAXSIZE='50')
+    assert os.environ['UPSTREAM_POOL_MAXSIZE'] == '50'
+
+
+def _obter(url):
+    with urlopen(url, timeout=30) as response:
+        return response.status
+
+
+def _env(tmp_path):
+    return {
+        'RESPONSE_CACHE_SQLITE_PATH': str(tmp_path / 'cache.sqlite3'),
+        'IDEMPOTENCY_SQLITE_PATH': str(tmp_path / 'idempotency.sqlite3'),
+        'ADMISSION_SQLITE_PATH': str(tmp_path / 'admission.sqlite3'),
+        'CEP_STORE_PATH': str(tmp_path / 'ceps.sqlite3'),
+        'IMPORT_DIR': str(tmp_path / 'imports'),
+        'WRITE_BEHIND_DIR': str(tmp_path / 'journal'),
+        'HEALTH_PROBE_INTERVAL': '0',
+    }
+
+
+def test_worker_gevent_nao_bloqueia_nas_apis_secundarias(tmp_path):
+    latencia = 0.25
+    concorrentes = 20
+    env = _env(tmp_path)
+    with StubProcess(latency=latencia) as stub, GunicornServer(stub.url, 'gevent', env=env) as servidor:
+        urls = [f'{servidor.url}/users/{i}' for i in range(1, concorrentes + 1)]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(concorrentes) as executor:
+            status = list(executor.map(_obter, urls))
+        duracao = time.perf_counter() - inicio
+    assert status == [200] * concorrentes
+    # Um worker sync levaria concorrentes * latencia (5 s)
+    assert duracao < 2.0
+
+
+def test_sinal_de_recarga_instalado_nos_workers(tmp_path):
+    arquivo = tmp_path / 'reload.env'
+    arquivo.write_text('UPSTREAM_READ_TIMEOUT=4\n')
+    env = dict(_env(tmp_path), CONFIG_RELOAD_FILE=str(arquivo))
+    with StubProcess() as stub, GunicornServer(stub.url, 'sync', env=env) as servidor:
+        worker = [pid for pid in servidor.processos() if pid != servidor.process.pid][0]
+        os.kill(worker, signal.SIGUSR2)
+        limite = time.monotonic() + 10
+        while True:
+            with urlopen(f'{servidor.url}/health/ready', timeout=10) as response:
+                monitor = json.loads(response.read())['monitor']
+            if monitor['recargas'] or time.monotonic() > limite:
+                break
+            time.sleep(0.05)
+    assert monitor['recargas'] == 1
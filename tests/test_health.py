@@ -0,0 +1,123 @@
+import os
+import signal
+import time
+
+import pytest
+
+from app.extensions import health, upstream
+from benchmarks.stub_upstream import StubUpstream
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    return tmp_path / 'reload.env'
+
+
+@pytest.fixture
+def app(criar_app, arquivo):
+    return criar_app(CONFIG_RELOAD_FILE=str(arquivo))
+
+
+def test_vivo(client):
+    response = client.get('/health/live')
+    assert response.status_code == 200
+    assert response.json == {'status': 'ok', 'pid': os.getpid()}
+
+
+def test_pronto_com_a_api_respondendo(client):
+    response = client.get('/health/ready')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ok'
+    assert all(v['pronto'] and v['pool']['criado'] for v in response.json['upstreams'].values())
+
+
+def test_pronto_com_sondas(criar_app, stub):
+    app = criar_app(HEALTH_PROBE_INTERVAL=0.05)
+    response = app.test_client().get('/health/ready')
+    assert response.status_code == 200
+    replicas = response.json['upstreams']['viacep']['replicas']
+    assert len(replicas) == 1 and replicas[0]['url'] == stub.url
+    assert response.json['monitor']['sondas'] >= 2
+
+
+def test_indisponivel_sem_replica_saudavel(criar_app):
+    app = criar_app(
+        HEALTH_PROBE_INTERVAL=0.05, HEALTH_PROBE_TIMEOUT=0.2, UPSTREAM_UNHEALTHY_THRESHOLD=1,
+        VIACEP_API_URL='http://127.0.0.1:9'
+    )
+    response = app.test_client().get('/health/ready')
+    assert response.status_code == 503
+    assert response.json['status'] == 'indisponivel'
+    assert not response.json['upstreams']['viacep']['pronto']
+    assert response.json['upstreams']['frankfurter']['pronto']
+
+
+def test_create_app_nao_instala_o_sinal(criar_app):
+    anterior = signal.getsignal(signal.SIGUSR2)
+    criar_app()
+    assert signal.getsignal(signal.SIGUSR2) is anterior
+
+
+def test_recarga_troca_as_replicas(app, arquivo, stub):
+    with StubUpstream() as nova:
+        arquivo.write_text(f'VIACEP_API_URL={nova.url}\nUPSTREAM_READ_TIMEOUT=3.5\nCIRCUIT_FAILURE_THRESHOLD=7\n')
+        with app.app_context():
+            assert upstream.get('viacep', '/usuarios/1').status_code == 200
+            antiga = upstream.state.session('viacep')
+            fechadas = []
+            antiga.close = lambda: fechadas.append(antiga)
+
+            novos = health.recarregar()
+            assert novos == {'VIACEP_API_URL': nova.url, 'UPSTREAM_READ_TIMEOUT': 3.5, 'CIRCUIT_FAILURE_THRESHOLD': 7}
+            assert upstream.state.timeout[1] == 3.5
+            assert upstream.state.breakers['viacep'].failure_threshold == 7
+            # Sem requisições em andamento, a sessão substituída é fechada na hora
+            assert fechadas == [antiga]
+            assert upstream.state.session('viacep') is not antiga
+
+            chamadas = (stub.state.chamadas, nova.state.chamadas)
+            assert upstream.get('viacep', '/usuarios/1').status_code == 200
+            assert stub.state.chamadas == chamadas[0]
+            assert nova.state.chamadas == chamadas[1] + 1
+            assert health.stats()['recargas'] == 1
+
+
+def test_recarga_fecha_a_sessao_antiga_depois_das_requisicoes(app, arquivo):
+    with StubUpstream() as nova:
+        arquivo.write_text(f'VIACEP_API_URL={nova.url}\n')
+        with app.app_context():
+            state = upstream.state
+            antiga = state.usar_sessao('viacep')
+            fechadas = []
+            antiga.close = lambda: fechadas.append(antiga)
+
+            health.recarregar()
+            assert fechadas == []
+            # A requisição em andamento ainda usa a sessão antiga
+            assert antiga.get(f"{app.config['FRANKFURTER_API_URL']}/usuarios/1").status_code == 200
+            state.devolver_sessao(antiga)
+            assert fechadas == [antiga]
+
+
+def test_recarga_invalida_mantem_a_configuracao(app, arquivo):
+    url = app.config['VIACEP_API_URL']
+    arquivo.write_text('VIACEP_API_URL=\nUPSTREAM_READ_TIMEOUT=abc\n')
+    with app.app_context():
+        assert health.recarregar() is None
+        assert health.stats()['recargas_falhas'] == 1
+    assert app.config['VIACEP_API_URL'] == url
+
+
+def test_sinal_pede_a_recarga(app, arquivo):
+    anterior = signal.getsignal(signal.SIGUSR2)
+    arquivo.write_text('UPSTREAM_CONNECT_TIMEOUT=1.5\n')
+    try:
+        health.instalar(app)
+        os.kill(os.getpid(), signal.SIGUSR2)
+        limite = time.monotonic() + 5
+        while app.extensions['health'].stats['recargas'] == 0 and time.monotonic() < limite:
+            time.sleep(0.01)
+    finally:
+        signal.signal(signal.SIGUSR2, anterior)
+    assert app.extensions['health'].stats['recargas'] == 1
+    assert app.config['UPSTREAM_CONNECT_TIMEOUT'] == 1.5
@@ -0,0 +1,128 @@
+from decimal import Decimal
+
+import pytest
+
+from app.history import SEM_TIPO, FiltroTransacoes, ResumoTransacoes, iterar_transacoes
+from app.utils import abrir_transacoes_usuario
+from benchmarks import stub_upstream
+
+
+def _transacao(data, tipo='compra', **valores):
+    return {'tipo': tipo, 'data_transacao': data, **valores}
+
+
+def _filtro(**args):
+    return FiltroTransacoes.dos_parametros(args)
+
+
+@pytest.mark.parametrize('args, data, aceita', [
+    ({'from': '20240102'}, '2024-01-05T10:00:00', True),
+    ({'from': '2024-01-05'}, '2024-01-04T23:59:59', False),
+    ({'from': '2024-01-05T10:00'}, '2024-01-05T10:00:00', True),
+    ({'to': '2024-01-05 10:00'}, '2024-01-05T09:00:00', True),
+    ({'to': '2024-01-05 10:00'}, '2024-01-05T10:30:00', False),
+    # Uma data sem hora em `to` inclui o dia inteiro
+    ({'to': '2024-01-05'}, '2024-01-05T23:59:59.999999', True),
+    ({'to': '20240105'}, '2024-01-06T00:00:00', False),
+    ({'from': '2024-01-05T10:00:00+00:00'}, '2024-01-05T09:30:00-03:00', True),
+    ({'from': '2024-01-01'}, None, False),
+    ({'to': '2024-01-01'}, 'ontem', False),
+    ({}, None, True),
+])
+def test_filtro_periodo(args, data, aceita):
+    assert _filtro(**args).aceita(_transacao(data)) is aceita
+
+
+def test_filtro_tipo():
+    filtro = _filtro(tipo='venda')
+    assert filtro.aceita(_transacao('2024-01-01T00:00:00', 'venda'))
+    assert not filtro.aceita(_transacao('2024-01-01T00:00:00', 'compra'))
+
+
+def test_filtro_params_canonicos():
+    assert _filtro(**{'from': '20240102', 'to': '2024-01-05 10:00', 'tipo': 'compra'}).params() == {
+        'from': '2024-01-02', 'to': '2024-01-05T10:00:00', 'tipo': 'compra'
+    }
+
+
+@pytest.mark.parametrize('args', [{'from': '05/01/2024'}, {'to': 'amanha'}, {'tipo': 'troca'}])
+def test_filtro_parametros_invalidos(args):
+    with pytest.raises(ValueError):
+        _filtro(**args)
+
+
+def test_resumo_por_tipo_e_dia():
+    resumo = ResumoTransacoes()
+    for transacao in [
+        _transacao('2024-01-01T10:00:00', 'compra', quantidade_usd=Decimal('10'), valor_brl=Decimal('50'), cotacao=Decimal('5')),
+        _transacao('2024-01-01T11:00:00', 'compra', quantidade_usd=Decimal('30'), valor_brl=Decimal('153'), cotacao=Decimal('5.1')),
+        _transacao('2024-01-02T09:00:00', 'venda', quantidade_usd=Decimal('5'), valor_brl=Decimal('26'), cotacao=Decimal('5.2')),
+        _transacao('2024-01-02T09:30:00', None, quantidade_usd=Decimal('1'), valor_brl=Decimal('5'), cotacao=Decimal('5')),
+    ]:
+        resumo.adicionar(transacao)
+
+    dados = resumo.como_dict()
+    assert dados['transacoes'] == 4
+    assert dados['por_tipo']['compra'] == {
+        'transacoes': 2, 'quantidade_usd': 40.0, 'valor_brl': 203.0, 'cotacao_media': 5.075
+    }
+    assert dados['por_tipo'][SEM_TIPO]['transacoes'] == 1
+    assert [dia['data'] for dia in dados['por_dia']] == ['2024-01-01', '2024-01-02']
+    assert set(dados['por_dia'][1]) == {'data', 'venda', SEM_TIPO}
+
+
+def test_iterar_transacoes_segue_cursor(app, stub):
+    stub.state.transacoes_sinteticas = 7
+    paginas = []
+
+    def abrir(params):
+        paginas.append(params.get('cursor'))
+        return abrir_transacoes_usuario(1, {**params, 'limit': 3})
+
+    with app.app_context():
+        transacoes = list(iterar_transacoes(abrir, {}))
+    assert [t['id'] for t in transacoes] == list(range(1, 8))
+    assert paginas == [None, '3', '6']
+
+
+def test_rota_resumo_filtrada(client, stub):
+    stub.state.transacoes_sinteticas = 20
+    # Transações a cada 15 minutos a partir de 2024-01-01T00:00:00
+    response = client.get('/users/1/transactions', query_string={
+        'from': '20240101', 'to': '2024-01-01 00:30', 'resumo': 'true'
+    })
+    assert response.status_code == 200
+    assert response.json['transacoes'] == 3
+
+    response = client.get('/users/1/transactions', query_string={'to': '2024-01-01 00:30'})
+    assert [t['id'] for t in response.json] == [1, 2, 3]
+
+
+def _interrompida(state, params, user_id):
+    def partes():
+        yield b'[{"id": 1, "tipo": "compra"},'
+        # Conexão encerrada no meio do corpo
+        raise ConnectionResetError
+
+    return 200, partes()
+
+
+@pytest.mark.parametrize('handler', [
+    lambda state, params, user_id: (200, {'message': 'Erro inesperado'}),
+    lambda state, params, user_id: (200, iter([b'[{"id": 1, "tipo": "compra"}, {"id": 2'])),
+    _interrompida,
+], ids=['nao_array', 'truncado', 'interrompido'])
+@pytest.mark.parametrize('resumo', ['false', 'true'])
+def test_rota_com_corpo_invalido_responde_500(client, stub, monkeypatch, handler, resumo):
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [
+        ('GET', r'/transacoes/usuario/(\d+)', handler)
+    ] + stub_upstream.ROTAS)
+    response = client.get('/users/1/transactions', query_string={'resumo': resumo})
+    assert response.status_code == 500
+    assert response.json == {'message': 'Erro ao obter transações da API secundária'}
+
+
+def test_rota_usuario_inexistente_responde_404(client, stub):
+    response = client.get('/users/9999/transactions')
+    assert response.status_code == 404
+    assert response.json == {'message': 'Usuário não encontrado'}
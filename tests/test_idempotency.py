@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app.idempotency import EM_ANDAMENTO
+from benchmarks import stub_upstream
+
+COMPRA = '/transactions/compra?user_id=1&valor_brl=100'
+
+
+def _compra(client, chave, url=COMPRA):
+    return client.post(url, headers={'Idempotency-Key': chave})
+
+
+def test_repeticao_reproduz_a_resposta(client, stub):
+    primeira = _compra(client, 'chave-1')
+    assert primeira.status_code == 201
+    assert primeira.headers['Idempotent-Replayed'] == 'false'
+
+    repetida = _compra(client, 'chave-1')
+    assert repetida.status_code == 201
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert repetida.json == primeira.json
+    assert len(stub.state.transacoes) == 1
+
+    # Sem a chave, cada requisição é executada
+    client.post(COMPRA)
+    client.post(COMPRA)
+    assert len(stub.state.transacoes) == 3
+
+
+def test_recusa_reproduzida(client, stub):
+    url = '/transactions/venda?user_id=1&quantidade_usd=5'
+    assert _compra(client, 'venda-1', url).status_code == 400
+    stub_upstream._registrar(stub.state, 1, 'compra', 10, 50)
+    repetida = _compra(client, 'venda-1', url)
+    assert repetida.status_code == 400
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert repetida.json == {'message': 'Saldo insuficiente'}
+
+
+def test_chave_com_outros_parametros_responde_422(client, stub):
+    _compra(client, 'chave-2')
+    response = _compra(client, 'chave-2', '/transactions/compra?user_id=1&valor_brl=200')
+    assert response.status_code == 422
+    assert response.json == {'message': 'Idempotency-Key já utilizada com outros parâmetros'}
+    assert len(stub.state.transacoes) == 1
+
+
+def test_mesma_chave_em_rotas_diferentes(client, stub):
+    stub_upstream._registrar(stub.state, 1, 'compra', 10, 50)
+    assert _compra(client, 'chave-3').status_code == 201
+    assert _compra(client, 'chave-3', '/transactions/venda?user_id=1&quantidade_usd=1').status_code == 201
+    assert len(stub.state.transacoes) == 3
+
+
+def test_chave_longa_demais(client):
+    assert _compra(client, 'x' * 256).status_code == 400
+
+
+def test_duplicadas_concorrentes_executadas_uma_vez(app, stub):
+    stub.server.latency = 0.2
+    respostas = []
+    barreira = threading.Barrier(5)
+
+    def enviar():
+        client = app.test_client()
+        barreira.wait()
+        respostas.append(_compra(client, 'concorrente'))
+
+    threads = [threading.Thread(target=enviar) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(stub.state.transacoes) == 1
+    assert {response.status_code for response in respostas} == {201}
+    assert sorted(response.headers['Idempotent-Replayed'] for response in respostas) == ['false'] + ['true'] * 4
+    assert all(response.json == respostas[0].json for response in respostas)
+
+
+def test_falha_da_api_nao_e_armazenada(client, stub, monkeypatch):
+    rotas = stub_upstream.ROTAS
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [
+        ('POST', r'/transacoes/compra', lambda state, params: (500, {'message': 'Erro interno'}))
+    ] + rotas)
+    assert _compra(client, 'chave-4').status_code == 500
+
+    monkeypatch.setattr(stub_upstream, 'ROTAS', rotas)
+    response = _compra(client, 'chave-4')
+    assert response.status_code == 201
+    assert response.headers['Idempotent-Replayed'] == 'false'
+
+
+@pytest.fixture
+def criar_app_sqlite(criar_app):
+    def criar(**sobrescritas):
+        return criar_app(IDEMPOTENCY_BACKEND='sqlite', **sobrescritas)
+    return criar
+
+
+def test_resposta_compartilhada_entre_workers(criar_app_sqlite, stub):
+    primeiro = criar_app_sqlite().test_client()
+    segundo = criar_app_sqlite().test_client()
+    original = _compra(primeiro, 'chave-5')
+    repetida = _compra(segundo, 'chave-5')
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert repetida.json == original.json
+    assert len(stub.state.transacoes) == 1
+
+
+def test_em_andamento_em_outro_worker_responde_409(criar_app_sqlite, stub):
+    app = criar_app_sqlite(IDEMPOTENCY_LOCK_TIMEOUT=0.2)
+    client = app.test_client()
+    # Reserva feita por outro worker com os mesmos parâmetros, ainda sem resposta
+    primeira = _compra(client, 'referencia')
+    digital = json.loads(app.extensions['idempotency'].backend.get('/transactions/compra:referencia'))['digital']
+    reserva = json.dumps({'estado': EM_ANDAMENTO, 'digital': digital}).encode('utf-8')
+    assert app.extensions['idempotency'].backend.add('/transactions/compra:chave-6', reserva, 60)
+
+    response = _compra(client, 'chave-6')
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert response.json == {'message': 'Requisição com esta Idempotency-Key ainda em andamento'}
+    assert len(stub.state.transacoes) == 1
+    assert primeira.status_code == 201
+
+
+def test_aceite_assincrono_reproduzido_com_location(criar_app, stub):
+    client = criar_app(WRITE_BEHIND_ENABLED=True).test_client()
+    headers = {'Idempotency-Key': 'assincrona', 'Prefer': 'respond-async'}
+    original = client.post(COMPRA, headers=headers)
+    assert original.status_code == 202
+    repetida = client.post(COMPRA, headers=headers)
+    assert repetida.status_code == 202
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert repetida.headers['Location'] == original.headers['Location']
+    assert repetida.headers['Preference-Applied'] == 'respond-async'
+    assert repetida.json == original.json
+
+
+def test_duplicadas_concorrentes_recebem_a_location(criar_app, stub, monkeypatch):
+    from app.write_behind import WriteBehind
+
+    app = criar_app(WRITE_BEHIND_ENABLED=True)
+    aceitar = WriteBehind.aceitar
+    liberar = threading.Event()
+
+    def aceitar_depois_da_duplicada(self, tipo, dados):
+        # A duplicada chega enquanto o aceite original está em andamento
+        liberar.wait(10)
+        return aceitar(self, tipo, dados)
+
+    monkeypatch.setattr(WriteBehind, 'aceitar', aceitar_depois_da_duplicada)
+    respostas = []
+
+    def enviar():
+        respostas.append(app.test_client().post(
+            COMPRA, headers={'Idempotency-Key': 'assincrona-concorrente', 'Prefer': 'respond-async'}
+        ))
+
+    threads = [threading.Thread(target=enviar) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    state = app.extensions['idempotency']
+    while state.stats['waits'] == 0:
+        time.sleep(0.01)
+    liberar.set()
+    for thread in threads:
+        thread.join()
+    assert [response.status_code for response in respostas] == [202, 202]
+    assert sorted(response.headers['Idempotent-Replayed'] for response in respostas) == ['false', 'true']
+    assert len({response.headers['Location'] for response in respostas}) == 1
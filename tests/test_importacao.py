@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import time
+
+
+def _aguardar(client, importacao_id):
+    limite = time.monotonic() + 10
+    while True:
+        status = client.get(f'/users/import/{importacao_id}').json
+        if status['status'] != 'processando' or time.monotonic() > limite:
+            return status
+        time.sleep(0.02)
+
+
+def _resultado(client, importacao_id):
+    response = client.get(f'/users/import/{importacao_id}/resultado')
+    assert response.status_code == 200
+    return [json.loads(linha) for linha in response.get_data(as_text=True).splitlines()]
+
+
+CSV = (
+    'nome_completo,email,senha,cpf,cep,complemento\n'
+    'Ana,ana@example.com,s1,11111111111,01001-000,Apto 1\n'
+    'Bruno,,s2,22222222222,01001000,\n'
+    'Carla,carla@example.com,s3,33333333333,99900000,\n'
+    'Davi,davi@example.com,s4,44444444444,abc,\n'
+    'Eva,eva@example.com,s5,55555555555,01001000,\n'
+)
+
+
+def test_importacao_csv(client, stub):
+    response = client.post('/users/import', data=CSV.encode(), content_type='text/csv')
+    assert response.status_code == 202
+    importacao_id = response.json['id']
+    assert response.headers['Location'].endswith(f'/users/import/{importacao_id}')
+
+    status = _aguardar(client, importacao_id)
+    assert status['status'] == 'concluida'
+    assert status['progresso'] == 1
+    assert (status['linhas'], status['criados'], status['falhas']) == (5, 2, 3)
+    # 01001000 aparece em três linhas e é consultado uma vez
+    assert status['ceps_consultados'] == 2
+
+    linhas = _resultado(client, importacao_id)
+    assert [linha['linha'] for linha in linhas] == [2, 3, 4, 5, 6]
+    assert [linha['status'] for linha in linhas] == [201, 400, 400, 400, 201]
+    assert linhas[1]['message'] == 'Campo obrigatório ausente: email'
+    assert linhas[2]['message'] == linhas[3]['message'] == 'CEP inválido'
+    criado = stub.state.usuarios[linhas[0]['id']]
+    assert (criado['nome_completo'], criado['cep'], criado['complemento']) == ('Ana', '01001000', 'Apto 1')
+
+
+def test_importacao_ndjson_multipart(client, stub):
+    corpo = '\n'.join([
+        json.dumps({'nome_completo': 'Ana', 'email': 'a@example.com', 'senha': 's', 'cpf': 1, 'cep': '01001000'}),
+        '{"nome_completo": ',
+        '',
+        '[1, 2]',
+    ])
+    response = client.post(
+        '/users/import', data={'arquivo': (io.BytesIO(corpo.encode()), 'usuarios.ndjson')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 202
+    assert _aguardar(client, response.json['id'])['criados'] == 1
+    linhas = _resultado(client, response.json['id'])
+    assert [(linha['linha'], linha['status']) for linha in linhas] == [(1, 201), (2, 400), (4, 400)]
+    assert linhas[1]['message'] == 'JSON inválido'
+    assert stub.state.usuarios[linhas[0]['id']]['cpf'] == '1'
+
+
+def test_janelas_consultam_cada_cep_uma_vez(criar_app, stub):
+    client = criar_app(IMPORT_WINDOW=2, IMPORT_MAX_CONCURRENCY=4).test_client()
+    linhas = ['nome_completo,email,senha,cpf,cep']
+    linhas += [f'U{i},u{i}@example.com,s,{i:011d},0100{i % 3}000' for i in range(10)]
+    response = client.post('/users/import?formato=csv', data='\n'.join(linhas).encode())
+    status = _aguardar(client, response.json['id'])
+    assert (status['criados'], status['ceps_unicos'], status['ceps_consultados']) == (10, 3, 3)
+    assert [linha['linha'] for linha in _resultado(client, response.json['id'])] == list(range(2, 12))
+
+
+def test_arquivo_invalido(criar_app, tmp_path):
+    client = criar_app(IMPORT_MAX_BYTES=10).test_client()
+    assert client.post('/users/import', data=b'x', content_type='application/json').status_code == 400
+    assert client.post('/users/import?formato=xml', data=b'x').status_code == 400
+    assert client.post('/users/import', data=b'', content_type='text/csv').json == {'message': 'Arquivo vazio'}
+    response = client.post('/users/import', data=CSV.encode(), content_type='text/csv')
+    assert response.status_code == 400
+    assert response.json == {'message': 'Arquivo maior que o limite de 10 bytes'}
+    assert os.listdir(tmp_path / 'imports') == []
+
+
+def test_importacao_inexistente(client):
+    assert client.get('/users/import/abc123').status_code == 404
+    assert client.get('/users/import/..').status_code == 404
+    assert client.get('/users/import/abc123/resultado').status_code == 404
+
+
+def test_importacao_de_worker_encerrado(client, tmp_path):
+    encerrado = os.fork()
+    if encerrado == 0:
+        os._exit(0)
+    os.waitpid(encerrado, 0)
+    diretorio = tmp_path / 'imports' / 'abc123'
+    diretorio.mkdir()
+    (diretorio / 'status.json').write_text(json.dumps({
+        'id': 'abc123', 'status': 'processando', 'pid': encerrado, 'bytes_total': 100, 'bytes_lidos': 25
+    }))
+    status = client.get('/users/import/abc123').json
+    assert status['status'] == 'interrompida'
+    assert status['progresso'] == 0.25
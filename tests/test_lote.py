@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app.batch import executar_em_lote
+from app.upstream import CircuitOpenError
+from benchmarks import stub_upstream
+
+
+def _linhas(response):
+    assert response.mimetype == 'application/x-ndjson'
+    linhas = [json.loads(linha) for linha in response.get_data(as_text=True).splitlines()]
+    resumo = linhas.pop()['resumo']
+    return {linha['indice']: linha for linha in linhas}, resumo
+
+
+def test_lote_json_em_ordem_por_usuario(client, stub):
+    itens = [
+        {'tipo': 'compra', 'user_id': 1, 'valor_brl': 100},
+        {'tipo': 'compra', 'user_id': 2, 'valor_brl': 50},
+        {'tipo': 'venda', 'user_id': 1, 'quantidade_usd': 20},
+        {'tipo': 'venda', 'user_id': 1, 'quantidade_usd': 1},
+        {'tipo': 'venda', 'user_id': 2, 'quantidade_usd': 10},
+    ]
+    linhas, resumo = _linhas(client.post('/transactions/batch', json=itens))
+    assert [linhas[i]['status'] for i in range(5)] == [201, 201, 201, 400, 201]
+    assert linhas[3]['resultado'] == {'message': 'Saldo insuficiente'}
+    assert resumo == {'total': 5, 'status': {'201': 4, '400': 1}}
+    assert stub.state.saldos[1] == 0
+    assert stub.state.saldos[2] == 0
+
+
+def test_lote_ndjson_com_itens_invalidos(client, stub):
+    corpo = '\n'.join([
+        json.dumps({'tipo': 'compra', 'user_id': 1, 'valor_brl': 10}),
+        json.dumps({'tipo': 'saque', 'user_id': 1}),
+        '',
+        json.dumps({'tipo': 'venda', 'user_id': 1}),
+        json.dumps({'tipo': 'compra', 'user_id': 1000, 'valor_brl': 10}),
+    ])
+    response = client.post('/transactions/batch', data=corpo, content_type='application/x-ndjson')
+    linhas, resumo = _linhas(response)
+    assert linhas[0]['status'] == 201
+    assert linhas[1] == {'indice': 1, 'status': 400, 'resultado': {'message': 'Tipo inválido: use compra ou venda'}}
+    assert linhas[2]['resultado'] == {'message': 'Campo obrigatório ausente: quantidade_usd'}
+    assert linhas[3]['status'] == 404
+    assert resumo['total'] == 4
+
+
+@pytest.mark.parametrize('corpo', ['', '[]', '[{"tipo": ', '{"tipo": "compra"} x', '\n\n'])
+def test_corpo_invalido(client, corpo):
+    response = client.post('/transactions/batch', data=corpo, content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_limite_de_itens(criar_app):
+    client = criar_app(BATCH_MAX_ITEMS=2).test_client()
+    itens = [{'tipo': 'compra', 'user_id': 1, 'valor_brl': 1}] * 3
+    response = client.post('/transactions/batch', json=itens)
+    assert response.status_code == 400
+    assert response.json == {'message': 'Número máximo de itens excedido'}
+
+
+def test_circuito_aberto_responde_503_por_item(criar_app, stub, monkeypatch):
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [
+        ('POST', r'/transacoes/compra', lambda state, params: (500, {'message': 'Erro interno'}))
+    ] + stub_upstream.ROTAS)
+    client = criar_app(CIRCUIT_FAILURE_THRESHOLD=1, UPSTREAM_RETRY_MAX=0).test_client()
+    itens = [{'tipo': 'compra', 'user_id': 1, 'valor_brl': 1}] * 3
+    linhas, resumo = _linhas(client.post('/transactions/batch', json=itens))
+    assert linhas[0]['status'] == 500
+    assert linhas[1]['resultado'] == {'message': 'API secundária indisponível: frankfurter'}
+    assert resumo['status'] == {'500': 1, '503': 2}
+
+
+def test_executar_em_lote_limita_a_concorrencia(app):
+    ativos = []
+    maximo = [0]
+    lock = threading.Lock()
+
+    def processar(item):
+        with lock:
+            ativos.append(item)
+            maximo[0] = max(maximo[0], len(ativos))
+        time.sleep(0.02)
+        with lock:
+            ativos.remove(item)
+        return item, 200
+
+    itens = [(i, str(i), i) for i in range(12)]
+    with app.app_context():
+        resultados = list(executar_em_lote(itens, processar, 3))
+    assert sorted(indice for indice, _, _ in resultados) == list(range(12))
+    assert maximo[0] == 3
+
+
+def test_executar_em_lote_preserva_a_ordem_da_chave(app):
+    vistos = []
+
+    def processar(item):
+        time.sleep(0.01 if item % 2 else 0)
+        vistos.append(item)
+        if item == 4:
+            raise CircuitOpenError('viacep', 1)
+        if item == 5:
+            raise RuntimeError('falha')
+        return {}, 200
+
+    itens = [(i, 'mesma', i) for i in range(6)]
+    with app.app_context():
+        resultados = {indice: status for indice, _, status in executar_em_lote(itens, processar, 4)}
+    assert vistos == list(range(6))
+    assert resultados == {0: 200, 1: 200, 2: 200, 3: 200, 4: 503, 5: 500}
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+
+from app.metrics import BUCKETS, MetricsRegistry, formatar_prometheus
+
+
+def _metricas(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    valores = {}
+    for linha in response.get_data(as_text=True).splitlines():
+        if linha and not linha.startswith('#'):
+            serie, _, valor = linha.rpartition(' ')
+            valores[serie] = float(valor)
+    return valores
+
+
+def test_requisicoes_e_chamadas_as_apis(client, stub):
+    for _ in range(2):
+        assert client.get('/users/1').status_code == 200
+    client.get('/users/?stream=ndjson')
+    valores = _metricas(client)
+
+    assert valores['api_principal_requests_total{route="/users/<int:id>",method="GET",status="200"}'] == 2
+    assert valores['api_principal_request_duration_seconds_count{route="/users/<int:id>",method="GET"}'] == 2
+    assert valores['api_principal_request_duration_seconds_bucket{route="/users/<int:id>",method="GET",le="+Inf"}'] == 2
+    assert valores['api_principal_requests_in_flight{route="/users/<int:id>"}'] == 0
+    # Corpo transmitido em partes: os bytes são contados ao fim da transmissão
+    assert valores['api_principal_response_bytes_total{route="/users/",method="GET"}'] > 0
+    assert valores['api_principal_upstream_requests_total{upstream="viacep",method="GET",status="200"}'] == 2
+    assert valores['api_principal_upstream_in_flight{helper="abrir_stream_usuarios"}'] == 0
+    assert valores['api_principal_circuit_open{upstream="viacep"}'] == 0
+    assert valores['api_principal_cache_events_total{cache="respostas",event="hits"}'] == 1
+
+
+def test_metricas_desativadas(criar_app, stub):
+    client = criar_app(METRICS_ENABLED=False).test_client()
+    client.get('/users/1')
+    valores = _metricas(client)
+    assert not any(serie.startswith('api_principal_requests_total') for serie in valores)
+
+
+def test_histograma_acumulado_por_bucket():
+    registry = MetricsRegistry()
+    labels = (('route', '/x'),)
+    for valor in (0.003, 0.003, 0.2, 30):
+        registry.observe('api_principal_request_duration_seconds', labels, valor)
+    texto = formatar_prometheus(registry.coletar())
+    assert 'api_principal_request_duration_seconds_bucket{route="/x",le="0.0025"} 0' in texto
+    assert 'api_principal_request_duration_seconds_bucket{route="/x",le="0.005"} 2' in texto
+    assert 'api_principal_request_duration_seconds_bucket{route="/x",le="0.25"} 3' in texto
+    assert f'api_principal_request_duration_seconds_bucket{{route="/x",le="{BUCKETS[-1]}"}} 3' in texto
+    assert 'api_principal_request_duration_seconds_bucket{route="/x",le="+Inf"} 4' in texto
+    assert 'api_principal_request_duration_seconds_count{route="/x"} 4' in texto
+    assert '# TYPE api_principal_request_duration_seconds histogram' in texto
+
+
+def test_shards_das_threads_somados_e_aposentados():
+    registry = MetricsRegistry()
+    labels = (('route', '/x'),)
+
+    def registrar():
+        for _ in range(1000):
+            registry.inc('api_principal_requests_total', labels)
+
+    threads = [threading.Thread(target=registrar) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    registry.inc('api_principal_requests_total', labels)
+    assert registry.coletar().counters[('api_principal_requests_total', labels)] == 4001
+    # Os shards das threads encerradas foram incorporados ao acumulado
+    assert len(registry._shards) == 1
+    assert registry.coletar().counters[('api_principal_requests_total', labels)] == 4001
+
+
+def _arquivo_de_worker(diretorio, pid, requisicoes, em_andamento):
+    labels = [['route', '/users/<int:id>']]
+    dados = {
+        'pid': pid,
+        'counters': [['api_principal_requests_total', labels + [['method', 'GET'], ['status', '200']], requisicoes]],
+        'gauges': [['api_principal_requests_in_flight', labels, em_andamento]],
+        'histograms': [],
+    }
+    with open(os.path.join(diretorio, f'{pid}.json'), 'w') as arquivo:
+        json.dump(dados, arquivo)
+
+
+def test_soma_dos_workers_em_metrics_dir(criar_app, stub, tmp_path):
+    diretorio = tmp_path / 'metricas'
+    client = criar_app(METRICS_DIR=str(diretorio)).test_client()
+    client.get('/users/1')
+
+    encerrado = os.fork()
+    if encerrado == 0:
+        os._exit(0)
+    os.waitpid(encerrado, 0)
+    _arquivo_de_worker(diretorio, os.getppid(), 5, 2)
+    _arquivo_de_worker(diretorio, encerrado, 7, 3)
+
+    valores = _metricas(client)
+    assert valores['api_principal_requests_total{route="/users/<int:id>",method="GET",status="200"}'] == 13
+    # Gauges apenas dos workers vivos
+    assert valores['api_principal_requests_in_flight{route="/users/<int:id>"}'] == 2
+    assert os.path.exists(diretorio / f'{os.getpid()}.json')
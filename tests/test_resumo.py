@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from benchmarks import stub_upstream
+
+
+def _registrar(stub, user_id, valor_brl):
+    return stub_upstream._registrar(stub.state, user_id, 'compra', valor_brl / stub.state.cotacao, valor_brl)[1]
+
+
+@pytest.fixture
+def ausencia_no_corpo(monkeypatch):
+    """
+    A API secundária informa usuários e transações inexistentes no corpo
+    ("message") de uma resposta 200; o stub responde 404
+    """
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [
+        ('GET', r'/usuarios/1000', lambda state, params: (200, {'message': 'Usuário não encontrado'})),
+        ('GET', r'/transacoes/999', lambda state, params: (200, {'message': 'Transação não encontrada'})),
+    ] + stub_upstream.ROTAS)
+
+
+def test_resumo_do_usuario(client, stub, ausencia_no_corpo):
+    propria = _registrar(stub, 1, 100)
+    alheia = _registrar(stub, 2, 50)
+
+    response = client.get(f"/users/1/resumo?transacoes={propria['id']},{alheia['id']},999")
+    assert response.status_code == 200
+    assert response.json['usuario'] == stub.state.usuarios[1]
+    assert response.json['saldo'] == {'user_id': 1, 'saldo_usd': 20.0}
+    assert response.json['transacoes'] == [propria]
+    assert response.json['erros'] == {
+        f"transacao:{alheia['id']}": 'Transação não pertence ao usuário',
+        'transacao:999': 'Transação não encontrada'
+    }
+
+
+def test_transacao_com_falha_na_api(client, stub):
+    response = client.get('/users/1/resumo?transacoes=999')
+    assert response.status_code == 200
+    assert response.json['erros'] == {'transacao:999': 'Erro ao obter transação da API secundária'}
+
+
+def test_chamadas_feitas_em_paralelo(client, stub):
+    ids = ','.join(str(_registrar(stub, 1, 10)['id']) for _ in range(4))
+    stub.server.latency = 0.2
+    inicio = time.perf_counter()
+    response = client.get(f'/users/1/resumo?transacoes={ids}')
+    duracao = time.perf_counter() - inicio
+    assert response.status_code == 200
+    assert len(response.json['transacoes']) == 4
+    # Seis chamadas de 0,2 s em sequência levariam 1,2 s
+    assert duracao < 0.6
+
+
+def test_secao_com_falha_vem_nula(client, stub, monkeypatch):
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [
+        ('GET', r'/transacoes/usuario/(\d+)/saldo', lambda state, params, user_id: (503, {'message': 'Indisponível'}))
+    ] + stub_upstream.ROTAS)
+    response = client.get('/users/1/resumo')
+    assert response.status_code == 200
+    assert response.json['usuario']['id'] == 1
+    assert response.json['saldo'] is None
+    assert response.json['erros'] == {'saldo': 'Erro ao obter saldo da API secundária'}
+
+
+def test_usuario_inexistente(client, stub, ausencia_no_corpo):
+    response = client.get('/users/1000/resumo')
+    assert response.status_code == 404
+    assert response.json == {'message': 'Usuário não encontrado'}
+
+
+@pytest.mark.parametrize('transacoes', ['1,a', ','.join(['1'] * 51)])
+def test_parametro_transacoes_invalido(client, transacoes):
+    assert client.get(f'/users/1/resumo?transacoes={transacoes}').status_code == 400
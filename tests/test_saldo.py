@@ -0,0 +1,48 @@
+import pytest
+import requests
+
+
+@pytest.fixture
+def app(criar_app):
+    return criar_app(BALANCE_PROJECTION_ENABLED=True, BALANCE_RECONCILE_INTERVAL=0)
+
+
+def _saldo_upstream(stub, user_id):
+    return requests.get(f'{stub.url}/transacoes/usuario/{user_id}/saldo').json()
+
+
+def test_saldo_projetado_igual_ao_da_api(client, stub):
+    response = client.get('/users/1/saldo')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json == _saldo_upstream(stub, 1)
+
+    chamadas = stub.state.chamadas
+    response = client.get('/users/1/saldo')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert stub.state.chamadas == chamadas
+    assert response.json == _saldo_upstream(stub, 1)
+
+
+def test_saldo_atualizado_pelas_transacoes(client, stub):
+    client.get('/users/1/saldo')
+    assert client.post('/transactions/compra?user_id=1&valor_brl=100').status_code == 201
+    assert client.post('/transactions/venda?user_id=1&quantidade_usd=7.5').status_code == 201
+
+    response = client.get('/users/1/saldo')
+    assert response.headers['X-Cache'] == 'HIT'
+    esperado = _saldo_upstream(stub, 1)
+    assert response.json == esperado
+    assert type(response.json['saldo_usd']) is type(esperado['saldo_usd'])
+
+
+def test_saldo_com_campos_extras_da_api(client, stub, monkeypatch):
+    from benchmarks import stub_upstream
+
+    rota = ('GET', r'/transacoes/usuario/(\d+)/saldo',
+            lambda state, params, user_id: (200, {'user_id': int(user_id), 'saldo_usd': 3, 'moeda': 'USD'}))
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [rota] + stub_upstream.ROTAS)
+
+    primeira = client.get('/users/2/saldo')
+    segunda = client.get('/users/2/saldo')
+    assert segunda.headers['X-Cache'] == 'HIT'
+    assert segunda.data == primeira.data
@@ -0,0 +1,57 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+# Inclui empates exatos na terceira casa (ex.: 27987.5 * 4.9876 = 139590.455)
+VALORES = ['0.01', '1', '100.03', '250.55', '1234.57', '27987.5', '59712.5', '61687.5', '99999.99']
+
+
+def _json(response):
+    return json.loads(response.data, parse_float=Decimal)
+
+
+@pytest.mark.parametrize('cotacao', [5.0, 4.9876, 5.4321])
+def test_simulacao_igual_as_transacoes_registradas(client, stub, cotacao):
+    stub.state.cotacao = cotacao
+    corpo = '{"valores_brl": [%s], "quantidades_usd": [%s]}' % (','.join(VALORES), ','.join(VALORES))
+    response = client.post('/transactions/simular', data=corpo, content_type='application/json')
+    assert response.status_code == 200
+    simulacao = _json(response)
+    assert simulacao['cotacao'] == Decimal(str(cotacao))
+
+    for indice, valor in enumerate(VALORES):
+        compra = _json(client.post(f'/transactions/compra?user_id=1&valor_brl={valor}'))
+        assert simulacao['compra']['valores_brl'][indice] == compra['valor_brl']
+        assert simulacao['compra']['quantidades_usd'][indice] == compra['quantidade_usd']
+
+    # Saldo suficiente para todas as vendas
+    assert client.post('/transactions/compra?user_id=1&valor_brl=10000000').status_code == 201
+    for indice, valor in enumerate(VALORES):
+        venda = _json(client.post(f'/transactions/venda?user_id=1&quantidade_usd={valor}'))
+        assert simulacao['venda']['quantidades_usd'][indice] == venda['quantidade_usd']
+        assert simulacao['venda']['valores_brl'][indice] == venda['valor_brl']
+
+
+def test_simulacao_sem_transacoes(client, stub):
+    chamadas = stub.state.chamadas
+    client.post('/transactions/simular', json={'valores_brl': [100]})
+    response = client.post('/transactions/simular', json={'quantidades_usd': [10]})
+    assert response.status_code == 200
+    # Só a primeira simulação consulta a cotação; as seguintes usam o cache
+    assert stub.state.chamadas == chamadas + 1
+    assert not stub.state.transacoes
+
+
+@pytest.mark.parametrize('cotacao', [0, -1])
+def test_simulacao_cotacao_invalida(client, stub, cotacao):
+    stub.state.cotacao = cotacao
+    response = client.post('/transactions/simular', json={'valores_brl': [100], 'quantidades_usd': [10]})
+    assert response.status_code == 500
+    assert response.json == {'message': 'Cotação indisponível na API secundária'}
+
+
+@pytest.mark.parametrize('corpo', ['[]', '{}', '{"valores_brl": ["10"]}', '{"quantidades_usd": [-1]}', 'x'])
+def test_simulacao_corpo_invalido(client, corpo):
+    response = client.post('/transactions/simular', data=corpo, content_type='application/json')
+    assert response.status_code == 400
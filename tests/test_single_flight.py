@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.upstream import single_flight
+
+
+def _em_paralelo(app, func, argumentos):
+    barreira = threading.Barrier(len(argumentos))
+
+    def chamar(argumento):
+        with app.app_context():
+            barreira.wait()
+            try:
+                return func(argumento)
+            except Exception as e:
+                return e
+
+    with ThreadPoolExecutor(len(argumentos)) as executor:
+        return list(executor.map(chamar, argumentos))
+
+
+@pytest.fixture
+def contador():
+    execucoes = []
+
+    @single_flight
+    def buscar(chave):
+        execucoes.append(chave)
+        time.sleep(0.1)
+        if chave == 'erro':
+            raise RuntimeError('falha')
+        return {'chave': chave, 'itens': []}
+
+    buscar.execucoes = execucoes
+    return buscar
+
+
+def test_chamadas_concorrentes_compartilham_a_execucao(app, contador):
+    resultados = _em_paralelo(app, contador, ['a'] * 8 + ['b'] * 4)
+    assert sorted(contador.execucoes) == ['a', 'b']
+    assert resultados[:8] == [{'chave': 'a', 'itens': []}] * 8
+    assert resultados[8:] == [{'chave': 'b', 'itens': []}] * 4
+    # Cada chamada recebe a sua cópia do resultado
+    assert len({id(resultado) for resultado in resultados}) == 12
+
+
+def test_erro_repassado_a_todos(app, contador):
+    resultados = _em_paralelo(app, contador, ['erro'] * 5)
+    assert contador.execucoes == ['erro']
+    assert all(isinstance(resultado, RuntimeError) for resultado in resultados)
+
+
+def test_resultado_nao_guardado_depois_da_execucao(app, contador):
+    with app.app_context():
+        contador('a')
+        contador('a')
+    assert contador.execucoes == ['a', 'a']
+
+
+def test_desativado_pela_configuracao(criar_app, contador):
+    app = criar_app(SINGLE_FLIGHT_ENABLED=False)
+    _em_paralelo(app, contador, ['a'] * 4)
+    assert contador.execucoes == ['a'] * 4
+
+
+def test_consultas_de_cep_concorrentes_chamam_a_api_uma_vez(criar_app, stub):
+    from app.utils import consultar_api_viacep
+
+    app = criar_app(CEP_STORE_PATH='')
+    # Latência folgada para que todas as threads cheguem antes do fim da consulta
+    stub.server.latency = 0.5
+    resultados = _em_paralelo(app, consultar_api_viacep, ['01001000'] * 10)
+    assert stub.state.chamadas == 1
+    assert len({resultado['cep'] for resultado in resultados}) == 1
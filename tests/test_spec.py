@@ -0,0 +1,26 @@
+import gzip
+import json
+
+
+def test_especificacao_gerada_na_inicializacao(app):
+    state = app.extensions['swagger_spec']
+    assert state.corpo is not None
+    assert state.etag is not None
+
+
+def test_swagger_json_com_etag(client, app):
+    response = client.get('/swagger.json')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{app.extensions["swagger_spec"].etag}"'
+    assert json.loads(response.data)['paths']
+
+    response = client.get('/swagger.json', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_swagger_json_comprimido(client, app):
+    response = client.get('/swagger.json', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == app.extensions['swagger_spec'].corpo
@@ -0,0 +1,54 @@
+import json
+
+from benchmarks import stub_upstream
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+def _exportar(app):
+    app.extensions['tracing'].exportador.exportar_pendentes()
+
+
+def test_spans_exportados_em_arquivo(criar_app, tmp_path):
+    app = criar_app(TRACING_ENABLED=True, TRACING_SAMPLE_RATE=0, TRACING_FLUSH_INTERVAL=60)
+    response = app.test_client().get('/users/1', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'})
+    assert response.status_code == 200
+    assert response.headers['X-Trace-Id'] == TRACE_ID
+    _exportar(app)
+
+    with open(tmp_path / 'traces.ndjson', encoding='utf-8') as arquivo:
+        spans = [json.loads(linha) for linha in arquivo]
+    servidor = next(span for span in spans if span['kind'] == 2)
+    assert servidor['parentSpanId'] == PARENT_ID
+    clientes = [span for span in spans if span['kind'] == 3]
+    assert clientes
+    assert all(span['traceId'] == TRACE_ID and span['parentSpanId'] == servidor['spanId'] for span in clientes)
+
+
+def test_requisicao_nao_amostrada_nao_exporta(criar_app, tmp_path):
+    app = criar_app(TRACING_ENABLED=True, TRACING_SAMPLE_RATE=0, TRACING_FLUSH_INTERVAL=60)
+    response = app.test_client().get('/users/1', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-00'})
+    assert response.headers['X-Trace-Id'] == TRACE_ID
+    _exportar(app)
+    assert not (tmp_path / 'traces.ndjson').exists()
+
+
+def test_spans_exportados_por_otlp(criar_app, stub, monkeypatch):
+    recebidos = []
+
+    def coletor(state, params):
+        recebidos.append(params)
+        return 200, {}
+
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [('POST', r'/v1/traces', coletor)] + stub_upstream.ROTAS)
+    app = criar_app(
+        TRACING_ENABLED=True, TRACING_SAMPLE_RATE=1, TRACING_FLUSH_INTERVAL=60,
+        TRACING_EXPORTER='otlp', TRACING_OTLP_ENDPOINT=f'{stub.url}/v1/traces'
+    )
+    app.test_client().get('/health/live')
+    _exportar(app)
+    assert len(recebidos) == 1
+    stats = app.extensions['tracing'].exportador.stats
+    assert stats['exportados'] == 1
+    assert stats['falhas'] == 0
@@ -0,0 +1,188 @@
+import importlib
+
+import pytest
+
+from app.extensions import upstream
+from benchmarks import stub_upstream
+
+
+def _pool(app, nome):
+    session = app.extensions['upstream'].session(nome)
+    pools = session.get_adapter('http://').poolmanager.pools
+    return pools[next(iter(pools.keys()))]
+
+
+def test_conexao_reaproveitada_entre_chamadas(app, stub):
+    with app.app_context():
+        for user_id in range(1, 6):
+            assert upstream.get('viacep', f'/usuarios/{user_id}').json()['id'] == user_id
+        pool = _pool(app, 'viacep')
+    assert pool.num_requests == 5
+    assert pool.num_connections == 1
+
+
+def test_pool_compartilhado_pelas_funcoes_de_utils(app, stub):
+    from app.utils import listar_usuarios, obter_saldo_usuario, obter_usuario
+
+    with app.app_context():
+        assert obter_usuario(1)['id'] == 1
+        assert obter_saldo_usuario(1)['user_id'] == 1
+        assert len(listar_usuarios()[0]) == 100
+        pool = _pool(app, 'viacep')
+    assert stub.state.chamadas == 3
+    assert pool.num_connections == 1
+
+
+def test_sem_keepalive_envia_connection_close(criar_app, stub):
+    app = criar_app(UPSTREAM_KEEPALIVE=False)
+    with app.app_context():
+        assert upstream.get('viacep', '/usuarios/1').status_code == 200
+        assert upstream.get('viacep', '/usuarios/2').status_code == 200
+        assert app.extensions['upstream'].session('viacep').headers['Connection'] == 'close'
+
+
+def test_sessao_recriada_em_outro_processo(app, stub):
+    state = app.extensions['upstream']
+    with app.app_context():
+        upstream.get('viacep', '/usuarios/1')
+        herdada = state.session('viacep')
+        # Como depois do fork de um worker: o pid registrado é o do processo pai
+        state._pid = -1
+        assert state.session('viacep') is not herdada
+        assert upstream.get('viacep', '/usuarios/1').status_code == 200
+
+
+@pytest.mark.parametrize('urls, esperadas', [
+    ('http://a/', ['http://a']),
+    ('http://a, http://b/ ,', ['http://a', 'http://b']),
+])
+def test_urls_base(urls, esperadas):
+    from app.upstream import urls_base
+
+    assert urls_base(urls) == esperadas
+
+
+def _relogio(monkeypatch, agora):
+    # O pacote app expõe o cliente como app.upstream; o módulo vem de sys.modules
+    modulo = importlib.import_module('app.upstream')
+    monkeypatch.setattr(modulo, 'time', type('Relogio', (), {'monotonic': staticmethod(lambda: agora[0])}))
+
+
+def test_circuito_abre_fecha_e_limita_as_provas(monkeypatch):
+    from app.upstream import CircuitBreaker, CircuitOpenError
+
+    agora = [100.0]
+    _relogio(monkeypatch, agora)
+    breaker = CircuitBreaker('viacep', failure_threshold=2, reset_timeout=10, half_open_max_calls=1)
+
+    breaker.permitir()
+    breaker.registrar_falha()
+    breaker.permitir()
+    breaker.registrar_falha()
+    with pytest.raises(CircuitOpenError) as erro:
+        breaker.permitir()
+    assert erro.value.retry_after == 10
+    assert breaker.info() == {'estado': CircuitBreaker.OPEN, 'falhas_consecutivas': 2, 'aberturas': 1}
+
+    # Depois do reset_timeout, uma única prova passa
+    agora[0] += 10
+    breaker.permitir()
+    with pytest.raises(CircuitOpenError):
+        breaker.permitir()
+    breaker.registrar_falha()
+    assert breaker.info()['aberturas'] == 2
+
+    agora[0] += 10
+    breaker.permitir()
+    breaker.registrar_sucesso()
+    assert breaker.info() == {'estado': CircuitBreaker.CLOSED, 'falhas_consecutivas': 0, 'aberturas': 2}
+    breaker.permitir()
+    breaker.permitir()
+
+
+def test_orcamento_de_retentativas(monkeypatch):
+    from app.upstream import RetryBudget
+
+    agora = [0.0]
+    _relogio(monkeypatch, agora)
+    budget = RetryBudget(ratio=0.5, min_per_second=1, max_tokens=2)
+    assert budget.retirar() and budget.retirar()
+    assert not budget.retirar()
+    budget.depositar()
+    budget.depositar()
+    assert budget.retirar()
+    assert not budget.retirar()
+    agora[0] += 1
+    assert budget.retirar()
+
+
+@pytest.fixture
+def upstream_com_falha(stub, monkeypatch):
+    monkeypatch.setattr(stub_upstream, 'ROTAS', [
+        ('GET', r'/usuarios/(\d+)', lambda state, params, user_id: (500, {'message': 'Erro interno'})),
+        ('POST', r'/transacoes/compra', lambda state, params: (500, {'message': 'Erro interno'})),
+    ] + stub_upstream.ROTAS)
+    return stub
+
+
+def test_apenas_gets_sao_retentados(criar_app, upstream_com_falha):
+    stub = upstream_com_falha
+    app = criar_app(UPSTREAM_RETRY_MAX=2, UPSTREAM_RETRY_BACKOFF=0, CIRCUIT_FAILURE_THRESHOLD=100)
+    with app.app_context():
+        assert upstream.get('viacep', '/usuarios/1').status_code == 500
+        assert stub.state.chamadas == 3
+        assert upstream.post('frankfurter', '/transacoes/compra').status_code == 500
+        assert stub.state.chamadas == 4
+
+
+def test_retentativas_limitadas_pelo_orcamento(criar_app, upstream_com_falha):
+    stub = upstream_com_falha
+    app = criar_app(
+        UPSTREAM_RETRY_MAX=2, UPSTREAM_RETRY_BACKOFF=0, CIRCUIT_FAILURE_THRESHOLD=100,
+        UPSTREAM_RETRY_BUDGET_MAX=1, UPSTREAM_RETRY_BUDGET_RATIO=0, UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND=0
+    )
+    with app.app_context():
+        for _ in range(3):
+            upstream.get('viacep', '/usuarios/1')
+    # Três requisições originais e a única retentativa do orçamento
+    assert stub.state.chamadas == 4
+
+
+def test_circuito_aberto_responde_503_sem_chamar_a_api(criar_app, upstream_com_falha):
+    stub = upstream_com_falha
+    client = criar_app(UPSTREAM_RETRY_MAX=0, CIRCUIT_FAILURE_THRESHOLD=2, CIRCUIT_RESET_TIMEOUT=30).test_client()
+    assert client.get('/users/1').status_code == 500
+    assert client.get('/users/2').status_code == 500
+    response = client.get('/users/3')
+    assert response.status_code == 503
+    assert response.json == {'message': 'API secundária indisponível: viacep'}
+    assert 1 <= int(response.headers['Retry-After']) <= 30
+    assert stub.state.chamadas == 2
+
+    circuitos = client.get('/status/upstreams').json
+    assert circuitos['viacep']['estado'] == 'open'
+    assert circuitos['frankfurter']['estado'] == 'closed'
+
+
+def test_excecao_fora_do_requests_devolve_a_prova(criar_app, stub, monkeypatch):
+    import requests
+
+    app = criar_app(UPSTREAM_RETRY_MAX=0, CIRCUIT_HALF_OPEN_MAX_CALLS=1)
+    state = app.extensions['upstream']
+    breaker = state.breakers['viacep']
+    with app.app_context():
+        # Circuito meio-aberto: o próximo permitir() ocupa a única vaga de prova
+        breaker.estado = breaker.HALF_OPEN
+        original = requests.Session.request
+
+        def interromper(self, *args, **kwargs):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(requests.Session, 'request', interromper)
+        with pytest.raises(KeyboardInterrupt):
+            upstream.get('viacep', '/usuarios/1')
+        assert breaker.provas_em_andamento == 0
+
+        monkeypatch.setattr(requests.Session, 'request', original)
+        assert upstream.get('viacep', '/usuarios/1').status_code == 200
+    assert breaker.info()['estado'] == 'closed'
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from benchmarks import stub_upstream
+
+
+@pytest.fixture
+def corpo_usuarios(monkeypatch):
+    """
+    Troca o corpo da listagem de usuários do stub pelos bytes informados
+    """
+    def trocar(*partes):
+        rota = ('GET', r'/usuarios', lambda state, params: (200, iter(partes)))
+        monkeypatch.setattr(stub_upstream, 'ROTAS', [rota] + stub_upstream.ROTAS)
+    return trocar
+
+
+def test_listagem_repassada(client, stub):
+    response = client.get('/users/')
+    assert response.status_code == 200
+    assert len(response.json) == len(stub.state.usuarios)
+
+
+def test_listagem_ndjson(client, stub):
+    response = client.get('/users/?stream=ndjson')
+    assert response.status_code == 200
+    linhas = response.data.decode().splitlines()
+    assert [json.loads(linha)['id'] for linha in linhas] == sorted(stub.state.usuarios)
+
+
+def test_listagem_objeto_decodificado(client, corpo_usuarios):
+    corpo_usuarios(b'{"message": ', b'"sem usuarios"}')
+    response = client.get('/users/')
+    assert response.json == {'message': 'sem usuarios'}
+
+
+@pytest.mark.parametrize('partes', [(), (b'<html>Bad Gateway</html>',)])
+def test_listagem_corpo_invalido(client, corpo_usuarios, partes):
+    corpo_usuarios(*partes)
+    response = client.get('/users/')
+    assert response.status_code == 500
+    assert response.json == {'message': 'Erro ao obter usuários da API secundária'}
+
+
+@pytest.mark.parametrize('passthrough', [True, False])
+def test_paginacao_por_cursor(criar_app, stub, passthrough):
+    client = criar_app(PASSTHROUGH_ENABLED=passthrough).test_client()
+    ids = []
+    cursor = ''
+    while True:
+        response = client.get(f'/users/?limit=30&cursor={cursor}')
+        assert response.status_code == 200
+        ids += [usuario['id'] for usuario in response.json]
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+        assert cursor == str(ids[-1])
+    assert ids == sorted(stub.state.usuarios)
+
+
+def test_listagem_transmitida_em_partes(client, stub):
+    stub.state.usuarios_sinteticos = 5000
+    response = client.get('/users/?stream=json', buffered=False)
+    assert response.status_code == 200
+    assert 'Content-Length' not in response.headers
+    partes = list(response.response)
+    assert len(partes) > 1
+    assert [usuario['id'] for usuario in json.loads(b''.join(partes))] == list(range(1, 5001))
+
+
+def test_listagem_ndjson_paginada(client, stub):
+    stub.state.usuarios_sinteticos = 5000
+    response = client.get('/users/?stream=ndjson&cursor=100&limit=50')
+    assert response.headers['X-Next-Cursor'] == '150'
+    assert [json.loads(linha)['id'] for linha in response.data.decode().splitlines()] == list(range(101, 151))
+
+
+def test_formato_de_transmissao_invalido(client):
+    assert client.get('/users/?stream=xml').status_code == 400
+
+
+def _partes(texto, tamanho):
+    dados = texto.encode('utf-8')
+    return [dados[i:i + tamanho] for i in range(0, len(dados), tamanho)]
+
+
+@pytest.mark.parametrize('tamanho', [1, 3, 7, 1024])
+def test_iterar_array_json_em_partes(tamanho):
+    from app.utils import iterar_array_json
+
+    itens = [{'id': 1, 'nome': 'José, "Zé"'}, [1, 2.5], 'São Paulo', None, {}]
+    texto = ' [\n' + ', '.join(json.dumps(item, ensure_ascii=False) for item in itens) + ' ]'
+    assert list(iterar_array_json(_partes(texto, tamanho))) == itens
+
+
+@pytest.mark.parametrize('texto', ['{"id": 1}', '[{"id": 1}, {"id"'])
+def test_iterar_array_json_invalido(texto):
+    from app.utils import iterar_array_json
+
+    with pytest.raises(ValueError):
+        list(iterar_array_json(_partes(texto, 4)))
+
+
+def test_iterar_array_json_com_decimal():
+    from decimal import Decimal
+
+    from app.utils import iterar_array_json
+
+    assert list(iterar_array_json([b'[0.1, ', b'2]'], parse_float=Decimal)) == [Decimal('0.1'), 2]
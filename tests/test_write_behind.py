@@ -0,0 +1,210 @@
+import glob
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from app.extensions import write_behind
+from app.write_behind import _Journal
+
+ASYNC = {'Prefer': 'respond-async'}
+CONFIG = {
+    'WRITE_BEHIND_ENABLED': True,
+    'WRITE_BEHIND_RETRY_BASE': 0.01,
+    'WRITE_BEHIND_RETRY_MAX': 0.05,
+    'WRITE_BEHIND_POLL_INTERVAL': 0.01,
+    'WRITE_BEHIND_RECOVERY_INTERVAL': 0.05,
+}
+
+
+def esperar(condicao, limite=10):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, 'tempo esgotado'
+        time.sleep(0.01)
+
+
+def stats(app):
+    with app.app_context():
+        return write_behind.stats()
+
+
+def transacoes(stub, user_id):
+    return [
+        (t['tipo'], t['valor_brl'] if t['tipo'] == 'compra' else t['quantidade_usd'])
+        for _, t in sorted(stub.state.transacoes.items()) if t['user_id'] == user_id
+    ]
+
+
+def enviar(client, tipo, user_id, valor):
+    campo = 'valor_brl' if tipo == 'compra' else 'quantidade_usd'
+    return client.post(f'/transactions/{tipo}?user_id={user_id}&{campo}={valor}', headers=ASYNC)
+
+
+def aceitar(client, tipo, user_id, valor):
+    response = enviar(client, tipo, user_id, valor)
+    assert response.status_code == 202, response.json
+    return response
+
+
+@pytest.fixture
+def app(criar_app):
+    return criar_app(**CONFIG)
+
+
+def test_aceite_e_envio(client, stub):
+    response = aceitar(client, 'compra', 1, 100)
+    assert response.json['status'] == 'pendente'
+    location = response.headers['Location']
+
+    esperar(lambda: client.get(location).json['status'] != 'pendente')
+    status = client.get(location).json
+    assert status['status'] == 'concluida'
+    assert status['http_status'] == 201
+    assert status['resultado']['quantidade_usd'] == 20.0
+    assert transacoes(stub, 1) == [('compra', 100.0)]
+
+
+def test_recusa_definitiva(client, stub):
+    location = aceitar(client, 'compra', 9999, 100).headers['Location']
+    esperar(lambda: client.get(location).json['status'] != 'pendente')
+    status = client.get(location).json
+    assert status['status'] == 'recusada'
+    assert status['http_status'] == 404
+    assert status['tentativas'] == 1
+
+
+def test_aceite_invalido(client):
+    response = client.post('/transactions/compra?user_id=1&valor_brl=-5', headers=ASYNC)
+    assert response.status_code == 400
+    assert client.get('/transactions/pendentes/0000000000000000-0').status_code == 404
+
+
+def test_recusas_sincronas(criar_app):
+    # Sem o write-behind, as recusas da API secundária também viram 404/400
+    client = criar_app().test_client()
+    assert client.post('/transactions/compra?user_id=9999&valor_brl=10').status_code == 404
+    response = client.post('/transactions/venda?user_id=1&quantidade_usd=1000')
+    assert response.status_code == 400
+    assert response.json == {'message': 'Saldo insuficiente'}
+
+
+def _worker_filho(criar_app, pedidos, respostas):
+    """
+    Outro worker, em um processo filho: aceita as transações pedidas pelo pai
+    (uma por linha "tipo user_id valor") até o pai fechar o pipe
+    """
+    try:
+        client = criar_app(**CONFIG).test_client()
+        with os.fdopen(pedidos, 'r') as entrada, os.fdopen(respostas, 'w') as saida:
+            for linha in entrada:
+                tipo, user_id, valor = linha.split()
+                saida.write(f'{enviar(client, tipo, user_id, valor).status_code}\n')
+                saida.flush()
+    finally:
+        os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_ordem_de_aceite_entre_workers(app, client, criar_app, stub):
+    client.get('/health/live')
+    esperar(lambda: stats(app)['particoes'] == 1)
+
+    pedidos_leitura, pedidos = os.pipe()
+    respostas, respostas_escrita = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(pedidos)
+        os.close(respostas)
+        _worker_filho(criar_app, pedidos_leitura, respostas_escrita)
+    os.close(pedidos_leitura)
+    os.close(respostas_escrita)
+
+    # Cada venda só é possível depois das compras anteriores; os aceites se alternam entre os workers
+    sequencia = [('compra', 100), ('venda', 5), ('compra', 50), ('venda', 10), ('venda', 0.5), ('compra', 5)]
+    with os.fdopen(pedidos, 'w') as filho, os.fdopen(respostas, 'r') as resposta_filho:
+        for indice, (tipo, valor) in enumerate(sequencia):
+            if indice % 2 == 0:
+                filho.write(f'{tipo} 1 {valor}\n')
+                filho.flush()
+                assert resposta_filho.readline() == '202\n'
+            else:
+                aceitar(client, tipo, 1, valor)
+    os.waitpid(pid, 0)
+
+    esperar(lambda: stats(app)['concluidas'] == len(sequencia))
+    assert stats(app)['recusadas'] == 0
+    assert transacoes(stub, 1) == [(tipo, float(valor)) for tipo, valor in sequencia]
+
+
+def test_recuperacao_de_worker_encerrado(criar_app, stub):
+    sequencia = [('compra', 100), ('venda', 20), ('compra', 30), ('venda', 5)]
+    pid = os.fork()
+    if pid == 0:
+        # Filho: API secundária fora do ar; aceita as transações e morre sem enviá-las
+        try:
+            app = criar_app(**dict(CONFIG, FRANKFURTER_API_URL='http://127.0.0.1:9',
+                                   UPSTREAM_RETRY_MAX=0, WRITE_BEHIND_RETRY_BASE=60))
+            client = app.test_client()
+            for user_id in (1, 2):
+                for tipo, valor in sequencia:
+                    aceitar(client, tipo, user_id, valor)
+        finally:
+            os.kill(os.getpid(), signal.SIGKILL)
+    os.waitpid(pid, 0)
+    assert stub.state.chamadas == 0
+
+    app = criar_app(**CONFIG)
+    app.test_client().get('/health/live')
+    esperar(lambda: stats(app)['concluidas'] == 2 * len(sequencia))
+    assert stats(app)['recuperadas'] == 2 * len(sequencia)
+    assert stats(app)['recusadas'] == 0
+    esperado = [(tipo, float(valor)) for tipo, valor in sequencia]
+    assert transacoes(stub, 1) == esperado
+    assert transacoes(stub, 2) == esperado
+
+
+def test_linha_pela_metade_descartada(app, client, stub, tmp_path):
+    aceitar(client, 'compra', 1, 100)
+    esperar(lambda: stats(app)['concluidas'] == 1)
+    segmento, = glob.glob(str(tmp_path / 'journal' / '*.journal'))
+    # Processo encerrado durante a escrita de um aceite
+    with open(segmento, 'ab') as arquivo:
+        arquivo.write(b'{"op":"aceita","tipo":"com')
+
+    aceitar(client, 'compra', 1, 50)
+    esperar(lambda: stats(app)['concluidas'] == 2)
+    with open(segmento, 'rb') as arquivo:
+        linhas = arquivo.read().splitlines()
+    assert all(json.loads(linha) for linha in linhas)
+    assert transacoes(stub, 1) == [('compra', 100.0), ('compra', 50.0)]
+
+
+def test_erro_inesperado_na_gravacao_nao_encerra_o_journal(client, stub, monkeypatch):
+    gravar = _Journal._gravar
+    erros = [RuntimeError('falha')]
+
+    def falhar_uma_vez(particao, itens):
+        if erros:
+            raise erros.pop()
+        return gravar(particao, itens)
+
+    monkeypatch.setattr(_Journal, '_gravar', staticmethod(falhar_uma_vez))
+    response = enviar(client, 'compra', 1, 100)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    location = aceitar(client, 'compra', 1, 50).headers['Location']
+    esperar(lambda: client.get(location).json['status'] == 'concluida')
+    assert transacoes(stub, 1) == [('compra', 50.0)]
+
+
+def test_journal_parado_responde_503_no_tempo_limite(criar_app, stub, monkeypatch):
+    monkeypatch.setattr(_Journal, 'iniciar', lambda self: None)
+    app = criar_app(**dict(CONFIG, WRITE_BEHIND_JOURNAL_TIMEOUT=0.2))
+    client = app.test_client()
+    inicio = time.monotonic()
+    assert enviar(client, 'compra', 1, 100).status_code == 503
+    assert time.monotonic() - inicio < 5
+    # O aceite recusado não fica no buffer para ser gravado depois
+    assert app.extensions['write_behind'].journal.buffer == []